@@ -21,6 +21,8 @@ export const apiFetchJson = async <T>(path: string, options: FetchOptions = {}):
 
   try {
     const response = await fetch(`${API_BASE_URL}${path}`, {
+      // Send the API's last_write cookie back, so reads right after a write see it
+      credentials: "include",
       ...rest,
       signal: controller.signal,
       headers: {
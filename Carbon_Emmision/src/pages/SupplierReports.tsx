@@ -20,13 +20,14 @@ type SupplierReport = {
   end_lng: number;
   reported_distance: number;
   reported_time: number;
-  verified_distance: number;
-  verified_time: number;
+  verified_distance: number | null;
+  verified_time: number | null;
   vehicle_type: string;
   weight: number;
   reported_co2: number;
-  verified_co2: number;
-  verification_status: "verified" | "warning" | "flagged";
+  verified_co2: number | null;
+  verification_status: "pending" | "verified" | "warning" | "flagged";
+  route_id?: number | null;
   created_at: string;
 };
 
@@ -50,6 +51,12 @@ type RouteData = {
 
 const VEHICLE_TYPES = ["diesel", "petrol", "electric"];
 
+// How often pending reports are re-checked while verification runs in the background
+const PENDING_POLL_MS = 2000;
+
+const formatValue = (value: number | null, digits: number, unit: string) =>
+  value === null ? "—" : `${value.toFixed(digits)} ${unit}`;
+
 const SupplierReports = () => {
   const [reports, setReports] = useState<SupplierReport[]>([]);
   const [isLoading, setIsLoading] = useState(false);
@@ -130,9 +137,8 @@ const SupplierReports = () => {
     // Fetch route data from backend
     const fetchRoute = async () => {
       try {
-        const routeData = await apiFetchJson<RouteData>(
-          `/supplier/route?start_lat=${selectedReport.start_lat}&start_lng=${selectedReport.start_lng}&end_lat=${selectedReport.end_lat}&end_lng=${selectedReport.end_lng}`
-        );
+        // Stored with the report during verification, no routing API call
+        const routeData = await apiFetchJson<RouteData>(`/supplier/reports/${selectedReport.id}/route`);
 
         if (routeData.geometry && map.current) {
           // Add route line to map
@@ -190,6 +196,31 @@ const SupplierReports = () => {
     loadReports();
   }, []);
 
+  // Poll pending reports until the background verification has finished
+  const pendingIds = reports
+    .filter((report) => report.verification_status === "pending")
+    .map((report) => report.id);
+  const pendingKey = pendingIds.join(",");
+
+  useEffect(() => {
+    if (pendingIds.length === 0) return;
+
+    const timer = setTimeout(async () => {
+      try {
+        const query = pendingIds.map((id) => `ids=${id}`).join("&");
+        const updates = await apiFetchJson<SupplierReport[]>(`/supplier/reports/status?${query}`);
+        const byId = new Map(updates.map((report) => [report.id, report]));
+        setReports((current) => current.map((report) => byId.get(report.id) ?? report));
+        setSelectedReport((current) => (current && byId.get(current.id)) || current);
+      } catch (error) {
+        console.error("Failed to refresh pending reports:", error);
+      }
+    }, PENDING_POLL_MS);
+
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [pendingKey, reports]);
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setSubmitStatus(null);
@@ -245,7 +276,9 @@ const SupplierReports = () => {
       });
 
       setSubmitStatus(
-        `Report submitted successfully! Status: ${response.verification_status.toUpperCase()}`
+        response.verification_status === "pending"
+          ? "Report submitted successfully! Verification is running in the background."
+          : `Report submitted successfully! Status: ${response.verification_status.toUpperCase()}`
       );
 
       // Reset form
@@ -287,6 +320,13 @@ const SupplierReports = () => {
             Warning
           </Badge>
         );
+      case "pending":
+        return (
+          <Badge className="bg-slate-500/20 text-slate-300 border-slate-500/30">
+            <FileText className="w-3 h-3 mr-1" />
+            Pending
+          </Badge>
+        );
       case "flagged":
         return (
           <Badge className="bg-red-500/20 text-red-400 border-red-500/30">
@@ -299,7 +339,8 @@ const SupplierReports = () => {
     }
   };
 
-  const calculateDifference = (reported: number, verified: number) => {
+  const calculateDifference = (reported: number, verified: number | null) => {
+    if (!verified) return "—";
     const diff = ((Math.abs(reported - verified) / verified) * 100).toFixed(1);
     return `${diff}%`;
   };
@@ -590,12 +631,12 @@ const SupplierReports = () => {
                 </div>
                 <div className="bg-black/30 p-4 rounded-lg border border-emerald/20">
                   <p className="text-sm text-emerald-400 mb-1">Verified Distance</p>
-                  <p className="text-white font-semibold">{selectedReport.verified_distance.toFixed(2)} km</p>
+                  <p className="text-white font-semibold">{formatValue(selectedReport.verified_distance, 2, "km")}</p>
                   <p className="text-xs text-muted-foreground mt-1">Reported: {selectedReport.reported_distance.toFixed(2)} km</p>
                 </div>
                 <div className="bg-black/30 p-4 rounded-lg border border-emerald/20">
                   <p className="text-sm text-emerald-400 mb-1">Verified Time</p>
-                  <p className="text-white font-semibold">{selectedReport.verified_time.toFixed(2)} hrs</p>
+                  <p className="text-white font-semibold">{formatValue(selectedReport.verified_time, 2, "hrs")}</p>
                   <p className="text-xs text-muted-foreground mt-1">Reported: {selectedReport.reported_time.toFixed(2)} hrs</p>
                 </div>
                 <div className="bg-black/30 p-4 rounded-lg border border-emerald/20">
@@ -663,9 +704,9 @@ const SupplierReports = () => {
                         <td className="py-3 pr-4 font-medium">{report.supplier_name}</td>
                         <td className="py-3 pr-4 capitalize">{report.vehicle_type}</td>
                         <td className="py-3 pr-4">{report.reported_distance.toFixed(1)} km</td>
-                        <td className="py-3 pr-4">{report.verified_distance.toFixed(1)} km</td>
+                        <td className="py-3 pr-4">{formatValue(report.verified_distance, 1, "km")}</td>
                         <td className="py-3 pr-4">{report.reported_time.toFixed(2)} hrs</td>
-                        <td className="py-3 pr-4">{report.verified_time.toFixed(2)} hrs</td>
+                        <td className="py-3 pr-4">{formatValue(report.verified_time, 2, "hrs")}</td>
                         <td className="py-3 pr-4">
                           {calculateDifference(
                             report.reported_distance,
@@ -673,7 +714,7 @@ const SupplierReports = () => {
                           )}
                         </td>
                         <td className="py-3 pr-4">{report.reported_co2.toFixed(2)} kg</td>
-                        <td className="py-3 pr-4">{report.verified_co2.toFixed(2)} kg</td>
+                        <td className="py-3 pr-4">{formatValue(report.verified_co2, 2, "kg")}</td>
                         <td className="py-3 pr-4">{getStatusBadge(report.verification_status)}</td>
                         <td className="py-3 pr-4">
                           {new Date(report.created_at).toLocaleDateString()}
@@ -0,0 +1,137 @@
+"""
+Historical analytics over the Parquet archive (archive.py), queried with DuckDB.
+
+Days up to a table's archive watermark are read from the Parquet files (DuckDB
+skips day partitions outside the range and row groups by their statistics);
+days after it, normally just today, come from the database with the same
+aggregation, and the two are added together. Long-range questions never scan
+the transactional tables. Every answer reports which days came from where.
+
+Measures are sums and counts only, so the two halves merge exactly; ratios are
+computed after the merge. Needs duckdb (and an archive written with pyarrow).
+"""
+import os
+from datetime import timedelta
+
+from sqlalchemy import Date, func, select
+
+import archive
+from database import engine
+
+ANALYTICS_THREADS = int(os.getenv("ANALYTICS_THREADS", "2"))  # DuckDB threads per query
+
+_duckdb = False  # resolved on first use
+
+
+def _duckdb_module():
+    """duckdb, or None when it is not installed"""
+    global _duckdb
+    if _duckdb is False:
+        try:
+            import duckdb
+        except ImportError:
+            duckdb = None
+        _duckdb = duckdb
+    return _duckdb
+
+
+def available() -> bool:
+    return _duckdb_module() is not None
+
+
+def split(table: str, start=None, end=None):
+    """(archive range, database range) covering start..end; each (from, to) or None, None meaning open"""
+    through = archive.archived_through(table)
+    end = min(end, archive.today()) if end else None
+    if through is None:
+        return None, (start, end)
+    archived = (start, min(end, through) if end else through) if not start or start <= through else None
+    live_from = through + timedelta(days=1)
+    live = (max(start, live_from) if start else live_from, end) if not end or end > through else None
+    return archived, live
+
+
+def _from_archive(table: str, days: tuple, keys: list, measures: list, filters: list) -> list:
+    pattern = archive.ARCHIVE_DIR / table / "day=*" / "data.parquet"
+    if not any(pattern.parent.parent.glob("day=*/data.parquet")):
+        return []
+    where, params = [], [str(pattern)]
+    if days[0]:
+        where.append("day >= ?")
+        params.append(days[0])
+    if days[1]:
+        where.append("day <= ?")
+        params.append(days[1])
+    for column, value in filters:
+        where.append(f"{column} = ?")
+        params.append(value)
+    sql = "SELECT {columns} FROM read_parquet(?, hive_partitioning = true){where} GROUP BY ALL".format(
+        columns=", ".join([sql for _, sql, _, _ in keys] + [sql for _, sql, _ in measures]),
+        where=" WHERE " + " AND ".join(where) if where else "",
+    )
+    conn = _duckdb_module().connect(config={"threads": ANALYTICS_THREADS})
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _from_database(time_column, days: tuple, keys: list, measures: list, filters: list) -> list:
+    key_columns = [expression for _, _, expression, _ in keys]
+    statement = select(*key_columns, *[expression for _, _, expression in measures])
+    if days[0]:
+        statement = statement.where(time_column >= days[0])
+    if days[1]:
+        statement = statement.where(time_column < days[1] + timedelta(days=1))
+    for column, value in filters:
+        statement = statement.where(column == value)
+    with engine.connect() as conn:
+        rows = conn.execute(statement.group_by(*key_columns)).all()
+    return [tuple(convert(value) for (_, _, _, convert), value in zip(keys, row)) + tuple(row[len(keys):])
+            for row in rows]
+
+
+def aggregate(table: str, start, end, keys: list, measures: list, filters: list = ()) -> dict:
+    """
+    Additive aggregates of a table between two dates, merged across archive and database.
+
+    keys:     (name, DuckDB expression, SQLAlchemy expression, converter of the database value)
+    measures: (name, DuckDB aggregate, SQLAlchemy aggregate), sums or counts
+    filters:  (model column, value) equality filters
+    """
+    archived, live = split(table, start, end)
+    time_column = archive.TABLES[table].time_column
+    merged = {}
+    rows = []
+    if archived:
+        rows += _from_archive(table, archived, keys, measures, [(column.key, value) for column, value in filters])
+    if live:
+        rows += _from_database(time_column, live, keys, measures, filters)
+    for row in rows:
+        key = row[:len(keys)]
+        totals = merged.setdefault(key, [0] * len(measures))
+        for i, value in enumerate(row[len(keys):]):
+            totals[i] += value or 0
+    return {
+        "rows": [
+            dict(zip([name for name, _, _, _ in keys], key), **dict(zip([name for name, _, _ in measures], totals)))
+            for key, totals in merged.items()
+        ],
+        "sources": {
+            "archive": None if archived is None else {"from": archived[0], "to": archived[1]},
+            "database": None if live is None else {"from": live[0], "to": live[1]},
+        },
+    }
+
+
+def day_key(name: str, time_column) -> tuple:
+    return (name, "strftime(day, '%Y-%m-%d')", func.date(time_column, type_=Date), str)
+
+
+def month_key(name: str, time_column) -> tuple:
+    # Database rows are grouped by day and folded into months when merged
+    return (name, "strftime(day, '%Y-%m')", func.date(time_column, type_=Date), lambda day: str(day)[:7])
+
+
+def column_key(name: str, column) -> tuple:
+    return (name, column.key, column, lambda value: value)
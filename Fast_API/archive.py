@@ -0,0 +1,225 @@
+"""
+Columnar archive of closed days: trips, gps_tracking and supplier_reports as
+date-partitioned Parquet under ARCHIVE_DIR, for analytics.py.
+
+    python archive.py                          archive every closed day not yet archived
+    python archive.py --rebuild-from 2026-01-01 --table trips
+    python archive.py --status
+
+Layout is hive-style, one file per table and UTC day:
+
+    archive/trips/day=2026-03-14/data.parquet
+
+Rows are sorted (by time, GPS by vehicle then time) and written in row groups
+of ARCHIVE_ROW_GROUP_SIZE with min/max statistics, so a query engine skips
+files by day and row groups by time or vehicle. Each table has a watermark
+(_archived_through): every day up to it is archived, empty days included, and
+nothing after it is. A closed day is written once; rows inserted later for an
+archived day (a backfill or seed) need --rebuild-from.
+
+The app runs archive_closed_days every ARCHIVE_INTERVAL_SECONDS (0 turns it
+off); on Postgres an advisory lock keeps it to one worker. The source rows stay
+in the database. Needs pyarrow.
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Boolean, DateTime, Float, Integer, func, select, text
+
+from database import engine
+from models import GPSTrack, SupplierReport, Trip
+import structured_log
+
+log = structured_log.get_logger("archive")
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(Path(__file__).parent / "archive")))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "900"))
+ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "100000"))
+ADVISORY_LOCK_KEY = 7202648  # arbitrary, distinct from migrate.py's
+
+WATERMARK = "_archived_through"
+
+
+class Table:
+    def __init__(self, model, time_column: str, sort: list):
+        self.model = model
+        self.name = model.__tablename__
+        self.columns = list(model.__table__.columns)
+        self.time_column = getattr(model, time_column)
+        self.sort = [getattr(model, name) for name in sort]
+
+
+TABLES = {
+    table.name: table for table in (
+        Table(Trip, "created_at", ["created_at"]),
+        Table(GPSTrack, "timestamp", ["vehicle_id", "timestamp"]),
+        Table(SupplierReport, "created_at", ["created_at"]),
+    )
+}
+
+_pyarrow = False  # resolved on first use; pyarrow is slow to import
+
+
+def _pa():
+    """(pyarrow, pyarrow.parquet), or None when pyarrow is not installed"""
+    global _pyarrow
+    if _pyarrow is False:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            _pyarrow = (pyarrow, pyarrow.parquet)
+        except ImportError:
+            _pyarrow = None
+    return _pyarrow
+
+
+def today() -> date:
+    """Current UTC day; timestamps are stored in UTC, so this is the day still open"""
+    return datetime.utcnow().date()
+
+
+def day_path(table: str, day: date) -> Path:
+    return ARCHIVE_DIR / table / f"day={day.isoformat()}" / "data.parquet"
+
+
+def archived_through(table: str):
+    """Last archived day of a table, or None"""
+    try:
+        return date.fromisoformat((ARCHIVE_DIR / table / WATERMARK).read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _set_watermark(table: str, day: date):
+    path = ARCHIVE_DIR / table / WATERMARK
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(day.isoformat())
+    os.replace(tmp, path)
+
+
+def _schema(pa, table: Table):
+    def arrow_type(column):
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        return pa.string()
+
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in table.columns])
+
+
+def archive_day(conn, table: Table, day: date) -> int:
+    """Write one day of a table to its partition (replacing it); returns the row count"""
+    pa, pq = _pa()
+    schema = _schema(pa, table)
+    start = datetime.combine(day, datetime.min.time())
+    statement = select(*table.columns).where(
+        table.time_column >= start, table.time_column < start + timedelta(days=1)
+    ).order_by(*table.sort)
+    result = conn.execution_options(yield_per=ARCHIVE_ROW_GROUP_SIZE).execute(statement)
+
+    path = day_path(table.name, day)
+    tmp = path.with_suffix(".parquet.tmp")
+    writer = None
+    rows = 0
+    try:
+        for partition in result.partitions():
+            if writer is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd", write_statistics=True)
+            columns = list(zip(*partition))
+            writer.write_table(
+                pa.Table.from_arrays([pa.array(values, field.type) for values, field in zip(columns, schema)], schema=schema),
+                row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+            )
+            rows += len(partition)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp, path)
+    else:
+        path.unlink(missing_ok=True)  # a rebuilt day that is now empty
+    return rows
+
+
+def archive_table(conn, table: Table, rebuild_from: date = None) -> int:
+    """Archive closed days after the watermark (or from rebuild_from); returns the days written"""
+    last_closed = today() - timedelta(days=1)
+    through = archived_through(table.name)
+    if rebuild_from is not None:
+        day = rebuild_from
+    elif through is not None:
+        day = through + timedelta(days=1)
+    else:
+        oldest = conn.execute(select(func.min(table.time_column))).scalar()
+        if oldest is None:
+            return 0  # nothing recorded yet; start from the first row once there is one
+        day = oldest.date()
+
+    written = 0
+    while day <= last_closed:
+        rows = archive_day(conn, table, day)
+        conn.commit()  # one read transaction per day, not per run
+        _set_watermark(table.name, day)
+        if rows:
+            written += 1
+            log.info("day archived", table=table.name, day=day.isoformat(), rows=rows)
+        day += timedelta(days=1)
+    return written
+
+
+def archive_closed_days(tables: list = None, rebuild_from: date = None) -> int:
+    """Archive every closed day not yet archived; returns the days written (0 if another worker holds the lock)"""
+    if _pa() is None:
+        raise RuntimeError("the Parquet archive needs pyarrow (pip install pyarrow)")
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres and not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": ADVISORY_LOCK_KEY}).scalar():
+            return 0
+        try:
+            return sum(archive_table(conn, TABLES[name], rebuild_from) for name in (tables or TABLES))
+        finally:
+            conn.rollback()
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": ADVISORY_LOCK_KEY})
+
+
+async def run_archiver():
+    """Lifespan task: archive closed days every ARCHIVE_INTERVAL_SECONDS"""
+    if ARCHIVE_INTERVAL_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(archive_closed_days)
+        except Exception as e:
+            log.warning("archive run failed", error=str(e), every=3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed days to Parquet")
+    parser.add_argument("--table", action="append", choices=list(TABLES), help="only this table (repeatable)")
+    parser.add_argument("--rebuild-from", type=date.fromisoformat, help="re-archive closed days from this date")
+    parser.add_argument("--status", action="store_true", help="show each table's watermark")
+    args = parser.parse_args()
+    if args.status:
+        for name in args.table or TABLES:
+            through = archived_through(name)
+            log.info("archive status", table=name, archived_through=through.isoformat() if through else None)
+        return
+    days = archive_closed_days(args.table, args.rebuild_from)
+    log.info("archive run finished", days_written=days, archive_dir=str(ARCHIVE_DIR))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Emission-minimizing shipment-to-vehicle assignment.
+
+Each shipment (distance, weight, time window) goes to at most one truck, and a
+truck carries at most one shipment at a time. Shipments whose time windows
+overlap (transitively) form a "wave"; waves don't overlap in time, so every
+truck is available again in the next wave. Within a wave this is a rectangular
+min-cost matching on
+
+    cost[shipment, truck] = distance_km × weight × EmissionFactor(truck)
+
+with pairs over the truck's capacity excluded. Infeasible pairs carry a penalty
+larger than any feasible assignment, so the solver first maximizes the number
+of shipments placed and then minimizes CO2 among those placements.
+
+scipy's linear_sum_assignment is used when installed; otherwise an equivalent
+numpy min-cost flow over truck classes gives the same optimum. The fallback is
+fast for fleets built from a few standard vehicle sizes and slows down as the
+number of distinct (vehicle type, capacity) combinations grows.
+"""
+import numpy as np
+
+from emissions import emission_factor_array
+
+_linear_sum_assignment = False  # resolved on first use; scipy is slow to import
+
+
+def _scipy_solver():
+    """scipy's linear_sum_assignment, or None when scipy is not installed"""
+    global _linear_sum_assignment
+    if _linear_sum_assignment is False:
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:
+            linear_sum_assignment = None
+        _linear_sum_assignment = linear_sum_assignment
+    return _linear_sum_assignment
+
+
+def solver_name() -> str:
+    return "scipy" if _scipy_solver() is not None else "class-flow"
+
+UNASSIGNED_NO_CAPACITY = "no truck with enough capacity"
+UNASSIGNED_FLEET_BUSY = "all suitable trucks busy in this time window"
+
+
+def _scipy_assign(load, weight, factors, capacity) -> np.ndarray:
+    """Truck index per shipment (-1 = unassigned) via linear_sum_assignment"""
+    co2 = load[:, None] * factors[None, :]
+    feasible = weight[:, None] <= capacity[None, :]
+    penalty = float(co2[feasible].sum()) + 1.0
+    rows, columns = _scipy_solver()(np.where(feasible, co2, penalty))
+
+    truck = np.full(len(load), -1, dtype=np.int64)
+    keep = feasible[rows, columns]
+    truck[rows[keep]] = columns[keep]
+    return truck
+
+
+def _class_flow_assign(load, weight, factors, capacity) -> np.ndarray:
+    """
+    Same optimum without scipy. Trucks with the same emission factor and capacity
+    are interchangeable, so they collapse into classes with a truck count and the
+    problem becomes a min-cost flow from shipments to classes. Successive shortest
+    paths (Bellman-Ford over the k classes, vectorized over shipments) add one
+    shipment per round until no augmenting path is left, which yields the largest
+    number of placed shipments at minimal CO2.
+    """
+    # Only which shipments a truck can carry matters, not its exact capacity
+    weight_levels = np.unique(weight)
+    capacity_level = np.searchsorted(weight_levels, capacity, side="right")
+    classes, truck_class = np.unique(np.stack([factors, capacity_level], axis=1), axis=0, return_inverse=True)
+    truck_class = truck_class.ravel()
+    k = len(classes)
+    spare = np.bincount(truck_class, minlength=k)
+
+    shipment_level = np.searchsorted(weight_levels, weight, side="right")
+    cost = load[:, None] * classes[None, :, 0]
+    cost[shipment_level[:, None] > classes[None, :, 1]] = np.inf
+    n = len(load)
+    shipment_class = np.full(n, -1, dtype=np.int64)
+
+    while True:
+        unmatched = np.flatnonzero(shipment_class < 0)
+        if not len(unmatched):
+            break
+
+        # Entering the network: cheapest unmatched shipment per class
+        entry = cost[unmatched]
+        entry_best = np.argmin(entry, axis=0)
+        dist = entry[entry_best, np.arange(k)]
+        pred_class = np.full(k, -1, dtype=np.int64)
+        pred_shipment = unmatched[entry_best]
+        if not np.isfinite(dist).any():
+            break
+
+        # Moving a placed shipment from class a to class b costs cost[s, b] - cost[s, a]
+        matched = np.flatnonzero(shipment_class >= 0)
+        move = np.full((k, k), np.inf)
+        move_shipment = np.zeros((k, k), dtype=np.int64)
+        if len(matched):
+            # Cheapest move out of each class: segment minimum over shipments grouped by class
+            current = shipment_class[matched]
+            order = np.argsort(current, kind="stable")
+            matched, current = matched[order], current[order]
+            delta = cost[matched] - cost[matched, current][:, None]
+            present, starts = np.unique(current, return_index=True)
+            move[present] = np.minimum.reduceat(delta, starts, axis=0)
+            rows, columns = np.nonzero(delta == move[current])
+            move_shipment[current[rows], columns] = matched[rows]
+            np.fill_diagonal(move, np.inf)
+
+            for _ in range(k):
+                through = dist[:, None] + move
+                best_from = np.argmin(through, axis=0)
+                candidate = through[best_from, np.arange(k)]
+                improved = candidate < dist - 1e-9
+                if not improved.any():
+                    break
+                dist[improved] = candidate[improved]
+                pred_class[improved] = best_from[improved]
+                pred_shipment[improved] = move_shipment[best_from[improved], np.flatnonzero(improved)]
+
+        open_classes = np.where(spare > 0, dist, np.inf)
+        target = int(np.argmin(open_classes))
+        if not np.isfinite(open_classes[target]):
+            break
+
+        # Walk back along the path, moving each shipment into the next class
+        spare[target] -= 1
+        node = target
+        while True:
+            shipment = pred_shipment[node]
+            previous = pred_class[node]
+            shipment_class[shipment] = node
+            if previous < 0:
+                break
+            node = previous
+
+    # Hand out concrete trucks within each class
+    truck = np.full(n, -1, dtype=np.int64)
+    for c in range(k):
+        members = np.flatnonzero(shipment_class == c)
+        truck[members] = np.flatnonzero(truck_class == c)[:len(members)]
+    return truck
+
+
+def waves(window_start, window_end) -> list:
+    """Group shipment indices into runs of transitively overlapping time windows"""
+    start = np.asarray(window_start)
+    end = np.asarray(window_end)
+    order = np.argsort(start, kind="stable")
+
+    groups = []
+    current = []
+    current_end = None
+    for index in order:
+        if current and start[index] >= current_end:
+            groups.append(current)
+            current = []
+        if not current:
+            current_end = end[index]
+        current.append(int(index))
+        current_end = max(current_end, end[index])
+    if current:
+        groups.append(current)
+    return groups
+
+
+def assign(distance_km, weight, window_start, window_end, capacity_tons, vehicle_types) -> dict:
+    """
+    Assign shipments to trucks.
+    Returns truck (index per shipment, -1 if unassigned), co2 (per shipment, NaN if
+    unassigned), reason (per shipment, None if assigned) and the number of waves.
+    """
+    distance_km = np.asarray(distance_km, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    capacity = np.asarray(capacity_tons, dtype=float)
+    factors = emission_factor_array(vehicle_types)
+
+    num_shipments = len(distance_km)
+    truck = np.full(num_shipments, -1, dtype=np.int64)
+    co2 = np.full(num_shipments, np.nan)
+    fits_any = weight <= (capacity.max() if len(capacity) else -np.inf)
+
+    groups = waves(window_start, window_end) if num_shipments else []
+    for group in groups:
+        group = np.asarray(group)
+        group_load = distance_km[group] * weight[group]
+        if _scipy_solver() is not None:
+            group_truck = _scipy_assign(group_load, weight[group], factors, capacity)
+        else:
+            group_truck = _class_flow_assign(group_load, weight[group], factors, capacity)
+
+        placed = group_truck >= 0
+        truck[group[placed]] = group_truck[placed]
+        co2[group[placed]] = group_load[placed] * factors[group_truck[placed]]
+
+    reason = [
+        None if truck[i] >= 0 else (UNASSIGNED_FLEET_BUSY if fits_any[i] else UNASSIGNED_NO_CAPACITY)
+        for i in range(num_shipments)
+    ]
+    return {"truck": truck, "co2": co2, "reason": reason, "waves": len(groups)}
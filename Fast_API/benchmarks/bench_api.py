@@ -0,0 +1,283 @@
+"""
+End-to-end HTTP load test of the API, in-process, against a local database.
+
+The app runs in this process behind httpx's ASGI transport (full middleware,
+validation and serialization, no network), on a fresh SQLite file by default
+(DB_PROFILE=sqlite) or the local Postgres profile. The database is seeded by
+seed_synthetic.py (skewed routes and fleets, GPS tracks), then each scenario
+runs for a fixed time with N concurrent clients:
+
+    gps_ingest        bursts of POST /gps/update per vehicle
+    dashboard         the dashboard page: summary, trends, charts, recent trips
+    live_tracker      polling live positions and the truck list
+    supplier          supplier report submission and status polling
+    credits           credit balance checks and small redemptions
+
+Per endpoint it reports req/s, p50/p95/p99 latency, errors and SQL statements
+per request, and compares with a stored baseline (benchmarks/baselines/api.json,
+recorded on one machine; re-record with --save-baseline when the hardware changes).
+Every request is audited by query_audit.py; query budget overruns count as
+regressions:
+
+    python benchmarks/bench_api.py --save-baseline
+    python benchmarks/bench_api.py --duration 10 --concurrency 32
+    python benchmarks/bench_api.py --profile postgres-local --fail-on-regression
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+API_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(API_DIR))
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "api.json"
+
+SCENARIOS = ["gps_ingest", "dashboard", "live_tracker", "supplier", "credits"]
+
+# Endpoint being measured by the current client task; SQL is attributed to it
+current_endpoint = contextvars.ContextVar("current_endpoint", default=None)
+
+
+def configure_database(profile: str, url: str = None):
+    """Point database.py at a local database; must run before main is imported"""
+    os.environ["DB_PROFILE"] = profile
+    if url:
+        os.environ["LOCAL_DATABASE_URL"] = url
+    elif profile == "sqlite":
+        path = Path(tempfile.mkdtemp(prefix="bench_api_")) / "bench.db"
+        os.environ["LOCAL_DATABASE_URL"] = f"sqlite:///{path}"
+    # A fresh database: create the schema at startup, on local Postgres too
+    os.environ.setdefault("AUTO_CREATE_SCHEMA", "true")
+    os.environ.setdefault("WARM_SCENARIO_CACHE", "false")
+    # Audit every request against query_audit.QUERY_BUDGETS
+    os.environ.setdefault("QUERY_AUDIT_SAMPLE_RATE", "1")
+    # Measure capacity, not throttle.py's limits (one client drives every request)
+    os.environ.setdefault("THROTTLE_ENABLED", "false")
+
+
+def scenario_requests(name: str, rng: random.Random, ids: dict) -> list:
+    """
+    One client iteration: (endpoint label, method, path, json body) in order.
+    A callable path is built from the previous response's JSON.
+    """
+    vehicle = rng.choice(ids["vehicle_ids"])
+    company = rng.choice(ids["company_ids"])
+    if name == "gps_ingest":
+        return [
+            ("POST /gps/update", "POST", "/gps/update", {
+                "vehicle_id": vehicle, "latitude": 18.5 + rng.random(), "longitude": 73.8 + rng.random(),
+                "distance_segment": 0.5,
+            })
+            for _ in range(10)
+        ]
+    if name == "dashboard":
+        return [
+            ("GET /stats/summary", "GET", "/stats/summary", None),
+            ("GET /footprint/daily/trend", "GET", "/footprint/daily/trend", None),
+            ("GET /footprint/monthly", "GET", "/footprint/monthly", None),
+            ("GET /insights/summary", "GET", "/insights/summary", None),
+            ("GET /charts/routes", "GET", "/charts/routes", None),
+            ("GET /charts/vehicles", "GET", "/charts/vehicles", None),
+            ("GET /trips/recent", "GET", "/trips/recent", None),
+        ]
+    if name == "live_tracker":
+        return [
+            ("GET /gps/live/{vehicle_id}", "GET", f"/gps/live/{vehicle}", None),
+            ("GET /gps/live/{vehicle_id}", "GET", f"/gps/live/{rng.choice(ids['vehicle_ids'])}", None),
+            ("GET /trucks", "GET", "/trucks", None),
+        ]
+    if name == "supplier":
+        return [
+            ("POST /supplier/report", "POST", "/supplier/report", {
+                "supplier_name": f"Supplier {rng.randint(1, 20)}",
+                "start_lat": 18.52 + rng.random() * 0.1, "start_lng": 73.85 + rng.random() * 0.1,
+                "end_lat": 19.07 + rng.random() * 0.1, "end_lng": 72.87 + rng.random() * 0.1,
+                "reported_distance": 150.0, "reported_time": 3.5, "vehicle_type": "diesel", "weight": 5.0,
+            }),
+            # Poll the report just submitted
+            ("GET /supplier/reports/status", "GET",
+             lambda previous: f"/supplier/reports/status?ids={previous['id']}", None),
+        ]
+    if name == "credits":
+        return [
+            ("GET /carbon-credits/{company_id}", "GET", f"/carbon-credits/{company}", None),
+            ("POST /carbon-credits/{company_id}/redeem", "POST", f"/carbon-credits/{company}/redeem",
+             {"credits_to_redeem": 1.0}),
+        ]
+    raise ValueError(f"unknown scenario {name}")
+
+
+async def run_scenario(client, name: str, ids: dict, duration: float, concurrency: int, seed_value: int) -> dict:
+    """Run `concurrency` clients for `duration` seconds; returns per-endpoint samples"""
+    samples = defaultdict(lambda: {"latency": [], "errors": 0, "queries": 0})
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(worker: int):
+        rng = random.Random(seed_value * 1000 + worker)
+        while time.perf_counter() < deadline:
+            previous = None
+            for label, method, path, body in scenario_requests(name, rng, ids):
+                if callable(path):
+                    if previous is None:
+                        continue  # the request it depends on failed
+                    path = path(previous)
+                counter = [0]
+                current_endpoint.set(counter)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    failed = response.status_code >= 400
+                    previous = None if failed else response.json()
+                except Exception:
+                    failed = True
+                sample = samples[label]
+                sample["latency"].append(time.perf_counter() - started)
+                sample["errors"] += failed
+                sample["queries"] += counter[0]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(client_loop(w)) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for label, sample in samples.items():
+        latency_ms = np.array(sample["latency"]) * 1000
+        p50, p95, p99 = np.percentile(latency_ms, [50, 95, 99])
+        report[label] = {
+            "requests": len(latency_ms),
+            "errors": sample["errors"],
+            "rps": round(len(latency_ms) / elapsed, 1),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "queries_per_request": round(sample["queries"] / len(latency_ms), 2),
+        }
+    return report
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions against the baseline: slower p95, lower throughput or more queries"""
+    regressions = []
+    for scenario, endpoints in results.items():
+        for label, current in endpoints.items():
+            before = baseline.get(scenario, {}).get(label)
+            if not before:
+                continue
+            if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{scenario} {label}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+            if current["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{scenario} {label}: req/s {before['rps']} -> {current['rps']}")
+            if current["queries_per_request"] > before["queries_per_request"] + 0.5:
+                regressions.append(
+                    f"{scenario} {label}: queries/request {before['queries_per_request']} -> "
+                    f"{current['queries_per_request']}"
+                )
+    return regressions
+
+
+def print_report(results: dict, baseline: dict):
+    print(f"\n{'scenario':<13} {'endpoint':<40} {'reqs':>6} {'err':>4} {'req/s':>8} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'sql/req':>8} {'p95 base':>9}")
+    for scenario, endpoints in results.items():
+        for label, r in endpoints.items():
+            before = baseline.get(scenario, {}).get(label, {}).get("p95_ms", "-")
+            print(f"{scenario:<13} {label:<40} {r['requests']:>6} {r['errors']:>4} {r['rps']:>8} "
+                  f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['queries_per_request']:>8} {before:>9}")
+
+
+async def run(args) -> dict:
+    import httpx
+    from sqlalchemy import event
+    import database
+    import main
+    import readiness
+    import seed_synthetic
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter = current_endpoint.get()
+        if counter is not None:
+            counter[0] += 1
+
+    async with main.app.router.lifespan_context(main.app):
+        while not readiness.state.ready:
+            await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        today = date.today()
+        generated = seed_synthetic.generate(
+            database.engine, args.companies, args.trucks, args.trips, args.gps_points,
+            today - timedelta(days=89), today, args.seed,
+        )
+        ids = {"vehicle_ids": generated["truck_ids"], "company_ids": generated["company_ids"]}
+        print(f"seeded {args.trips:,} trips, {args.gps_points:,} GPS points, {args.trucks} trucks "
+              f"on {database.engine.url.render_as_string(hide_password=True)} in {time.perf_counter() - started:.1f}s")
+
+        event.listen(database.engine, "before_cursor_execute", count_statement)
+        transport = httpx.ASGITransport(app=main.app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios:
+                print(f"running {name} for {args.duration:.0f}s with {args.concurrency} clients")
+                results[name] = await run_scenario(client, name, ids, args.duration, args.concurrency, args.seed)
+        event.remove(database.engine, "before_cursor_execute", count_statement)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=["sqlite", "postgres-local"], default="sqlite")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file / the local Postgres default")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--duration", type=float, default=5, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--trips", type=int, default=20000)
+    parser.add_argument("--gps-points", type=int, default=50000)
+    parser.add_argument("--trucks", type=int, default=50)
+    parser.add_argument("--companies", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / req/s change vs baseline")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    configure_database(args.profile, args.database_url)
+    results = asyncio.run(run(args))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    import query_audit
+    overruns = Counter((v["endpoint"], v["budget"], v["statements"]) for v in query_audit.violations)
+    for (endpoint, budget, statements), count in sorted(overruns.items()):
+        regressions.append(f"{endpoint}: {statements} statements > budget {budget} ({count} requests)")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) vs baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        if args.fail_on_regression:
+            sys.exit(1)
+    elif baseline:
+        print("\nno regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark the /optimize/assign solver on synthetic fleets.
+
+Shipments get random distances, weights and 2-8 hour windows spread over a
+day; trucks get a mix of vehicle types and standard capacities. Reports solve
+time per size, which should stay under a second for a few hundred of each.
+Without scipy, fleets with many distinct capacities are the slow case and are
+timed separately.
+
+    python benchmarks/bench_assignment.py
+    python benchmarks/bench_assignment.py --sizes 100 300 500 --repeat 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import assignment  # noqa: E402
+
+
+def synthetic(shipments: int, trucks: int, window_hours: float, seed: int):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 24 * 3600, shipments)
+    end = start + rng.uniform(2, window_hours, shipments) * 3600
+    return {
+        "distance_km": rng.uniform(5, 800, shipments),
+        "weight": rng.uniform(0.5, 20, shipments),
+        "window_start": start,
+        "window_end": end,
+        "capacity_tons": rng.choice([5.0, 10.0, 20.0, 25.0], trucks),
+        "vehicle_types": rng.choice(["diesel", "petrol", "electric"], trucks, p=[0.6, 0.25, 0.15]).tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 300, 500])
+    parser.add_argument("--window-hours", type=float, default=8, help="max shipment window length")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"solver: {assignment.solver_name()}")
+    print(f"{'size':>6} {'waves':>6} {'assigned':>9} {'co2_kg':>12} {'median_s':>9} {'max_s':>7}")
+    for size in args.sizes:
+        data = synthetic(size, size, args.window_hours, args.seed)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = assignment.assign(**data)
+            timings.append(time.perf_counter() - started)
+        assigned = int((result["truck"] >= 0).sum())
+        co2 = float(np.nansum(result["co2"]))
+        print(f"{size:>6} {result['waves']:>6} {assigned:>9} {co2:>12.1f} {statistics.median(timings):>9.3f} {max(timings):>7.3f}")
+
+        # Harder case: one wave (every window overlaps) and no two trucks alike
+        data["window_start"] = np.zeros(size)
+        data["window_end"] = np.ones(size)
+        data["capacity_tons"] = np.random.default_rng(args.seed).uniform(5, 25, size)
+        started = time.perf_counter()
+        assignment.assign(**data)
+        print(f"{'':>6} single wave, distinct capacities: {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
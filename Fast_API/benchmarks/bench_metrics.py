@@ -0,0 +1,87 @@
+"""
+Overhead of request / DB metrics on the POST /gps/update hot path.
+
+Runs the same in-process load with METRICS_ENABLED=false and =true, alternating
+in fresh interpreters (each on its own SQLite file), and reports req/s, mean
+latency and the relative overhead of the instrumented runs.
+
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --requests 5000 --rounds 5 --concurrency 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+WORKER = """
+import asyncio, json, sys, time
+sys.path.insert(0, {bench_dir!r})
+from bench_api import configure_database
+configure_database("sqlite")
+import httpx, main, readiness
+
+async def run(requests, concurrency):
+    async with main.app.router.lifespan_context(main.app):
+        while not readiness.state.ready:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            body = {{"vehicle_id": "TRK-1", "latitude": 18.5, "longitude": 73.8, "distance_segment": 0.5}}
+            for _ in range(200):  # warm-up
+                await client.post("/gps/update", json=body)
+            per_client = requests // concurrency
+            latencies = []
+
+            async def loop():
+                for _ in range(per_client):
+                    started = time.perf_counter()
+                    await client.post("/gps/update", json=body)
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    print(json.dumps({{"rps": len(latencies) / elapsed, "mean_ms": sum(latencies) / len(latencies) * 1000}}))
+
+asyncio.run(run({requests}, {concurrency}))
+"""
+
+
+def run_once(enabled: bool, requests: int, concurrency: int) -> dict:
+    env = dict(os.environ, METRICS_ENABLED="true" if enabled else "false")
+    code = WORKER.format(bench_dir=str(BENCH_DIR), requests=requests, concurrency=concurrency)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BENCH_DIR.parent, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            results[enabled].append(run_once(enabled, args.requests, args.concurrency))
+
+    print(f"{'metrics':>8} {'req/s':>9} {'mean_ms':>8}")
+    summary = {}
+    for enabled, runs in results.items():
+        rps = statistics.median(r["rps"] for r in runs)
+        mean_ms = statistics.median(r["mean_ms"] for r in runs)
+        summary[enabled] = rps
+        print(f"{'on' if enabled else 'off':>8} {rps:>9.1f} {mean_ms:>8.3f}")
+    print(f"overhead: {(1 - summary[True] / summary[False]) * 100:.1f}% throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the offline road-graph routing provider (queries/sec).
+
+Uses a real OSM GraphML export when --graph is given, otherwise a synthetic
+regional road grid (jittered nodes, mixed road classes, some missing links).
+
+    python benchmarks/bench_road_graph.py --grid 300 --queries 200
+    python benchmarks/bench_road_graph.py --graph maharashtra.graphml
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from road_graph import RoadGraph, build_csr  # noqa: E402
+
+
+def synthetic_grid(size: int, spacing_deg: float = 0.005, seed: int = 7):
+    """size x size grid around Pune with arterial roads every 10 rows/cols"""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    node_lat = 18.0 + rows * spacing_deg + rng.normal(0, spacing_deg * 0.15, size * size)
+    node_lon = 73.0 + cols * spacing_deg + rng.normal(0, spacing_deg * 0.15, size * size)
+
+    ids = np.arange(size * size).reshape(size, size)
+    horizontal = np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1)
+    vertical = np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1)
+    pairs = np.concatenate([horizontal, vertical])
+
+    # Drop ~5% of links so paths are not trivially Manhattan
+    pairs = pairs[rng.random(len(pairs)) > 0.05]
+
+    u, v = pairs[:, 0], pairs[:, 1]
+    arterial = ((rows[u] % 10 == 0) & (rows[v] % 10 == 0)) | ((cols[u] % 10 == 0) & (cols[v] % 10 == 0))
+    speed = np.where(arterial, 80.0, 30.0)
+
+    lat_m = np.radians(node_lat[v] - node_lat[u]) * 6371000
+    lon_m = np.radians(node_lon[v] - node_lon[u]) * 6371000 * np.cos(np.radians(node_lat[u]))
+    length = np.hypot(lat_m, lon_m)
+
+    # Two-way roads
+    sources = np.concatenate([u, v])
+    targets = np.concatenate([v, u])
+    return node_lat, node_lon, sources, targets, np.concatenate([length, length]), np.concatenate([speed, speed])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", help="osmnx GraphML file (default: synthetic grid)")
+    parser.add_argument("--grid", type=int, default=300, help="synthetic grid side length")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-km", type=float, default=50, help="max straight-line query length")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        if args.graph:
+            graph = RoadGraph.from_file(args.graph)
+            source = args.graph
+        else:
+            arrays = build_csr(*synthetic_grid(args.grid))
+            RoadGraph.save(arrays, tmp)
+            graph = RoadGraph.load_cache(tmp)
+            source = f"synthetic {args.grid}x{args.grid} grid"
+        prepare_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        reloaded = RoadGraph.from_file(args.graph) if args.graph else RoadGraph.load_cache(tmp)
+        mmap_load_s = time.perf_counter() - started
+        del reloaded
+
+        print(f"Graph: {source}: {graph.num_nodes:,} nodes, {graph.num_edges:,} edges")
+        print(f"Preprocess+cache: {prepare_s:.2f}s, memory-mapped reload: {mmap_load_s * 1000:.1f}ms")
+
+        rng = np.random.default_rng(args.seed)
+        node_lat = np.asarray(graph.node_lat)
+        node_lon = np.asarray(graph.node_lon)
+        pairs = []
+        while len(pairs) < args.queries:
+            a, b = rng.integers(0, graph.num_nodes, 2)
+            km = np.hypot(node_lat[a] - node_lat[b], (node_lon[a] - node_lon[b]) * np.cos(np.radians(node_lat[a]))) * 111.2
+            if km <= args.max_km:
+                pairs.append((node_lat[a], node_lon[a], node_lat[b], node_lon[b]))
+
+        latencies = []
+        routed = 0
+        started = time.perf_counter()
+        for start_lat, start_lng, end_lat, end_lng in pairs:
+            t0 = time.perf_counter()
+            if graph.route(start_lat, start_lng, end_lat, end_lng) is not None:
+                routed += 1
+            latencies.append(time.perf_counter() - t0)
+        total_s = time.perf_counter() - started
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"Queries: {len(pairs)} (<= {args.max_km:g} km), routed: {routed}")
+        print(f"Throughput: {len(pairs) / total_s:.1f} queries/sec")
+        print(f"Latency: p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Serialization cost of 10k-row list payloads, per response path.
+
+    jsonable_encoder     no response_model: FastAPI's jsonable_encoder + json.dumps
+    response_model       validate every row against the model, then pydantic dump_json
+                         (FastAPI's path for a declared response_model; ORM rows
+                         validated with from_attributes, as /supplier/reports did)
+    fast_json            fast_json.FastJSONResponse on plain column dicts (orjson)
+    fast_json (stdlib)   the same without orjson installed
+
+Payloads mirror /trips/recent, /gps/history and /supplier/reports rows.
+
+    python benchmarks/bench_serialization.py
+    python benchmarks/bench_serialization.py --rows 50000 --repeat 9
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import fast_json  # noqa: E402
+from models import SupplierReport  # noqa: E402
+from schemas import GPSPoint, SupplierReportResponse, TripSummary  # noqa: E402
+
+
+def trips(rows: int, rng: random.Random) -> list:
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "id": i,
+            "vehicle_type": rng.choice(["diesel", "petrol", "electric"]),
+            "start_location": rng.choice(["Pune", "Mumbai", "Delhi", "Chennai"]),
+            "end_location": rng.choice(["Nagpur", "Surat", "Jaipur", "Goa"]),
+            "distance_km": round(rng.uniform(5, 900), 1),
+            "co2_kg": round(rng.uniform(1, 400), 2),
+            "created_at": start + timedelta(seconds=rng.randrange(90 * 86400)),
+        }
+        for i in range(rows)
+    ]
+
+
+def gps_points(rows: int, rng: random.Random) -> list:
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "id": i,
+            "lat": 18.5 + rng.random(),
+            "lng": 73.8 + rng.random(),
+            "distance_segment": round(rng.uniform(0, 0.5), 4),
+            "co2_segment": round(rng.uniform(0, 0.15), 4),
+            "timestamp": start + timedelta(seconds=30 * i),
+        }
+        for i in range(rows)
+    ]
+
+
+def supplier_reports(rows: int, rng: random.Random) -> list:
+    start = datetime(2026, 1, 1)
+    reports = []
+    for i in range(rows):
+        reported = rng.uniform(20, 900)
+        reports.append({
+            "id": i, "supplier_name": f"Supplier {i % 40}",
+            "start_lat": 18.5 + rng.random(), "start_lng": 73.8 + rng.random(),
+            "end_lat": 19.0 + rng.random(), "end_lng": 72.8 + rng.random(),
+            "reported_distance": reported, "reported_time": reported / 55,
+            "verified_distance": reported * rng.uniform(0.9, 1.2), "verified_time": reported / 50,
+            "vehicle_type": "diesel", "weight": rng.uniform(1, 20),
+            "reported_co2": reported * 0.27, "verified_co2": reported * 0.29,
+            "verification_status": rng.choice(["verified", "warning", "flagged"]),
+            "route_id": None, "route_polyline": None,
+            "created_at": start + timedelta(minutes=i),
+        })
+    return reports
+
+
+def timed(func, repeat: int) -> float:
+    func()  # warm-up (pydantic builds validators lazily)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def stdlib_dumps(content) -> bytes:
+    return json.dumps(content, default=fast_json._default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    if fast_json.orjson is None:
+        print("orjson not installed: fast_json falls back to stdlib json\n")
+
+    payloads = [
+        ("trips/recent", trips(args.rows, rng), TripSummary, None),
+        ("gps/history", gps_points(args.rows, rng), GPSPoint, None),
+        ("supplier/reports", supplier_reports(args.rows, rng), SupplierReportResponse, SupplierReport),
+    ]
+    print(f"{args.rows:,} rows per payload, median of {args.repeat}\n")
+    print(f"{'payload':<18} {'path':<20} {'ms':>9} {'MB':>6} {'speedup':>8}")
+    for name, rows, model, orm_class in payloads:
+        adapter = TypeAdapter(list[model])
+        # What the response_model path receives: ORM objects where the endpoint returned them
+        source = [orm_class(**{k: v for k, v in row.items() if k != "route_polyline"}) for row in rows] \
+            if orm_class else rows
+        size = len(fast_json.dumps(rows)) / 1e6
+        paths = [
+            ("jsonable_encoder", lambda: JSONResponse(jsonable_encoder(rows)).body),
+            ("response_model", lambda: adapter.dump_json(adapter.validate_python(source, from_attributes=True))),
+            ("fast_json", lambda: fast_json.FastJSONResponse(rows).body),
+            ("fast_json (stdlib)", lambda: stdlib_dumps(rows)),
+        ]
+        baseline = None
+        for label, func in paths:
+            ms = timed(func, args.repeat)
+            baseline = baseline or ms
+            print(f"{name:<18} {label:<20} {ms:>9.2f} {size:>6.2f} {baseline / ms:>7.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark API startup: import time of main.py and first-request latency.
+
+Each measurement uses a fresh interpreter, so nothing is cached between runs.
+The server part starts uvicorn and reports when it first answers /health, when
+/health/ready turns 200 (database reachable, caches warm) and the latency of
+the first request that touches the database.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --skip-server
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def measure_import(repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=API_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def slowest_imports(limit: int) -> list:
+    """(cumulative_us, module) for the slowest top-level imports under main"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=API_DIR, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # Direct children of main are indented by exactly two spaces (after the separator's one)
+        if not name.startswith("   ") or name.startswith("     "):
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url: str, timeout: float = 5.0) -> tuple:
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def measure_server(ready_timeout: float, db_path: str) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {}
+    try:
+        while "first_response_s" not in result:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                get(f"{base}/health", timeout=1)
+                result["first_response_s"] = time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+
+        deadline = time.perf_counter() + ready_timeout
+        while time.perf_counter() < deadline:
+            status, _ = get(f"{base}/health/ready")
+            if status == 200:
+                result["ready_s"] = time.perf_counter() - started
+                break
+            time.sleep(0.05)
+        else:
+            result["ready_s"] = None
+
+        status, latency = get(f"{base}{db_path}", timeout=30)
+        result["first_db_request_status"] = status
+        result["first_db_request_s"] = latency
+        _, latency = get(f"{base}{db_path}", timeout=30)
+        result["second_db_request_s"] = latency
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-server", action="store_true", help="only measure import time")
+    parser.add_argument("--ready-timeout", type=float, default=30)
+    parser.add_argument("--db-path", default="/footprint/daily", help="endpoint used for the first DB request")
+    args = parser.parse_args()
+
+    timings = measure_import(args.repeat)
+    print(f"import main: median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms ({args.repeat} runs)")
+    print("slowest direct imports:")
+    for cumulative_us, name in slowest_imports(8):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if not args.skip_server:
+        print(json.dumps({k: round(v, 3) if isinstance(v, float) else v
+                          for k, v in measure_server(args.ready_timeout, args.db_path).items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Shared pytest setup: every test run gets its own SQLite database.
+
+The environment is set here, before any test module imports database.py, so
+the engine never points at a configured remote database.
+"""
+import os
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="carbon-tests-")
+os.environ["DB_PROFILE"] = "sqlite"
+os.environ["LOCAL_DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.pop("READ_DATABASE_URL", None)
+
+# Manual script against a running server, not a test module
+collect_ignore = ["test_api.py"]
+
+
+@pytest.fixture
+def db():
+    """Session on an empty schema (every table dropped and recreated)"""
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registers every table on Base.metadata)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def migrated_db():
+    """Session on a schema built by migrate.py, with its seed rows and triggers"""
+    from sqlalchemy import text
+
+    from database import Base, SessionLocal, engine
+    import migrate
+
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+        conn.execute(text("DROP TABLE IF EXISTS schema_migration_steps"))
+    migrate.migrate()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """TestClient on the app without its lifespan (no warm-up or background tasks), throttling off"""
+    from fastapi.testclient import TestClient
+
+    import main
+    import throttle
+
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", False)
+    return TestClient(main.app)
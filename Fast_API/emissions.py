@@ -0,0 +1,71 @@
+"""
+Emission factors and CO2 formulas shared by the API and batch helpers.
+"""
+import numpy as np
+
+# CO2 emission factors per km
+EMISSION_FACTORS = {
+    "diesel": 0.27,
+    "petrol": 0.24,
+    "electric": 0.02
+}
+
+# Factor used for unknown vehicle types
+DEFAULT_EMISSION_FACTOR = 0.27
+
+# Carbon credits earned per km travelled, by vehicle type
+CREDIT_MULTIPLIERS = {
+    "electric": 10,
+    "petrol": 3,
+    "diesel": 1
+}
+
+# Multiplier used for unknown vehicle types
+DEFAULT_CREDIT_MULTIPLIER = 1
+
+# Idle emission factors per hour (vehicle running but stationary)
+IDLE_FACTORS = {
+    "diesel": 0.15,
+    "petrol": 0.12,
+    "electric": 0.01
+}
+
+
+def calculate_co2_emissions(distance_km: float, weight: float, vehicle_type: str) -> float:
+    """
+    Calculate CO2 emissions using formula:
+    TransportCO₂ = Distance × Weight × EmissionFactor
+
+    Args:
+        distance_km: Distance traveled in kilometers
+        weight: Weight of goods in tons
+        vehicle_type: Type of vehicle (diesel, petrol, electric)
+
+    Returns:
+        CO2 emissions in kg
+    """
+    vehicle_type_lower = vehicle_type.lower()
+    emission_factor = EMISSION_FACTORS.get(vehicle_type_lower, DEFAULT_EMISSION_FACTOR)
+
+    # Calculate CO2: distance × weight × emission factor
+    co2 = distance_km * weight * emission_factor
+    return round(co2, 4)
+
+
+def emission_factor_array(vehicle_types) -> np.ndarray:
+    """
+    Map a sequence of vehicle type names to their emission factors.
+    Only the distinct names are looked up, so this stays cheap for large batches.
+    """
+    names = np.asarray([v.lower() for v in vehicle_types], dtype=object)
+    if names.size == 0:
+        return np.zeros(0)
+    unique_names, inverse = np.unique(names, return_inverse=True)
+    unique_factors = np.array([EMISSION_FACTORS.get(name, DEFAULT_EMISSION_FACTOR) for name in unique_names])
+    return unique_factors[inverse]
+
+
+def calculate_co2_emissions_array(distance_km, weight, emission_factors) -> np.ndarray:
+    """Vectorized calculate_co2_emissions: arrays of distance, weight and factor in, kg CO2 out"""
+    co2 = np.asarray(distance_km, dtype=float) * np.asarray(weight, dtype=float) * np.asarray(emission_factors, dtype=float)
+    return np.round(co2, 4)
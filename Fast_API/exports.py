@@ -0,0 +1,140 @@
+"""
+Streaming bulk exports (GET /export/{dataset}).
+
+Rows are read through a server-side cursor (yield_per: a named cursor on
+Postgres, a lazily stepped cursor on SQLite) EXPORT_CHUNK_SIZE at a time, and
+each chunk is encoded (NDJSON or CSV) and optionally gzipped before the next
+one is fetched, so memory stays flat however many rows match. Rows come out in
+time order, over the time-column indexes.
+
+An export holds one pooled connection (and, on Postgres, one read
+transaction) until the last byte is sent, on the read replica when one is
+configured and fresh.
+"""
+import csv
+import io
+import os
+import zlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from database import engine, read_engine, read_target
+from models import GPSTrack, SupplierReport, Trip
+import fast_json
+import structured_log
+
+log = structured_log.get_logger("exports")
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class Dataset:
+    def __init__(self, model, columns: list, time_column, filters: dict):
+        self.model = model
+        self.columns = [getattr(model, name) for name in columns]
+        self.time_column = getattr(model, time_column)
+        self.filters = {name: getattr(model, column) for name, column in filters.items()}  # query param -> column
+
+
+DATASETS = {
+    "trips": Dataset(
+        Trip,
+        ["id", "company_id", "vehicle_type", "start_location", "end_location", "distance_km", "co2_kg", "created_at"],
+        "created_at",
+        {"company_id": "company_id"},
+    ),
+    "gps": Dataset(
+        GPSTrack,
+        ["id", "vehicle_id", "latitude", "longitude", "distance_segment", "co2_segment", "timestamp"],
+        "timestamp",
+        {"vehicle_id": "vehicle_id"},
+    ),
+    "supplier-reports": Dataset(
+        SupplierReport,
+        [column.name for column in SupplierReport.__table__.columns],
+        "created_at",
+        {"supplier_name": "supplier_name", "verification_status": "verification_status"},
+    ),
+}
+
+
+def statement(dataset: Dataset, start_date: date = None, end_date: date = None, **filters):
+    """Rows of a dataset between two dates (inclusive), with equality filters by query param name"""
+    query = select(*dataset.columns)
+    if start_date:
+        query = query.where(dataset.time_column >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.where(dataset.time_column < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    for name, value in filters.items():
+        if value is not None:
+            query = query.where(dataset.filters[name] == value)
+    return query.order_by(dataset.time_column)
+
+
+def _partitions(query):
+    # Bulk reads belong on the replica whenever it is fresh enough
+    with (read_engine if read_target()[0] == "replica" else engine).connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_CHUNK_SIZE).execute(query)
+        yield from result.partitions()
+
+
+def _ndjson(partitions):
+    for rows in partitions:
+        yield b"".join(fast_json.dumps(row._asdict()) + b"\n" for row in rows)
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv(partitions, columns: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in columns])
+    for rows in partitions:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only: nothing matched
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(name: str, query, format: str, gzip: bool):
+    """Response body chunks of an export"""
+    dataset = DATASETS[name]
+    partitions = _partitions(query)
+    chunks = _ndjson(partitions) if format == "ndjson" else _csv(partitions, dataset.columns)
+    if gzip:
+        chunks = _gzipped(chunks)
+    sent = 0
+    complete = False
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+        complete = True
+    finally:
+        chunks.close()  # ends the cursor and returns the connection, also when the client went away
+        log.info("export finished" if complete else "export aborted",
+                 dataset=name, format=format, gzip=gzip, bytes=sent)
+
+
+def filename(name: str, format: str, gzip: bool, start_date: date = None, end_date: date = None) -> str:
+    return f"{name}-{start_date or 'start'}-{end_date or 'end'}.{format}" + (".gz" if gzip else "")
@@ -0,0 +1,41 @@
+"""
+Fast JSON responses for large list payloads.
+
+With a response_model, FastAPI validates the returned rows one by one before
+serializing them; without one, it walks them with jsonable_encoder and then
+json.dumps. For rows just read from our own tables neither step adds anything.
+The list endpoints select plain columns, build dicts, and return a
+FastJSONResponse, which FastAPI sends as-is; their response_model still
+documents the row shape in OpenAPI.
+
+Uses orjson when installed (datetimes, dates and numpy values are handled
+natively), stdlib json otherwise.
+"""
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency, see requirements.txt
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "tolist"):  # numpy scalars and arrays
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
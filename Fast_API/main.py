@@ -1,15 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Date, case, func, insert, literal, select, update
 from datetime import date, timedelta, datetime
-import os
 import hashlib
 import uuid
 from pathlib import Path
 import threading
 import time
 import math
+import json
+import asyncio
+import numpy as np
+from contextlib import asynccontextmanager
+
+import structured_log
+
+log = structured_log.get_logger("main")
 
 # Load environment variables from .env file
 try:
@@ -17,14 +26,38 @@ try:
     env_path = Path(__file__).parent / '.env'
     load_dotenv(dotenv_path=env_path)
 except ImportError:
-    print("⚠️  python-dotenv not installed. Install with: pip install python-dotenv")
-
-from database import Base, engine, get_db
-from models import Trip, GPSTrack, Company, CarbonCredit, SupplierReport, User, Truck
+    log.warning("python-dotenv not installed, .env not loaded (pip install python-dotenv)")
+
+from database import get_db, get_read_db, SessionLocal, engine, read_engine, replica_state
+from routing import get_route_data, resolve_lanes, close_http_client
+from emissions import EMISSION_FACTORS, CREDIT_MULTIPLIERS, DEFAULT_CREDIT_MULTIPLIER, calculate_co2_emissions, calculate_co2_emissions_array, emission_factor_array
+from verification import lane_key, verify_batch, LANE_PRECISION
+from verification_worker import worker as verification_worker, pending_item, PENDING
+import supplier_stats
+import route_cache
+import optimizer
+import assignment
+import sequencing
+import scenarios
+import readiness
+import metrics
+import profiling
+import simulations
+import exports
+import archive
+import analytics
+import replica
+import throttle
+from models import Trip, GPSTrack, Company, CarbonCredit, SupplierReport, SupplierStats, RouteGeometry, User, Truck
 from schemas import (
     TripCreate,
     GPSUpdate,
     OptimizationRequest,
+    OptimizationBatchRequest,
+    AssignmentRequest,
+    MultiStopRequest,
+    ScenarioRequest,
+    TripFilter,
     CompanyCreate,
     CompanyProfile,
     CarbonCreditRedemption,
@@ -32,6 +65,8 @@ from schemas import (
     CarbonCreditRecord,
     SupplierReportCreate,
     SupplierReportResponse,
+    SupplierReportBatchCreate,
+    SupplierReportBatchResponse,
     UserSignup,
     UserLogin,
     UserResponse,
@@ -40,9 +75,42 @@ from schemas import (
     GPSSimulationResponse,
     TruckCreate,
     TruckResponse,
+    TripSummary,
+    DailyFootprint,
+    GPSHistoryResponse,
+    TruckSummary,
 )
-
-app = FastAPI()
+from fast_json import FastJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve right away; DB check, schema, road graph and caches warm up in the background
+    warm_up = asyncio.create_task(readiness.warm_up(readiness.state))
+    # Resume simulations whose worker died (simulations.py)
+    reaper = asyncio.create_task(simulations.run_reaper(resume_gps_simulation))
+    # Move closed days to the Parquet archive that /analytics reads (archive.py)
+    archiver = asyncio.create_task(archive.run_archiver())
+    # Replica lag for get_read_db (no-op without READ_DATABASE_URL)
+    replica_monitor = asyncio.create_task(replica.run_monitor())
+    yield
+    warm_up.cancel()
+    reaper.cancel()
+    archiver.cancel()
+    replica_monitor.cancel()
+    await asyncio.gather(warm_up, reaper, archiver, replica_monitor, return_exceptions=True)
+    await verification_worker.stop()
+    # Release pooled routing-provider connections
+    await close_http_client()
+
+# Rate limits and load shedding run before any endpoint takes a thread or a connection
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(throttle.guard)])
+# Per-route latency, status and DB cost for /metrics, plus on-demand profiling; set before any route is added
+app.router.route_class = profiling.ProfiledRoute
+metrics.instrument_engine(engine)
+if replica.enabled():
+    metrics.instrument_engine(read_engine)
+    # Reads right after a client's write go to the primary (database.get_read_db)
+    app.add_middleware(replica.ReadYourWritesMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -59,8 +127,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-Base.metadata.create_all(bind=engine)
-
 # Password hashing functions
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
@@ -68,22 +134,10 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return hash_password(password) == password_hash
 
-# CO2 emission factors per km
-EMISSION_FACTORS = {
-    "diesel": 0.27,
-    "petrol": 0.24,
-    "electric": 0.02
-}
-
-# Idle emission factors per hour (vehicle running but stationary)
-IDLE_FACTORS = {
-    "diesel": 0.15,
-    "petrol": 0.12,
-    "electric": 0.01
-}
-
-# Active simulations tracking
-active_simulations = {}
+# GPS simulations are registered in the database so every worker process sees them (simulations.py)
+metrics.register_callbacks(simulations.driving, verification_worker)
+metrics.register_replica_callbacks(replica_state)
+metrics.register_load_callbacks(throttle.pool_wait, throttle.queue_depth, throttle.shed_level)
 
 def generate_gps_points(start_lat: float, start_lon: float, end_lat: float, end_lon: float, num_points: int = 20) -> list:
     """
@@ -109,21 +163,37 @@ def calculate_distance_between_points(lat1: float, lon1: float, lat2: float, lon
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
-def gps_simulation_task_wrapper(truck_id: str, gps_points: list, vehicle_type: str):
+def gps_simulation_task_wrapper(truck_id: str, generation: int, gps_points: list, vehicle_type: str, start_index: int = 0):
     """
     Wrapper that creates a new database session for the simulation thread.
     """
     from database import SessionLocal
     db_session = SessionLocal()
     try:
-        gps_simulation_task(truck_id, gps_points, vehicle_type, db_session, 100)
+        gps_simulation_task(truck_id, generation, gps_points, vehicle_type, db_session, 100, start_index)
     finally:
         db_session.close()
+        simulations.release(truck_id, generation)
+
+def start_simulation_thread(truck_id: str, generation: int, gps_points: list, vehicle_type: str, start_index: int = 0):
+    simulation_thread = threading.Thread(
+        target=gps_simulation_task_wrapper,
+        args=(truck_id, generation, gps_points, vehicle_type, start_index),
+        daemon=True
+    )
+    simulation_thread.start()
+
+def resume_gps_simulation(lease):
+    """Continue a simulation adopted from a worker that stopped renewing its lease"""
+    gps_points = generate_gps_points(lease.start_lat, lease.start_lng, lease.end_lat, lease.end_lng, num_points=20)
+    start_simulation_thread(lease.truck_id, lease.generation, gps_points, lease.vehicle_type, lease.points_done)
 
-def gps_simulation_task(truck_id: str, gps_points: list, vehicle_type: str, db_session: Session, total_duration_seconds: int = 100):
+def gps_simulation_task(truck_id: str, generation: int, gps_points: list, vehicle_type: str, db_session: Session,
+                        total_duration_seconds: int = 100, start_index: int = 0):
     """
     Background task that simulates GPS tracking by updating location every 5 seconds.
-    Updates are stored in the database.
+    Updates are stored in the database. Each tick renews this worker's lease on the
+    simulation; the loop ends when it is stopped or taken over by another start.
     """
     try:
         emission_factor = EMISSION_FACTORS.get(vehicle_type.lower(), 0.27)
@@ -131,9 +201,12 @@ def gps_simulation_task(truck_id: str, gps_points: list, vehicle_type: str, db_s
         update_interval = 5  # seconds
         points_per_interval = max(1, total_points // (total_duration_seconds // update_interval))
         
-        current_point_index = 0
+        current_point_index = start_index
         
-        while current_point_index < total_points and truck_id in active_simulations:
+        while current_point_index < total_points:
+            if not simulations.renew(truck_id, generation, current_point_index):
+                log.info("gps simulation stopped", truck_id=truck_id, generation=generation)
+                return
             if current_point_index < total_points:
                 point = gps_points[current_point_index]
                 
@@ -158,13 +231,16 @@ def gps_simulation_task(truck_id: str, gps_points: list, vehicle_type: str, db_s
                     co2_segment=co2_segment
                 )
                 
+                tick_started = time.perf_counter()
                 try:
                     db_session.add(gps_track)
                     db_session.commit()
-                    print(f"GPS point saved for {truck_id}: {point['lat']}, {point['lon']}")
+                    metrics.SIMULATION_TICKS.inc()
+                    metrics.SIMULATION_TICK_SECONDS.observe(value=time.perf_counter() - tick_started)
+                    log.debug("gps point saved", truck_id=truck_id, lat=point["lat"], lon=point["lon"], every=5)
                 except Exception as db_err:
                     db_session.rollback()
-                    print(f"Database error saving GPS point: {db_err}")
+                    log.error("gps point not saved", truck_id=truck_id, error=str(db_err), every=5)
                 
                 current_point_index += points_per_interval
             
@@ -172,41 +248,71 @@ def gps_simulation_task(truck_id: str, gps_points: list, vehicle_type: str, db_s
             time.sleep(update_interval)
         
         # Simulation complete
-        if truck_id in active_simulations:
-            del active_simulations[truck_id]
-            print(f"GPS simulation completed for {truck_id}")
+        simulations.finish(truck_id, generation)
+        log.info("gps simulation completed", truck_id=truck_id)
             
     except Exception as e:
-        print(f"GPS Simulation Error: {e}")
-        if truck_id in active_simulations:
-            del active_simulations[truck_id]
-            del active_simulations[truck_id]
-
-def calculate_co2_emissions(distance_km: float, weight: float, vehicle_type: str) -> float:
-    """
-    Calculate CO2 emissions using formula:
-    TransportCO₂ = Distance × Weight × EmissionFactor
-    
-    Args:
-        distance_km: Distance traveled in kilometers
-        weight: Weight of goods in tons
-        vehicle_type: Type of vehicle (diesel, petrol, electric)
-    
-    Returns:
-        CO2 emissions in kg
-    """
-    vehicle_type_lower = vehicle_type.lower()
-    emission_factor = EMISSION_FACTORS.get(vehicle_type_lower, 0.27)
-    
-    # Calculate CO2: distance × weight × emission factor
-    co2 = distance_km * weight * emission_factor
-    return round(co2, 4)
+        log.exception("gps simulation failed", truck_id=truck_id)
+        if simulations.is_transient(e):
+            # The lease lapses and another worker's reaper resumes the simulation
+            return
+        try:
+            simulations.fail(truck_id, generation, f"{type(e).__name__}: {e}")
+        except Exception:
+            log.exception("gps simulation not marked failed", truck_id=truck_id)
 
 # Test endpoint
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/health/ready")
+def readiness_check():
+    """503 until the database is reachable and startup caches are warm"""
+    return JSONResponse(
+        status_code=200 if readiness.state.ready else 503,
+        content=readiness.state.report(),
+    )
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: route latency, in-flight requests, DB cost, simulation and ingest"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# -------------------------
+# Request profiles (send X-Profile-Token on any request to profile it)
+# -------------------------
+@app.get("/profiles")
+def list_profiles(
+    route: str = None,
+    limit: int = Query(50, ge=1, le=500),
+    x_profile_token: str = Header(None),
+):
+    """Stored request profiles, newest first, optionally for one route template"""
+    profiling.require_admin(x_profile_token)
+    return profiling.store.list(route, limit)
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    x_profile_token: str = Header(None),
+):
+    """One profile as collapsed stacks (flamegraph.pl / speedscope) or speedscope JSON"""
+    profiling.require_admin(x_profile_token)
+    loaded = profiling.store.load(profile_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    summary, collapsed = loaded
+    if format == "speedscope":
+        return JSONResponse(
+            profiling.speedscope(summary, collapsed),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'},
+        )
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'})
+
 # -------------------------
 # Authentication Endpoints
 # -------------------------
@@ -272,6 +378,22 @@ def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
     estimated_time_hours = trip.distance_km / 60.0
     co2 = calculate_co2_emissions(trip.distance_km, estimated_time_hours, trip.vehicle_type)
 
+    # Auto-award carbon credits for eco-friendly vehicles
+    vehicle_lower = trip.vehicle_type.lower()
+    multiplier = CREDIT_MULTIPLIERS.get(vehicle_lower, DEFAULT_CREDIT_MULTIPLIER)
+    credits_earned = trip.distance_km * multiplier
+
+    # One transaction: the company total, the trip and its credit record (3 statements).
+    # The total is updated in place (no read-modify-write, safe under concurrency). The
+    # default company is seeded by migrate.py, which also moves the id sequence past it
+    updated = db.execute(
+        update(Company)
+        .where(Company.id == 1)
+        .values(carbon_credits=Company.carbon_credits + credits_earned)
+    )
+    if updated.rowcount == 0:
+        raise HTTPException(status_code=503, detail="Default company missing; run migrate.py")
+
     new_trip = Trip(
         vehicle_type=trip.vehicle_type,
         start_location=trip.start_location,
@@ -280,22 +402,9 @@ def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
         co2_kg=co2,
         company_id=1
     )
-
     db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
+    db.flush()
 
-    # Auto-award carbon credits for eco-friendly vehicles
-    credit_multipliers = {
-        "electric": 10,
-        "petrol": 3,
-        "diesel": 1
-    }
-    
-    vehicle_lower = trip.vehicle_type.lower()
-    multiplier = credit_multipliers.get(vehicle_lower, 1)
-    credits_earned = trip.distance_km * multiplier
-    
     # Record credit transaction
     credit_record = CarbonCredit(
         company_id=1,
@@ -306,15 +415,6 @@ def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
     )
     
     db.add(credit_record)
-    
-    # Update company credits
-    company = db.query(Company).filter(Company.id == 1).first()
-    if not company:
-        company = Company(name="Default Company", industry="Logistics")
-        db.add(company)
-        db.flush()
-    
-    company.carbon_credits += credits_earned
     db.commit()
 
     return {
@@ -328,11 +428,13 @@ def create_trip(trip: TripCreate, db: Session = Depends(get_db)):
 # Daily Footprint
 # -------------------------
 @app.get("/footprint/daily")
-def daily_footprint(db: Session = Depends(get_db)):
+def daily_footprint(db: Session = Depends(get_read_db)):
     today = date.today()
 
+    # Range on created_at (not date(created_at)) so ix_trips_created_at is used
+    day_start = datetime.combine(today, datetime.min.time())
     total = db.query(func.sum(Trip.co2_kg))\
-              .filter(func.date(Trip.created_at) == today)\
+              .filter(Trip.created_at >= day_start, Trip.created_at < day_start + timedelta(days=1))\
               .scalar()
 
     return {
@@ -344,17 +446,17 @@ def daily_footprint(db: Session = Depends(get_db)):
 # Daily Trend (Last 7 Days)
 # -------------------------
 @app.get("/footprint/daily/trend")
-def daily_trend(db: Session = Depends(get_db)):
+def daily_trend(db: Session = Depends(get_read_db)):
     today = date.today()
     start_date = today - timedelta(days=6)
 
     results = db.query(
-        func.date(Trip.created_at).label("day"),
+        func.date(Trip.created_at, type_=Date).label("day"),
         func.sum(Trip.co2_kg).label("total_co2")
     ).filter(
-        func.date(Trip.created_at) >= start_date
+        Trip.created_at >= datetime.combine(start_date, datetime.min.time())
     ).group_by(
-        func.date(Trip.created_at)
+        func.date(Trip.created_at, type_=Date)
     ).all()
 
     totals_by_day = {
@@ -377,12 +479,13 @@ def daily_trend(db: Session = Depends(get_db)):
 # Monthly Footprint
 # -------------------------
 @app.get("/footprint/monthly")
-def monthly_footprint(db: Session = Depends(get_db)):
+def monthly_footprint(db: Session = Depends(get_read_db)):
     today = date.today()
 
+    month_start = datetime(today.year, today.month, 1)
+    next_month = datetime(today.year + today.month // 12, today.month % 12 + 1, 1)
     total = db.query(func.sum(Trip.co2_kg))\
-              .filter(func.extract("month", Trip.created_at) == today.month)\
-              .filter(func.extract("year", Trip.created_at) == today.year)\
+              .filter(Trip.created_at >= month_start, Trip.created_at < next_month)\
               .scalar()
 
     return {
@@ -394,19 +497,19 @@ def monthly_footprint(db: Session = Depends(get_db)):
 # -------------------------
 # All Daily Footprints (for Records page)
 # -------------------------
-@app.get("/footprint/daily/all")
-def all_daily_footprints(db: Session = Depends(get_db)):
+@app.get("/footprint/daily/all", response_model=list[DailyFootprint])
+def all_daily_footprints(db: Session = Depends(get_read_db)):
     """
     Get all daily footprint data grouped by date, ordered by date descending
     Returns array of {date, co2}
     """
     results = db.query(
-        func.date(Trip.created_at).label("day"),
+        func.date(Trip.created_at, type_=Date).label("day"),
         func.sum(Trip.co2_kg).label("total_co2")
     ).group_by(
-        func.date(Trip.created_at)
+        func.date(Trip.created_at, type_=Date)
     ).order_by(
-        func.date(Trip.created_at).desc()
+        func.date(Trip.created_at, type_=Date).desc()
     ).all()
 
     daily_footprints = [
@@ -417,13 +520,13 @@ def all_daily_footprints(db: Session = Depends(get_db)):
         for row in results
     ]
 
-    return daily_footprints
+    return FastJSONResponse(daily_footprints)
 
 # -------------------------
 # All Monthly Footprints (for Records page)
 # -------------------------
 @app.get("/footprint/monthly/all")
-def all_monthly_footprints(db: Session = Depends(get_db)):
+def all_monthly_footprints(db: Session = Depends(get_read_db)):
     """
     Get all monthly footprint data grouped by month/year
     Returns array of {month, year, total_co2}
@@ -460,17 +563,28 @@ def all_monthly_footprints(db: Session = Depends(get_db)):
 # Stats Summary
 # -------------------------
 @app.get("/stats/summary")
-def stats_summary(db: Session = Depends(get_db)):
+def stats_summary(db: Session = Depends(get_read_db)):
     today = date.today()
     now = datetime.utcnow()
     day_start = datetime.combine(today, datetime.min.time())
     month_start = datetime(today.year, today.month, 1)
 
-    total_trips = db.query(func.count(Trip.id)).scalar() or 0
-
-    total_routes = db.query(
-        func.count(func.distinct(func.concat(Trip.start_location, " - ", Trip.end_location)))
-    ).scalar() or 0
+    # All trip totals in one scan
+    trips = db.query(
+        func.count(Trip.id).label("total_trips"),
+        # || rather than concat(), which SQLite only has from 3.44
+        func.count(func.distinct(
+            func.coalesce(Trip.start_location, "") + " - " + func.coalesce(Trip.end_location, "")
+        )).label("total_routes"),
+        func.sum(case((Trip.created_at >= day_start, Trip.co2_kg), else_=0)).label("co2_today"),
+        func.sum(case((Trip.created_at >= month_start, Trip.co2_kg), else_=0)).label("co2_month"),
+        func.sum(Trip.co2_kg).label("co2_all"),
+    ).one()
+    total_trips = trips.total_trips or 0
+    total_routes = trips.total_routes or 0
+    total_co2_today = trips.co2_today or 0
+    total_co2_month = trips.co2_month or 0
+    total_co2_all = trips.co2_all or 0
 
     active_vehicles = db.query(
         func.count(func.distinct(GPSTrack.vehicle_id))
@@ -478,16 +592,6 @@ def stats_summary(db: Session = Depends(get_db)):
         GPSTrack.timestamp >= now - timedelta(hours=24)
     ).scalar() or 0
 
-    total_co2_today = db.query(func.sum(Trip.co2_kg))\
-        .filter(Trip.created_at >= day_start)\
-        .scalar() or 0
-
-    total_co2_month = db.query(func.sum(Trip.co2_kg))\
-        .filter(Trip.created_at >= month_start)\
-        .scalar() or 0
-
-    total_co2_all = db.query(func.sum(Trip.co2_kg)).scalar() or 0
-
     return {
         "total_trips": int(total_trips),
         "total_routes": int(total_routes),
@@ -501,7 +605,7 @@ def stats_summary(db: Session = Depends(get_db)):
 # Insights Summary
 # -------------------------
 @app.get("/insights/summary")
-def insights_summary(db: Session = Depends(get_db)):
+def insights_summary(db: Session = Depends(get_read_db)):
     top_route = db.query(
         Trip.start_location,
         Trip.end_location,
@@ -541,11 +645,15 @@ def insights_summary(db: Session = Depends(get_db)):
 # -------------------------
 # Recent Trips
 # -------------------------
-@app.get("/trips/recent")
-def recent_trips(limit: int = 8, db: Session = Depends(get_db)):
-    trips = db.query(Trip).order_by(Trip.created_at.desc()).limit(limit).all()
-
-    return [
+@app.get("/trips/recent", response_model=list[TripSummary])
+def recent_trips(limit: int = 8, db: Session = Depends(get_read_db)):
+    # Columns only: no ORM objects to build for a read-only listing
+    trips = db.query(
+        Trip.id, Trip.vehicle_type, Trip.start_location, Trip.end_location,
+        Trip.distance_km, Trip.co2_kg, Trip.created_at
+    ).order_by(Trip.created_at.desc()).limit(limit).all()
+
+    return FastJSONResponse([
         {
             "id": trip.id,
             "vehicle_type": trip.vehicle_type,
@@ -553,16 +661,16 @@ def recent_trips(limit: int = 8, db: Session = Depends(get_db)):
             "end_location": trip.end_location,
             "distance_km": trip.distance_km,
             "co2_kg": round(trip.co2_kg, 2),
-            "created_at": trip.created_at.isoformat()
+            "created_at": trip.created_at
         }
         for trip in trips
-    ]
+    ])
 
 # -------------------------
 # Route Chart API
 # -------------------------
 @app.get("/charts/routes")
-def route_wise_emission(limit: int = 10, db: Session = Depends(get_db)):
+def route_wise_emission(limit: int = 10, db: Session = Depends(get_read_db)):
     results = db.query(
         Trip.start_location,
         Trip.end_location,
@@ -584,7 +692,7 @@ def route_wise_emission(limit: int = 10, db: Session = Depends(get_db)):
 # Vehicle Chart API
 # -------------------------
 @app.get("/charts/vehicles")
-def vehicle_wise_emission(limit: int = 10, db: Session = Depends(get_db)):
+def vehicle_wise_emission(limit: int = 10, db: Session = Depends(get_read_db)):
     results = db.query(
         Trip.vehicle_type,
         func.sum(Trip.co2_kg).label("total_co2")
@@ -670,25 +778,14 @@ def start_gps_simulation(request: GPSSimulationRequest):
     end_lon = request.end_lon
     vehicle_type = request.vehicle_type
     
-    # Stop any existing simulation for this truck
-    if truck_id in active_simulations:
-        del active_simulations[truck_id]
-        # Give it time to stop
-        time.sleep(1)
-    
     # Generate GPS points along the route
     gps_points = generate_gps_points(start_lat, start_lon, end_lat, end_lon, num_points=20)
     
-    # Mark simulation as active
-    active_simulations[truck_id] = True
+    # Claim the truck; a simulation already running for it (on any worker) stops at its next tick
+    generation = simulations.claim(truck_id, vehicle_type, start_lat, start_lon, end_lat, end_lon)
     
     # Start simulation in background thread
-    simulation_thread = threading.Thread(
-        target=gps_simulation_task_wrapper,
-        args=(truck_id, gps_points, vehicle_type),
-        daemon=True
-    )
-    simulation_thread.start()
+    start_simulation_thread(truck_id, generation, gps_points, vehicle_type)
     
     total_distance = calculate_distance_between_points(start_lat, start_lon, end_lat, end_lon)
     
@@ -708,7 +805,7 @@ def get_simulation_status(truck_id: str):
     Get the status of ongoing GPS simulation.
     Returns whether simulation is running or completed.
     """
-    is_active = truck_id in active_simulations
+    is_active = simulations.is_running(truck_id)
     
     return {
         "truck_id": truck_id,
@@ -721,8 +818,7 @@ def stop_gps_simulation(truck_id: str):
     """
     Stop a running GPS simulation.
     """
-    if truck_id in active_simulations:
-        del active_simulations[truck_id]
+    if simulations.stop(truck_id):
         return {
             "message": f"Simulation for {truck_id} stopped",
             "status": "stopped"
@@ -733,26 +829,21 @@ def stop_gps_simulation(truck_id: str):
             "status": "not_running"
         }
 
-@app.get("/gps/history/{vehicle_id}")
-def get_gps_history(vehicle_id: str, limit: int = 100, db: Session = Depends(get_db)):
+@app.get("/gps/history/{vehicle_id}", response_model=GPSHistoryResponse)
+def get_gps_history(vehicle_id: str, limit: int = 100, db: Session = Depends(get_read_db)):
     """
     Get complete GPS tracking history for a vehicle.
     Returns all recorded GPS points in chronological order.
     """
-    points = db.query(GPSTrack)\
-        .filter(GPSTrack.vehicle_id == vehicle_id)\
+    points = db.query(
+        GPSTrack.id, GPSTrack.latitude, GPSTrack.longitude,
+        GPSTrack.distance_segment, GPSTrack.co2_segment, GPSTrack.timestamp
+    ).filter(GPSTrack.vehicle_id == vehicle_id)\
         .order_by(GPSTrack.timestamp)\
         .limit(limit)\
         .all()
     
-    if not points:
-        return {
-            "vehicle_id": vehicle_id,
-            "total_points": 0,
-            "points": []
-        }
-    
-    return {
+    return FastJSONResponse({
         "vehicle_id": vehicle_id,
         "total_points": len(points),
         "points": [
@@ -762,11 +853,11 @@ def get_gps_history(vehicle_id: str, limit: int = 100, db: Session = Depends(get
                 "lng": p.longitude,
                 "distance_segment": round(p.distance_segment, 4),
                 "co2_segment": round(p.co2_segment, 4),
-                "timestamp": p.timestamp.isoformat()
+                "timestamp": p.timestamp
             }
             for p in points
         ]
-    }
+    })
 
 # -------------------------
 # 🌱 OPTIMIZATION SUGGESTION ENGINE (NEW)
@@ -798,6 +889,305 @@ def optimize_route(data: OptimizationRequest):
         "suggestions": suggestions
     }
 
+# Inputs larger than this are streamed as NDJSON
+OPTIMIZE_STREAM_THRESHOLD = 10000
+OPTIMIZE_CHUNK_SIZE = 20000
+OPTIMIZE_MAX_ROWS = 200000
+
+def apply_trip_filter(query, trip_filter: TripFilter):
+    if trip_filter.start_date:
+        query = query.filter(Trip.created_at >= datetime.combine(trip_filter.start_date, datetime.min.time()))
+    if trip_filter.end_date:
+        query = query.filter(Trip.created_at < datetime.combine(trip_filter.end_date + timedelta(days=1), datetime.min.time()))
+    if trip_filter.vehicle_type:
+        query = query.filter(func.lower(Trip.vehicle_type) == trip_filter.vehicle_type.lower())
+    if trip_filter.company_id is not None:
+        query = query.filter(Trip.company_id == trip_filter.company_id)
+    if trip_filter.start_location:
+        query = query.filter(Trip.start_location == trip_filter.start_location)
+    if trip_filter.end_location:
+        query = query.filter(Trip.end_location == trip_filter.end_location)
+    return query
+
+def optimization_row_chunks(rows: list):
+    """(id_key, ids, distance, weight, vehicles) chunks from request rows"""
+    for start in range(0, len(rows), OPTIMIZE_CHUNK_SIZE):
+        chunk = rows[start:start + OPTIMIZE_CHUNK_SIZE]
+        yield (
+            "row",
+            range(start, start + len(chunk)),
+            [r.distance_km for r in chunk],
+            [r.weight for r in chunk],
+            [r.current_vehicle for r in chunk],
+        )
+
+def optimization_trip_chunks(trip_filter: TripFilter):
+    """Same chunks from historical trips, read with a server-side cursor"""
+    session = SessionLocal()
+    try:
+        statement = apply_trip_filter(
+            select(Trip.id, Trip.distance_km, Trip.vehicle_type), trip_filter
+        ).order_by(Trip.id).execution_options(yield_per=OPTIMIZE_CHUNK_SIZE)
+        for partition in session.execute(statement).partitions():
+            yield (
+                "trip_id",
+                [t.id for t in partition],
+                [t.distance_km or 0 for t in partition],
+                [1.0] * len(partition),
+                [t.vehicle_type or "" for t in partition],
+            )
+    finally:
+        session.close()
+
+def optimization_results(chunks, summary: "optimizer.SavingsSummary"):
+    for id_key, ids, distance, weight, vehicles in chunks:
+        result = optimizer.evaluate(distance, weight, vehicles)
+        summary.add(vehicles, result)
+        current = [round(c, 2) for c in result["current"].tolist()]
+        row_suggestions = optimizer.suggestions(result)
+        for i, row_id in enumerate(ids):
+            yield {
+                id_key: row_id,
+                "distance_km": distance[i],
+                "weight": weight[i],
+                "current_vehicle": vehicles[i].lower(),
+                "current_emission": current[i],
+                "suggestions": row_suggestions[i],
+            }
+
+def stream_optimization(chunks):
+    summary = optimizer.SavingsSummary()
+    for row in optimization_results(chunks, summary):
+        yield json.dumps(row) + "\n"
+    yield json.dumps({"summary": summary.result()}) + "\n"
+
+@app.post("/optimize/batch")
+def optimize_batch(data: OptimizationBatchRequest, db: Session = Depends(get_db)):
+    """
+    Suggestions for many trips at once: either explicit (distance, vehicle, weight)
+    rows or every historical trip matching trip_filter. Emissions use
+    Distance × Weight × EmissionFactor (weight defaults to 1, like /optimize).
+    Returns per-row suggestions and total savings per switch option; large inputs
+    (or stream=true) are streamed as NDJSON with the summary on the last line.
+    """
+    if (data.rows is None) == (data.trip_filter is None):
+        raise HTTPException(status_code=400, detail="Provide either rows or trip_filter")
+
+    if data.rows is not None:
+        if len(data.rows) > OPTIMIZE_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Too many rows (max {OPTIMIZE_MAX_ROWS}); use trip_filter")
+        row_count = len(data.rows)
+        chunks = optimization_row_chunks(data.rows)
+    else:
+        row_count = apply_trip_filter(db.query(func.count(Trip.id)), data.trip_filter).scalar() or 0
+        chunks = optimization_trip_chunks(data.trip_filter)
+
+    if data.stream or row_count > OPTIMIZE_STREAM_THRESHOLD:
+        return StreamingResponse(stream_optimization(chunks), media_type="application/x-ndjson")
+
+    summary = optimizer.SavingsSummary()
+    rows = list(optimization_results(chunks, summary))
+    return {
+        "rows": rows,
+        "summary": summary.result(),
+    }
+
+MAX_ASSIGN_SHIPMENTS = 2000
+DEFAULT_TRUCK_CAPACITY_TONS = 10.0
+
+@app.post("/optimize/assign")
+def optimize_assign(data: AssignmentRequest, db: Session = Depends(get_db)):
+    """
+    Assign pending shipments to the available fleet with minimal total CO2.
+    Each truck carries one shipment at a time and only shipments within its
+    capacity; shipments that cannot be placed are returned with a reason.
+    """
+    shipments = data.shipments
+    if not shipments:
+        raise HTTPException(status_code=400, detail="No shipments to assign")
+    if len(shipments) > MAX_ASSIGN_SHIPMENTS:
+        raise HTTPException(status_code=413, detail=f"Too many shipments (max {MAX_ASSIGN_SHIPMENTS})")
+    for s in shipments:
+        if s.window_end <= s.window_start:
+            raise HTTPException(status_code=400, detail="window_end must be after window_start")
+        if s.distance_km < 0 or s.weight < 0:
+            raise HTTPException(status_code=400, detail="distance_km and weight must not be negative")
+
+    query = db.query(Truck)
+    if data.truck_ids is not None:
+        query = query.filter(Truck.truck_id.in_(data.truck_ids))
+    else:
+        query = query.filter(Truck.status != "inactive")
+    trucks = query.order_by(Truck.id).all()
+    if not trucks:
+        raise HTTPException(status_code=404, detail="No available trucks")
+
+    started = time.perf_counter()
+    result = assignment.assign(
+        [s.distance_km for s in shipments],
+        [s.weight for s in shipments],
+        [s.window_start.timestamp() for s in shipments],
+        [s.window_end.timestamp() for s in shipments],
+        [t.capacity_tons if t.capacity_tons is not None else DEFAULT_TRUCK_CAPACITY_TONS for t in trucks],
+        [t.vehicle_type or "diesel" for t in trucks],
+    )
+    solve_seconds = time.perf_counter() - started
+
+    assignments = []
+    unassigned = []
+    for i, s in enumerate(shipments):
+        shipment_id = s.shipment_id or str(i)
+        truck_index = int(result["truck"][i])
+        if truck_index < 0:
+            unassigned.append({"shipment_id": shipment_id, "reason": result["reason"][i]})
+            continue
+        truck = trucks[truck_index]
+        assignments.append({
+            "shipment_id": shipment_id,
+            "truck_id": truck.truck_id,
+            "vehicle_type": truck.vehicle_type,
+            "distance_km": s.distance_km,
+            "weight": s.weight,
+            "window_start": s.window_start,
+            "window_end": s.window_end,
+            "co2_kg": round(float(result["co2"][i]), 2),
+        })
+
+    return {
+        "total_shipments": len(shipments),
+        "assigned": len(assignments),
+        "unassigned_count": len(unassigned),
+        "available_trucks": len(trucks),
+        "waves": result["waves"],
+        "total_co2_kg": round(sum(a["co2_kg"] for a in assignments), 2),
+        "solver": assignment.solver_name(),
+        "solve_seconds": round(solve_seconds, 4),
+        "assignments": assignments,
+        "unassigned": unassigned,
+    }
+
+MAX_MULTISTOP_STOPS = 500
+MAX_MULTISTOP_BUDGET_MS = 10000
+
+@app.post("/optimize/multistop")
+def optimize_multistop(data: MultiStopRequest, db: Session = Depends(get_db)):
+    """
+    Order the stops of a milk run (first stop = depot) to minimize CO2 for the
+    chosen vehicle. Legs use routed distances already in the route store and
+    haversine distances otherwise.
+    """
+    stops = data.stops
+    if len(stops) < 2:
+        raise HTTPException(status_code=400, detail="At least two stops are required")
+    if len(stops) > MAX_MULTISTOP_STOPS:
+        raise HTTPException(status_code=413, detail=f"Too many stops (max {MAX_MULTISTOP_STOPS})")
+    vehicle_type = data.vehicle_type.lower()
+    if vehicle_type not in EMISSION_FACTORS:
+        raise HTTPException(status_code=400, detail=f"Unknown vehicle type: {data.vehicle_type}")
+    budget_ms = min(max(data.time_budget_ms, 0), MAX_MULTISTOP_BUDGET_MS)
+
+    started = time.perf_counter()
+    distance = sequencing.haversine_matrix([s.lat for s in stops], [s.lng for s in stops])
+    cached = np.zeros(distance.shape, dtype=bool)
+
+    # Overlay routed distances for lanes the route store already knows
+    positions = {}
+    for index, s in enumerate(stops):
+        positions.setdefault((round(s.lat, LANE_PRECISION), round(s.lng, LANE_PRECISION)), []).append(index)
+    for lane, (_, distance_km, _) in route_cache.lookup_between(db, [(s.lat, s.lng) for s in stops]).items():
+        for i in positions[lane[:2]]:
+            for j in positions[lane[2:]]:
+                if i != j:
+                    distance[i, j] = distance_km
+                    cached[i, j] = True
+    matrix_seconds = time.perf_counter() - started
+
+    co2_per_km = data.weight * EMISSION_FACTORS[vehicle_type]
+    result = sequencing.sequence(distance * co2_per_km, data.return_to_start, budget_ms / 1000)
+
+    def route_distance(order) -> float:
+        return float(sum(distance[a, b] for a, b in zip(order, order[1:])))
+
+    order = result["order"]
+    legs = []
+    for position, index in enumerate(order):
+        s = stops[index]
+        leg = {"position": position, "stop_index": index, "name": s.name, "lat": s.lat, "lng": s.lng}
+        if position:
+            previous = order[position - 1]
+            leg_km = float(distance[previous, index])
+            leg["leg_distance_km"] = round(leg_km, 3)
+            leg["leg_co2_kg"] = round(leg_km * co2_per_km, 3)
+            leg["leg_source"] = "route_cache" if cached[previous, index] else "haversine"
+        legs.append(leg)
+
+    input_order = list(range(len(stops))) + ([0] if data.return_to_start else [])
+    total_km = route_distance(order)
+    initial_km = route_distance(result["initial_order"])
+    input_km = route_distance(input_order)
+
+    return {
+        "vehicle_type": vehicle_type,
+        "weight": data.weight,
+        "return_to_start": data.return_to_start,
+        "sequence": legs,
+        "total_distance_km": round(total_km, 3),
+        "total_co2_kg": round(total_km * co2_per_km, 3),
+        "input_order_distance_km": round(input_km, 3),
+        "co2_saved_vs_input_order_kg": round((input_km - total_km) * co2_per_km, 3),
+        "construction_distance_km": round(initial_km, 3),
+        "cached_legs": int(sum(cached[a, b] for a, b in zip(order, order[1:]))),
+        "stats": {
+            "stops": len(stops),
+            "matrix_ms": round(matrix_seconds * 1000, 2),
+            "construction_ms": round(result["construction_seconds"] * 1000, 2),
+            "improvement_ms": round(result["improvement_seconds"] * 1000, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            "time_budget_ms": budget_ms,
+            "two_opt_moves": result["two_opt_moves"],
+            "or_opt_moves": result["or_opt_moves"],
+            "converged": result["converged"],
+        },
+    }
+
+# -------------------------
+# 🔮 WHAT-IF SCENARIOS
+# -------------------------
+@app.post("/scenarios/evaluate")
+def evaluate_scenario(data: ScenarioRequest, db: Session = Depends(get_db)):
+    """
+    Recompute the footprint and carbon credits as if some trips had used another
+    vehicle, e.g. 30% of diesel trips on the top 5 routes as electric.
+    """
+    if not data.rules:
+        raise HTTPException(status_code=400, detail="At least one rule is required")
+    if data.granularity not in ("day", "month"):
+        raise HTTPException(status_code=400, detail="granularity must be day or month")
+    for rule in data.rules:
+        if not 0 <= rule.share <= 1:
+            raise HTTPException(status_code=400, detail="share must be between 0 and 1")
+
+    started = time.perf_counter()
+    cache_hit = scenarios.trip_columns.refresh(db)
+    refresh_seconds = time.perf_counter() - started
+    columns, vehicle_names, route_names = scenarios.trip_columns.snapshot()
+
+    result = scenarios.evaluate(
+        columns, vehicle_names, route_names,
+        [rule.model_dump() for rule in data.rules],
+        start_date=data.start_date,
+        end_date=data.end_date,
+        company_id=data.company_id,
+        granularity=data.granularity,
+    )
+    result["cache"] = {
+        "hit": cache_hit,
+        "rows": len(columns["id"]),
+        "refresh_ms": round(refresh_seconds * 1000, 2),
+        "evaluate_ms": round((time.perf_counter() - started - refresh_seconds) * 1000, 2),
+    }
+    return result
+
 # -------------------------
 # 🏢 COMPANY & CARBON CREDITS
 # -------------------------
@@ -822,9 +1212,7 @@ def get_company_profile(company_id: int, db: Session = Depends(get_db)):
             "created_at": company.created_at.isoformat() if company.created_at else datetime.utcnow().isoformat()
         }
     except Exception as e:
-        print(f"Error in get_company_profile: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("company profile failed", company_id=company_id)
         return {"error": str(e)}
 
 @app.get("/carbon-credits/{company_id}")
@@ -943,109 +1331,15 @@ def award_carbon_credits(company_id: int, credits: float, reason: str = "Manual
 # Supplier Report Endpoints
 # -------------------------
 
-import math
-import requests
-
-def calculate_haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two points using Haversine formula (in km) - fallback method"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
-
-def get_mapbox_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
-    """
-    Call Mapbox Directions API to get real road distance and travel time
-    Returns: (distance_km, duration_hours, route_geometry)
-    """
-    # Get Mapbox token from environment variable
-    mapbox_token = os.getenv("MAPBOX_TOKEN", "")
-    
-    # Check if token is set and valid
-    if not mapbox_token or mapbox_token == "your_mapbox_token_here":
-        print("⚠️  MAPBOX_TOKEN not configured. Using Haversine fallback.")
-        print("📋 To enable Mapbox API:")
-        print("   1. Get free token from: https://account.mapbox.com/access-tokens/")
-        print("   2. Add to Fast_API/.env file: MAPBOX_TOKEN=your_actual_token")
-        distance_km = calculate_haversine_distance(start_lat, start_lng, end_lat, end_lng)
-        duration_hours = distance_km / 60  # Assume 60 km/h
-        return distance_km, duration_hours, None
-    
-    # Mapbox Directions API endpoint
-    url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{start_lng},{start_lat};{end_lng},{end_lat}"
-    
-    params = {
-        "access_token": mapbox_token,
-        "geometries": "geojson",
-        "overview": "full"
-    }
-    
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get("routes") and len(data["routes"]) > 0:
-            route = data["routes"][0]
-            distance_meters = route.get("distance", 0)
-            duration_seconds = route.get("duration", 0)
-            geometry = route.get("geometry", None)
-            
-            distance_km = distance_meters / 1000
-            duration_hours = duration_seconds / 3600
-            
-            return distance_km, duration_hours, geometry
-        else:
-            # Fallback to Haversine if no routes found
-            distance_km = calculate_haversine_distance(start_lat, start_lng, end_lat, end_lng)
-            duration_hours = distance_km / 60  # Assume 60 km/h
-            return distance_km, duration_hours, None
-            
-    except Exception as e:
-        print(f"Mapbox API error: {e}")
-        # Fallback to Haversine calculation
-        distance_km = calculate_haversine_distance(start_lat, start_lng, end_lat, end_lng)
-        duration_hours = distance_km / 60  # Assume 60 km/h
-        return distance_km, duration_hours, None
-
-@app.post("/supplier/report", response_model=SupplierReportResponse)
-def create_supplier_report(report: SupplierReportCreate, db: Session = Depends(get_db)):
+@app.post("/supplier/report", response_model=SupplierReportResponse, status_code=202)
+async def create_supplier_report(report: SupplierReportCreate, db: Session = Depends(get_db)):
     """
-    Create a supplier report with automatic verification using Mapbox Directions API.
-    Compares reported data with real road distance and travel time.
+    Accept a supplier report for verification.
+    The report is stored right away with verification_status "pending"; the
+    background worker compares it with the real road distance and travel time
+    from Mapbox Directions API (or the offline road graph, see routing.py).
+    Poll /supplier/reports/status for the result.
     """
-    
-    # Get verified distance and time from Mapbox Directions API
-    verified_distance, verified_time, route_geometry = get_mapbox_route_data(
-        report.start_lat,
-        report.start_lng,
-        report.end_lat,
-        report.end_lng
-    )
-    
-    # Calculate CO2 emissions using new formula: TransportCO₂ = Distance × Weight × EmissionFactor
-    reported_co2 = calculate_co2_emissions(report.reported_distance, report.weight, report.vehicle_type)
-    verified_co2 = calculate_co2_emissions(verified_distance, report.weight, report.vehicle_type)
-    
-    # Calculate difference percentage
-    distance_diff_pct = abs(report.reported_distance - verified_distance) / verified_distance * 100 if verified_distance > 0 else 0
-    
-    # Determine verification status
-    if distance_diff_pct < 5:
-        verification_status = "verified"
-    elif distance_diff_pct < 15:
-        verification_status = "warning"
-    else:
-        verification_status = "flagged"
-    
-    # Create supplier report record
     new_report = SupplierReport(
         supplier_name=report.supplier_name,
         start_lat=report.start_lat,
@@ -1054,36 +1348,339 @@ def create_supplier_report(report: SupplierReportCreate, db: Session = Depends(g
         end_lng=report.end_lng,
         reported_distance=report.reported_distance,
         reported_time=report.reported_time,
-        verified_distance=verified_distance,
-        verified_time=verified_time,
         vehicle_type=report.vehicle_type,
         weight=report.weight,
-        reported_co2=reported_co2,
-        verified_co2=verified_co2,
-        verification_status=verification_status
+        # TransportCO₂ = Distance × Weight × EmissionFactor
+        reported_co2=calculate_co2_emissions(report.reported_distance, report.weight, report.vehicle_type),
+        verification_status=PENDING
     )
     
+    # Database work stays off the event loop
+    saved = await run_in_threadpool(save_supplier_report, db, new_report)
+    verification_worker.submit([pending_item(saved)])
+    return saved
+
+def save_supplier_report(db: Session, new_report: SupplierReport) -> SupplierReport:
     db.add(new_report)
     db.commit()
     db.refresh(new_report)
-    
     return new_report
 
+# Upper bound on rows accepted by one batch upload
+MAX_SUPPLIER_BATCH_SIZE = 5000
+
+@app.post("/supplier/reports/batch", response_model=SupplierReportBatchResponse)
+async def create_supplier_reports_batch(batch: SupplierReportBatchCreate, defer: bool = False, db: Session = Depends(get_db)):
+    """
+    Verify and store many supplier reports in one request.
+    Identical lanes are routed once, unique lanes are resolved concurrently,
+    and CO2 / discrepancy status are computed for the whole batch at once.
+
+    With defer=true the rows are stored as "pending" and verified by the
+    background worker instead, so the request returns without routing.
+    """
+    started = time.perf_counter()
+    reports = batch.reports
+
+    if not reports:
+        raise HTTPException(status_code=400, detail="Batch contains no reports")
+    if len(reports) > MAX_SUPPLIER_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_SUPPLIER_BATCH_SIZE} reports)")
+
+    lanes = [lane_key(r.start_lat, r.start_lng, r.end_lat, r.end_lng) for r in reports]
+
+    if defer:
+        return await queue_supplier_reports(reports, lanes, db, started)
+
+    # Lanes routed before come from the route store; route each remaining distinct lane once
+    unique_lanes = list(dict.fromkeys(lanes))
+    cached = await run_in_threadpool(route_cache.lookup, db, unique_lanes)
+    resolved = await resolve_lanes([lane for lane in unique_lanes if lane not in cached])
+    routing_seconds = time.perf_counter() - started
+
+    routes = {lane: (distance, duration) for lane, (_, distance, duration) in cached.items()}
+    routes.update({lane: result[:2] for lane, result in resolved.items()})
+
+    verified_distance = [routes[lane][0] for lane in lanes]
+    verified_time = [routes[lane][1] for lane in lanes]
+
+    result = verify_batch(
+        [r.reported_distance for r in reports],
+        verified_distance,
+        [r.weight for r in reports],
+        [r.vehicle_type for r in reports],
+    )
+    reported_co2 = result["reported_co2"].tolist()
+    verified_co2 = result["verified_co2"].tolist()
+    statuses = result["verification_status"].tolist()
+
+    rows = [
+        {
+            "supplier_name": r.supplier_name,
+            "start_lat": r.start_lat,
+            "start_lng": r.start_lng,
+            "end_lat": r.end_lat,
+            "end_lng": r.end_lng,
+            "reported_distance": r.reported_distance,
+            "reported_time": r.reported_time,
+            "verified_distance": verified_distance[i],
+            "verified_time": verified_time[i],
+            "vehicle_type": r.vehicle_type,
+            "weight": r.weight,
+            "reported_co2": reported_co2[i],
+            "verified_co2": verified_co2[i],
+            "verification_status": statuses[i],
+            "route_id": cached[lanes[i]][0] if lanes[i] in cached else None,
+        }
+        for i, r in enumerate(reports)
+    ]
+
+    diff_pct = result["distance_diff_pct"].tolist()
+    stats_rows = [
+        {
+            "supplier_name": row["supplier_name"],
+            "distance_diff_pct": diff_pct[i],
+            "verification_status": statuses[i],
+            "co2_delta": reported_co2[i] - verified_co2[i],
+        }
+        for i, row in enumerate(rows)
+    ]
+
+    inserted = await run_in_threadpool(save_supplier_reports, db, rows, stats_rows, resolved, lanes)
+
+    for i, (row, (report_id, created_at)) in enumerate(zip(rows, inserted)):
+        row["id"] = report_id
+        row["created_at"] = created_at
+        row["distance_diff_pct"] = round(diff_pct[i], 2)
+
+    status_counts = {status: 0 for status in ("verified", "warning", "flagged")}
+    for status in statuses:
+        status_counts[status] += 1
+
+    return {
+        "total_reports": len(rows),
+        "unique_lanes": len(routes),
+        "cached_lanes": len(cached),
+        "status_counts": status_counts,
+        "routing_seconds": round(routing_seconds, 4),
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+        "reports": rows,
+    }
+
+async def queue_supplier_reports(reports: list, lanes: list, db: Session, started: float) -> dict:
+    """Store a batch as pending and hand it to the verification worker"""
+    reported_co2 = calculate_co2_emissions_array(
+        [r.reported_distance for r in reports],
+        [r.weight for r in reports],
+        emission_factor_array([r.vehicle_type for r in reports]),
+    ).tolist()
+
+    rows = [
+        {
+            "supplier_name": r.supplier_name,
+            "start_lat": r.start_lat,
+            "start_lng": r.start_lng,
+            "end_lat": r.end_lat,
+            "end_lng": r.end_lng,
+            "reported_distance": r.reported_distance,
+            "reported_time": r.reported_time,
+            "vehicle_type": r.vehicle_type,
+            "weight": r.weight,
+            "reported_co2": reported_co2[i],
+            "verification_status": PENDING,
+        }
+        for i, r in enumerate(reports)
+    ]
+
+    inserted = await run_in_threadpool(save_supplier_reports, db, rows)
+
+    items = []
+    for row, lane, (report_id, created_at) in zip(rows, lanes, inserted):
+        row["id"] = report_id
+        row["created_at"] = created_at
+        items.append({
+            "id": report_id,
+            "supplier_name": row["supplier_name"],
+            "lane": lane,
+            "reported_distance": row["reported_distance"],
+            "reported_co2": row["reported_co2"],
+            "weight": row["weight"],
+            "vehicle_type": row["vehicle_type"],
+            "attempts": 0,
+        })
+    verification_worker.submit(items)
+
+    return {
+        "total_reports": len(rows),
+        "unique_lanes": len(set(lanes)),
+        "status_counts": {PENDING: len(rows)},
+        "routing_seconds": 0.0,
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+        "reports": rows,
+    }
+
+def save_supplier_reports(db: Session, rows: list, stats_rows: list = None, resolved: dict = None, lanes: list = None) -> list:
+    """
+    Bulk insert supplier report rows; returns (id, created_at) in input order.
+    stats_rows (already verified rows) are folded into supplier_stats and newly
+    resolved routes are saved to the route store, all in the same transaction.
+    """
+    if resolved:
+        new_route_ids = route_cache.store(db, resolved)
+        for row, lane in zip(rows, lanes):
+            if lane in new_route_ids:
+                row["route_id"] = new_route_ids[lane]
+
+    inserted = db.execute(
+        insert(SupplierReport).returning(
+            SupplierReport.id, SupplierReport.created_at, sort_by_parameter_order=True
+        ),
+        rows,
+    ).all()
+    if stats_rows:
+        supplier_stats.record_verified(db, stats_rows)
+    db.commit()
+    return inserted
+
+SUPPLIER_REPORT_COLUMNS = [
+    getattr(SupplierReport, name) for name in SupplierReportResponse.model_fields if name != "route_polyline"
+]
+
 @app.get("/supplier/reports", response_model=list[SupplierReportResponse])
-def get_supplier_reports(limit: int = 50, db: Session = Depends(get_db)):
+def get_supplier_reports(limit: int = 50, include_geometry: bool = False, db: Session = Depends(get_db)):
+    """
+    Get all supplier reports ordered by creation date (newest first).
+    With include_geometry=true each report carries its simplified route as an
+    encoded polyline (route_polyline), read from the route store.
+    """
+    # Columns of the response model only, sent without per-row validation
+    query = db.query(*SUPPLIER_REPORT_COLUMNS)
+    if include_geometry:
+        query = query.add_columns(RouteGeometry.simplified_polyline.label("route_polyline"))\
+            .outerjoin(RouteGeometry, SupplierReport.route_id == RouteGeometry.id)
+    else:
+        query = query.add_columns(literal(None).label("route_polyline"))
+    rows = query.order_by(SupplierReport.created_at.desc()).limit(limit).all()
+    return FastJSONResponse([row._asdict() for row in rows])
+
+@app.get("/supplier/reports/{report_id}/route")
+def get_supplier_report_route(report_id: int, simplified: bool = False, db: Session = Depends(get_db)):
+    """
+    Stored route for a report, for drawing on the map. Never calls the routing API:
+    reports verified without a road route (or still pending) get geometry null.
+    """
+    report = db.query(SupplierReport).filter(SupplierReport.id == report_id).first()
+    if not report:
+        raise HTTPException(status_code=404, detail="Supplier report not found")
+
+    route = db.query(RouteGeometry).filter(RouteGeometry.id == report.route_id).first() if report.route_id else None
+    if route is None:
+        return {
+            "report_id": report.id,
+            "distance_km": round(report.verified_distance or 0, 2),
+            "duration_hours": round(report.verified_time or 0, 2),
+            "geometry": None,
+            "polyline": None,
+        }
+
+    return {
+        "report_id": report.id,
+        "distance_km": round(route.distance_km, 2),
+        "duration_hours": round(route.duration_hours, 2),
+        "geometry": route_cache.geometry(route, simplified=simplified),
+        "polyline": route.simplified_polyline if simplified else route.polyline,
+    }
+
+@app.get("/supplier/reports/status", response_model=list[SupplierReportResponse])
+def get_supplier_report_status(ids: list[int] = Query(...), db: Session = Depends(get_db)):
     """
-    Get all supplier reports ordered by creation date (newest first)
+    Current state of specific reports, for clients waiting on pending verification.
+    Usage: /supplier/reports/status?ids=1&ids=2
     """
-    reports = db.query(SupplierReport).order_by(SupplierReport.created_at.desc()).limit(limit).all()
-    return reports
+    if len(ids) > MAX_SUPPLIER_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Too many ids (max {MAX_SUPPLIER_BATCH_SIZE})")
+    return db.query(SupplierReport).filter(SupplierReport.id.in_(ids)).all()
+
+@app.get("/supplier/verification/queue")
+def get_verification_queue():
+    """Background verification worker state"""
+    return {
+        "running": verification_worker.running,
+        "queue_depth": verification_worker.queue_depth,
+        "verified_total": verification_worker.verified_total,
+        "batches_written": verification_worker.batches_written,
+    }
+
+def save_routes(db: Session, routes: dict):
+    route_cache.store(db, routes)
+    db.commit()
+
+# Sortable columns for the supplier leaderboard
+SUPPLIER_STATS_SORT_COLUMNS = {
+    "report_count": SupplierStats.report_count,
+    "flagged_count": SupplierStats.flagged_count,
+    "warning_count": SupplierStats.warning_count,
+    "verified_count": SupplierStats.verified_count,
+    "flagged_rate": SupplierStats.flagged_count * 1.0 / SupplierStats.report_count,
+    "mean_deviation_pct": SupplierStats.mean_deviation_pct,
+    "max_deviation_pct": SupplierStats.max_deviation_pct,
+    "cumulative_co2_delta": SupplierStats.cumulative_co2_delta,
+    "supplier_name": SupplierStats.supplier_name,
+}
+
+@app.get("/supplier/stats")
+def get_supplier_stats(
+    sort_by: str = "flagged_count",
+    order: str = "desc",
+    limit: int = Query(20, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """
+    Supplier leaderboard from the incrementally maintained supplier_stats table
+    (never re-scans supplier_reports).
+    """
+    column = SUPPLIER_STATS_SORT_COLUMNS.get(sort_by)
+    if column is None:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(SUPPLIER_STATS_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+
+    ordering = column.desc() if order == "desc" else column.asc()
+    total = db.query(func.count(SupplierStats.supplier_name)).scalar() or 0
+    rows = db.query(SupplierStats)\
+        .order_by(ordering, SupplierStats.supplier_name)\
+        .offset(offset)\
+        .limit(limit)\
+        .all()
+
+    return {
+        "total": int(total),
+        "limit": limit,
+        "offset": offset,
+        "sort_by": sort_by,
+        "order": order,
+        "suppliers": [supplier_stats.stats_row(r) for r in rows],
+    }
 
 @app.get("/supplier/route")
-def get_supplier_route(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+async def get_supplier_route(start_lat: float, start_lng: float, end_lat: float, end_lng: float, db: Session = Depends(get_db)):
     """
     Get route geometry from Mapbox Directions API for visualization
-    Returns route distance, duration, and geometry for drawing on map
+    Returns route distance, duration, and geometry for drawing on map.
+    Lanes already in the route store are answered without calling the API.
     """
-    distance_km, duration_hours, geometry = get_mapbox_route_data(start_lat, start_lng, end_lat, end_lng)
+    lane = lane_key(start_lat, start_lng, end_lat, end_lng)
+    route = await run_in_threadpool(route_cache.get, db, lane)
+    if route is not None:
+        return {
+            "distance_km": round(route.distance_km, 2),
+            "duration_hours": round(route.duration_hours, 2),
+            "geometry": route_cache.geometry(route)
+        }
+
+    distance_km, duration_hours, geometry = await get_route_data(*lane)
+    await run_in_threadpool(save_routes, db, {lane: (distance_km, duration_hours, geometry)})
     
     return {
         "distance_km": round(distance_km, 2),
@@ -1091,6 +1688,146 @@ def get_supplier_route(start_lat: float, start_lng: float, end_lat: float, end_l
         "geometry": geometry
     }
 # -------------------------
+# Bulk exports (streamed)
+# -------------------------
+@app.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = True,
+    start_date: date = None,
+    end_date: date = None,
+    company_id: int = None,
+    vehicle_id: str = None,
+    supplier_name: str = None,
+    verification_status: str = None,
+):
+    """
+    Full extract of trips, gps or supplier-reports as NDJSON or CSV (gzipped
+    unless gzip=false), streamed from a server-side cursor in constant memory.
+    Dates are inclusive. Filters: company_id (trips), vehicle_id (gps),
+    supplier_name and verification_status (supplier-reports).
+    """
+    if dataset not in exports.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset (one of {', '.join(exports.DATASETS)})")
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    filters = {
+        "company_id": company_id,
+        "vehicle_id": vehicle_id,
+        "supplier_name": supplier_name,
+        "verification_status": verification_status,
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    unsupported = [name for name in filters if name not in exports.DATASETS[dataset].filters]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"{dataset} cannot be filtered by {', '.join(unsupported)}")
+
+    query = exports.statement(exports.DATASETS[dataset], start_date, end_date, **filters)
+    filename = exports.filename(dataset, format, gzip, start_date, end_date)
+    return StreamingResponse(
+        exports.stream(dataset, query, format, gzip),
+        media_type="application/gzip" if gzip else exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# -------------------------
+# Historical analytics (Parquet archive + today's rows)
+# -------------------------
+TRIP_MEASURES = [
+    ("trips", "count(*)", func.count()),
+    ("distance_km", "sum(distance_km)", func.sum(Trip.distance_km)),
+    ("co2_kg", "sum(co2_kg)", func.sum(Trip.co2_kg)),
+]
+
+def require_analytics():
+    if not analytics.available():
+        raise HTTPException(status_code=503, detail="Analytics needs duckdb (pip install duckdb)")
+
+@app.get("/analytics/footprint")
+def analytics_footprint(
+    start_date: date = None,
+    end_date: date = None,
+    group_by: str = Query("day", pattern="^(day|month|vehicle_type)$"),
+    company_id: int = None,
+):
+    """
+    Trips, distance and CO2 per day, month or vehicle type over any date range.
+    Closed days are read from the Parquet archive, the open day from the database.
+    """
+    require_analytics()
+    key = {
+        "day": analytics.day_key("period", Trip.created_at),
+        "month": analytics.month_key("period", Trip.created_at),
+        "vehicle_type": analytics.column_key("vehicle_type", Trip.vehicle_type),
+    }[group_by]
+    filters = [(Trip.company_id, company_id)] if company_id is not None else []
+    result = analytics.aggregate("trips", start_date, end_date, [key], TRIP_MEASURES, filters)
+    rows = sorted(result["rows"], key=lambda r: r["period"]) if group_by != "vehicle_type" \
+        else sorted(result["rows"], key=lambda r: r["co2_kg"], reverse=True)
+    return {
+        "group_by": group_by,
+        "rows": [dict(r, distance_km=round(r["distance_km"], 2), co2_kg=round(r["co2_kg"], 2)) for r in rows],
+        "sources": result["sources"],
+    }
+
+@app.get("/analytics/routes")
+def analytics_routes(
+    start_date: date = None,
+    end_date: date = None,
+    company_id: int = None,
+    order_by: str = Query("co2_kg", pattern="^(co2_kg|trips|distance_km)$"),
+    limit: int = Query(20, ge=1, le=1000),
+):
+    """Busiest or most emitting routes over a date range, with CO2 per km"""
+    require_analytics()
+    keys = [
+        analytics.column_key("start_location", Trip.start_location),
+        analytics.column_key("end_location", Trip.end_location),
+    ]
+    filters = [(Trip.company_id, company_id)] if company_id is not None else []
+    result = analytics.aggregate("trips", start_date, end_date, keys, TRIP_MEASURES, filters)
+    rows = sorted(result["rows"], key=lambda r: r[order_by], reverse=True)[:limit]
+    return {
+        "rows": [
+            {
+                "route": f"{r['start_location']} - {r['end_location']}",
+                "start_location": r["start_location"],
+                "end_location": r["end_location"],
+                "trips": r["trips"],
+                "distance_km": round(r["distance_km"], 2),
+                "co2_kg": round(r["co2_kg"], 2),
+                "co2_per_km": round(r["co2_kg"] / r["distance_km"], 4) if r["distance_km"] else None,
+            }
+            for r in rows
+        ],
+        "sources": result["sources"],
+    }
+
+@app.get("/analytics/gps/{vehicle_id}")
+def analytics_gps(vehicle_id: str, start_date: date = None, end_date: date = None):
+    """Daily GPS points, distance and CO2 of one vehicle over a date range"""
+    require_analytics()
+    result = analytics.aggregate(
+        "gps_tracking", start_date, end_date,
+        [analytics.day_key("day", GPSTrack.timestamp)],
+        [
+            ("points", "count(*)", func.count()),
+            ("distance_km", "sum(distance_segment)", func.sum(GPSTrack.distance_segment)),
+            ("co2_kg", "sum(co2_segment)", func.sum(GPSTrack.co2_segment)),
+        ],
+        [(GPSTrack.vehicle_id, vehicle_id)],
+    )
+    return {
+        "vehicle_id": vehicle_id,
+        "rows": [
+            dict(r, distance_km=round(r["distance_km"], 3), co2_kg=round(r["co2_kg"], 3))
+            for r in sorted(result["rows"], key=lambda r: r["day"])
+        ],
+        "sources": result["sources"],
+    }
+
+# -------------------------
 # Live Tracker - Trucks
 # -------------------------
 @app.post("/trucks", response_model=TruckResponse)
@@ -1119,22 +1856,25 @@ def get_truck(truck_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Truck not found")
     return truck
 
-@app.get("/trucks")
+@app.get("/trucks", response_model=list[TruckSummary])
 def list_trucks(db: Session = Depends(get_db)):
     """
     Get all trucks for live tracking
     """
-    trucks = db.query(Truck).all()
-    return [
+    trucks = db.query(
+        Truck.id, Truck.truck_id, Truck.driver_name, Truck.status, Truck.vehicle_type, Truck.capacity_tons
+    ).all()
+    return FastJSONResponse([
         {
             "id": t.id,
             "truck_id": t.truck_id,
             "driver_name": t.driver_name,
             "status": t.status,
-            "vehicle_type": t.vehicle_type
+            "vehicle_type": t.vehicle_type,
+            "capacity_tons": t.capacity_tons
         }
         for t in trucks
-    ]
+    ])
 
 @app.post("/trucks/{truck_id}/start-tracking")
 def start_truck_tracking(truck_id: str, db: Session = Depends(get_db)):
@@ -1154,14 +1894,10 @@ def start_truck_tracking(truck_id: str, db: Session = Depends(get_db)):
         num_points=20
     )
     
-    active_simulations[truck_id] = True
-    
-    simulation_thread = threading.Thread(
-        target=gps_simulation_task_wrapper,
-        args=(truck_id, gps_points, truck.vehicle_type),
-        daemon=True
+    generation = simulations.claim(
+        truck_id, truck.vehicle_type, truck.start_lat, truck.start_lng, truck.end_lat, truck.end_lng
     )
-    simulation_thread.start()
+    start_simulation_thread(truck_id, generation, gps_points, truck.vehicle_type)
     
     truck.status = "active"
     db.commit()
@@ -0,0 +1,298 @@
+"""
+Prometheus-style metrics, served as text at /metrics.
+
+A small in-process registry (counters, gauges, histograms with labels) rendered
+in the Prometheus text exposition format, so no client library is needed.
+
+Requests are measured by InstrumentedRoute, the app's route class: it knows the
+route template (/gps/live/{vehicle_id}, not the raw path, so label cardinality
+stays bounded), tracks in-flight requests and latency per route, and opens a
+per-request DB accumulator. SQLAlchemy cursor events add every statement and
+its duration to that accumulator; sync endpoints run in the threadpool with a
+copy of the request context, so statements are attributed to the right route.
+query_audit.py builds budgets, the slow-query log and N+1 detection on the
+same hooks.
+
+METRICS_ENABLED=false turns all of it off (the /metrics endpoint stays, empty).
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+import query_audit
+import structured_log
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Metric):
+    """Set / inc / dec, or computed at scrape time from a callback returning {labels: value}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> list:
+        if self.callback is not None:
+            items = list(self.callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class CallbackCounter(Gauge):
+    """Monotonic total kept elsewhere (e.g. a worker attribute), read at scrape time"""
+    kind = "counter"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket = _labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# -------------------------
+# HTTP and database
+# -------------------------
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled by route", ("method", "route"))
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed by route", ("route",))
+DB_SECONDS = Counter("db_statement_seconds_total", "Time spent in SQL statements by route", ("route",))
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements per request by route", ("route",), STATEMENT_BUCKETS
+)
+DB_SECONDS_PER_REQUEST = Histogram("db_seconds_per_request", "Database time per request by route", ("route",))
+
+# Simulation and ingest; the gauges are wired up by register_callbacks
+SIMULATION_TICKS = Counter("gps_simulation_ticks_total", "GPS simulation ticks written")
+SIMULATION_TICK_SECONDS = Histogram("gps_simulation_tick_duration_seconds", "Time to write one simulation tick")
+VERIFICATION_BATCH_SECONDS = Histogram(
+    "verification_batch_duration_seconds", "Time to verify and write one supplier report batch"
+)
+
+# Rate limiting and load shedding (throttle.py)
+REQUESTS_THROTTLED = Counter(
+    "http_requests_throttled_total", "Requests rejected by a rate limit (429)", ("method", "route", "key")
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total", "Requests shed under load (503)", ("method", "route", "priority")
+)
+
+LOG_RECORDS_DROPPED = CallbackCounter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full",
+    callback=lambda: {(): structured_log.dropped()},
+)
+
+# Statements outside any request (workers, startup) are counted under this route
+BACKGROUND_ROUTE = "background"
+
+
+class RequestStats:
+    __slots__ = ("route", "statements", "db_seconds", "log")
+
+    def __init__(self, route: str, log: list = None):
+        self.route = route
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.log = log  # [(statement, seconds)] when the request is sampled by query_audit
+
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that records latency, status, in-flight count and DB cost per route template"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not METRICS_ENABLED:
+            return handler
+        route = self.path
+
+        async def instrumented(request):
+            method = request.method
+            stats = RequestStats(route, [] if query_audit.sampled() else None)
+            token = current_request.set(stats)
+            IN_FLIGHT.inc(method, route)
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                if stats.log is not None:
+                    query_audit.finish(method, route, stats.log)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                IN_FLIGHT.dec(method, route)
+                current_request.reset(token)
+                REQUESTS.inc(method, route, str(status))
+                REQUEST_SECONDS.observe(method, route, value=elapsed)
+                DB_STATEMENTS_PER_REQUEST.observe(route, value=stats.statements)
+                DB_SECONDS_PER_REQUEST.observe(route, value=stats.db_seconds)
+
+        return instrumented
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if stats.log is not None:
+            stats.log.append((statement, elapsed))
+    route = stats.route if stats is not None else BACKGROUND_ROUTE
+    DB_STATEMENTS.inc(route)
+    DB_SECONDS.inc(route, amount=elapsed)
+    if elapsed * 1000 > query_audit.SLOW_QUERY_MS:
+        query_audit.slow(conn.engine, statement, parameters, elapsed, route, explain=not executemany)
+
+
+def instrument_engine(engine):
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def register_callbacks(driving_simulations: dict, verification_worker):
+    """Scrape-time gauges over state owned by simulations.py and the verification worker"""
+    Gauge("gps_simulations_active", "GPS simulations driven by this worker process",
+          callback=lambda: {(): len(driving_simulations)})
+    Gauge("verification_queue_depth", "Supplier reports waiting for verification",
+          callback=lambda: {(): verification_worker.queue_depth})
+    CallbackCounter("verification_reports_verified_total", "Supplier reports verified",
+                    callback=lambda: {(): verification_worker.verified_total})
+    CallbackCounter("verification_batches_written_total", "Verification batches written",
+                    callback=lambda: {(): verification_worker.batches_written})
+
+
+def register_replica_callbacks(replica_state):
+    """Read-replica lag and where get_read_db sent reads (database.py)"""
+    Gauge("db_replica_lag_seconds", "Replication lag last measured on the read replica",
+          callback=lambda: {(): replica_state.lag} if replica_state.lag is not None else {})
+    CallbackCounter("db_reads_routed_total", "Read-only requests by database used and why",
+                    ("target", "reason"), callback=lambda: dict(replica_state.routed))
+
+
+def register_load_callbacks(pool_wait, queue_depth, shed_level):
+    """Load signals throttle.py sheds on"""
+    Gauge("db_pool_wait_seconds", "Mean wait for a database connection over the last seconds",
+          callback=lambda: {(): pool_wait()})
+    Gauge("threadpool_queue_depth", "Requests waiting for a threadpool thread",
+          callback=lambda: {(): queue_depth()})
+    Gauge("load_shedding_level", "0 normal, 1 shedding low-priority routes, 2 shedding all but ingest",
+          callback=lambda: {(): shed_level()})
@@ -1,57 +1,471 @@
-from database import SessionLocal, engine
-from sqlalchemy import text
+"""
+Versioned schema migrations.
 
-def migrate():
-    try:
+    python migrate.py              apply pending migrations
+    python migrate.py --status     list applied / pending versions
+    python migrate.py --dry-run    print pending steps with estimated lock impact
+    python migrate.py --target 3   apply up to version 3
+
+Migrations live in migrations.py as an ordered list of numbered steps. Applied
+versions are recorded in schema_migrations and finished steps in
+schema_migration_steps, so a run that stops halfway (or a backfill that is
+interrupted) resumes where it left off. Steps are written to avoid long locks
+on large tables:
+
+- SQL / AddColumn run in a short transaction with a lock_timeout, retried a few
+  times, so they never queue behind a long transaction and block everyone else.
+- ConcurrentIndex uses CREATE INDEX CONCURRENTLY outside a transaction; an
+  invalid index left by an interrupted build is dropped and rebuilt.
+- Backfill updates in primary-key chunks, one commit per chunk, with a pause
+  between chunks; progress is saved with each chunk.
+
+Only one runner at a time: Postgres runs take an advisory lock, SQLite runs a
+lock file next to the database (workers starting together on one host).
+--dry-run and --status only read; they never create the version tables.
+"""
+import argparse
+import math
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import inspect, text
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite runs are not serialized
+    fcntl = None
+
+from database import Base, engine
+import models  # noqa: F401  (registers every table on Base.metadata)
+import structured_log
+
+log = structured_log.get_logger("migrate")
+
+LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "5"))
+LOCK_RETRY_SECONDS = 2.0
+ADVISORY_LOCK_KEY = 727_001  # arbitrary, shared by every migration runner
+
+# Rough Postgres throughput used to size dry-run estimates
+ESTIMATED_INDEX_ROWS_PER_SECOND = 500_000
+ESTIMATED_BACKFILL_ROWS_PER_SECOND = 50_000
+
+VERSION_TABLE = "schema_migrations"
+REFERENCES = re.compile(r"\bREFERENCES\s+(\w+)", re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def is_postgres(conn) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def estimated_rows(conn, table: str) -> int:
+    """Planner estimate on Postgres (no scan), exact count elsewhere; 0 if the table is missing"""
+    if not inspect(conn).has_table(table):
+        return 0
+    if is_postgres(conn):
+        rows = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :t"), {"t": table}).scalar()
+        return max(int(rows or 0), 0)
+    return int(conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0)
+
+
+def _is_lock_timeout(error: Exception) -> bool:
+    return "lock timeout" in str(error).lower() or "lock_not_available" in str(error).lower()
+
+
+def run_transaction(statements: list, params: dict = None):
+    """Run statements in one short transaction, retrying when a lock can't be taken in time"""
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with engine.begin() as conn:
+                if is_postgres(conn):
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+                for statement in statements:
+                    conn.execute(text(statement), params or {})
+            return
+        except Exception as e:
+            if not _is_lock_timeout(e) or attempt == LOCK_RETRIES:
+                raise
+            log.warning("lock not available, retrying", retry_in_seconds=LOCK_RETRY_SECONDS,
+                        attempt=attempt + 1, retries=LOCK_RETRIES)
+            time.sleep(LOCK_RETRY_SECONDS)
+
+
+# -------------------------
+# Step types
+# -------------------------
+class Step:
+    table = None
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    def lock_impact(self, conn) -> str:
+        raise NotImplementedError
+
+    def apply(self, version: int, index: int):
+        raise NotImplementedError
+
+
+class CreateTables(Step):
+    """Base.metadata.create_all: creates missing tables only, never alters existing ones"""
+
+    def describe(self) -> str:
+        return "create missing tables from models.py"
+
+    def lock_impact(self, conn) -> str:
+        missing = [t for t in Base.metadata.tables if not inspect(conn).has_table(t)]
+        return f"new tables only ({', '.join(missing) or 'none missing'}); no locks on existing tables"
+
+    def apply(self, version: int, index: int):
+        Base.metadata.create_all(bind=engine)
+
+
+class SQL(Step):
+    """Plain DDL/DML in a short transaction with lock_timeout; with dialect, only on that backend"""
+
+    def __init__(self, statement: str, table: str = None, lock: str = "ACCESS EXCLUSIVE", note: str = "",
+                 dialect: str = None):
+        self.statement = statement.strip()
+        self.table = table
+        self.lock = lock
+        self.note = note
+        self.dialect = dialect
+
+    def describe(self) -> str:
+        return self.statement
+
+    def lock_impact(self, conn) -> str:
+        if self.dialect and conn.dialect.name != self.dialect:
+            return f"skipped (only on {self.dialect})"
+        if not self.table:
+            return self.note or "no table lock"
+        rows = estimated_rows(conn, self.table)
+        return f"{self.lock} on {self.table} (~{rows:,} rows), waits at most {LOCK_TIMEOUT}. {self.note}".strip()
+
+    def apply(self, version: int, index: int):
+        if self.dialect and engine.dialect.name != self.dialect:
+            return
+        run_transaction([self.statement])
+
+
+class AddColumn(Step):
+    """ALTER TABLE ... ADD COLUMN when the column is missing (portable IF NOT EXISTS)"""
+
+    def __init__(self, table: str, column: str, definition: str):
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    def describe(self) -> str:
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+
+    def lock_impact(self, conn) -> str:
+        rows = estimated_rows(conn, self.table)
+        referenced = REFERENCES.search(self.definition)
+        if referenced:
+            # The new foreign key is validated in the same statement
+            return (f"ACCESS EXCLUSIVE on {self.table} (~{rows:,} rows) while the foreign key is checked "
+                    f"(one scan of the table), and SHARE ROW EXCLUSIVE on {referenced.group(1)} "
+                    f"(writes to it wait); waits at most {LOCK_TIMEOUT} for each lock")
+        return (f"ACCESS EXCLUSIVE on {self.table} (~{rows:,} rows) for a metadata-only change "
+                f"(constant default, no rewrite), waits at most {LOCK_TIMEOUT}")
+
+    def apply(self, version: int, index: int):
         with engine.connect() as conn:
-            # Add company_id column to trips if it doesn't exist
-            conn.execute(text("""
-                ALTER TABLE trips
-                ADD COLUMN IF NOT EXISTS company_id INTEGER DEFAULT 1;
-            """))
-            
-            # Create companies table if it doesn't exist
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS companies (
-                    id INTEGER PRIMARY KEY,
-                    name VARCHAR UNIQUE,
-                    industry VARCHAR,
-                    carbon_credits FLOAT DEFAULT 0.0,
-                    carbon_credits_redeemed FLOAT DEFAULT 0.0,
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-            """))
-            
-            # Create carbon_credits table if it doesn't exist
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS carbon_credits (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER REFERENCES companies(id),
-                    trip_id INTEGER REFERENCES trips(id),
-                    credits FLOAT,
-                    reason VARCHAR,
-                    redeemed BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-            """))
-            
-            # Create default company if it doesn't exist
-            conn.execute(text("""
-                INSERT INTO companies (id, name, industry, carbon_credits, carbon_credits_redeemed)
-                VALUES (1, 'Default Company', 'Logistics', 0.0, 0.0)
-                ON CONFLICT (name) DO NOTHING;
-            """))
-            
-            # Add weight column to supplier_reports if it doesn't exist
-            conn.execute(text("""
-                ALTER TABLE supplier_reports
-                ADD COLUMN IF NOT EXISTS weight FLOAT DEFAULT 0.0;
-            """))
-            
-            conn.commit()
-            print("Migration completed successfully!")
-    except Exception as e:
-        print(f"Migration error: {e}")
+            if not inspect(conn).has_table(self.table):
+                raise MigrationError(f"table {self.table} does not exist")
+            if self.column in {c["name"] for c in inspect(conn).get_columns(self.table)}:
+                return
+        run_transaction([self.describe()])
+
+
+class ConcurrentIndex(Step):
+    """CREATE INDEX CONCURRENTLY on Postgres (reads and writes keep going), plain CREATE INDEX elsewhere"""
+
+    def __init__(self, name: str, table: str, columns: list, unique: bool = False, where: str = None):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.where = where
+
+    def _sql(self, concurrently: bool) -> str:
+        return "CREATE {unique}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns}){where}".format(
+            unique="UNIQUE " if self.unique else "",
+            concurrently="CONCURRENTLY " if concurrently else "",
+            name=self.name,
+            table=self.table,
+            columns=", ".join(self.columns),
+            where=f" WHERE {self.where}" if self.where else "",
+        )
+
+    def describe(self) -> str:
+        return self._sql(concurrently=True)
+
+    def lock_impact(self, conn) -> str:
+        rows = estimated_rows(conn, self.table)
+        seconds = rows / ESTIMATED_INDEX_ROWS_PER_SECOND
+        if is_postgres(conn):
+            return (f"SHARE UPDATE EXCLUSIVE on {self.table} (~{rows:,} rows): reads and writes continue, "
+                    f"other DDL waits; build ~{seconds:.0f}s (two table scans)")
+        return f"write lock on the database for the build (~{rows:,} rows, ~{seconds:.0f}s)"
+
+    def apply(self, version: int, index: int):
+        with engine.connect() as conn:
+            if not is_postgres(conn):
+                conn.execute(text(self._sql(concurrently=False)))
+                conn.commit()
+                return
+
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ), {"name": self.name}).scalar()
+            if valid is False:
+                log.warning("dropping invalid index left by an interrupted build", index=self.name)
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+            conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+            conn.execute(text(self._sql(concurrently=True)))
+
+
+class Backfill(Step):
+    """
+    UPDATE in primary-key chunks, committing each chunk with its progress so the
+    step resumes after an interruption. `assignments` is the SET clause, `where`
+    limits which rows need it (keeps re-runs cheap).
+    """
+
+    def __init__(self, table: str, assignments: str, where: str = "1 = 1", key: str = "id",
+                 batch_size: int = 5000, pause_seconds: float = 0.1):
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+        self.key = key
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    def describe(self) -> str:
+        return (f"UPDATE {self.table} SET {self.assignments} WHERE ({self.where}) "
+                f"in chunks of {self.batch_size} by {self.key}, {self.pause_seconds}s apart")
+
+    def lock_impact(self, conn) -> str:
+        rows = estimated_rows(conn, self.table)
+        chunks = math.ceil(rows / self.batch_size) if rows else 0
+        seconds = rows / ESTIMATED_BACKFILL_ROWS_PER_SECOND + chunks * self.pause_seconds
+        return (f"ROW EXCLUSIVE on {self.table}: row locks on at most {self.batch_size:,} rows at a time, "
+                f"{chunks:,} chunks over ~{rows:,} rows, ~{seconds:.0f}s; resumable")
+
+    def apply(self, version: int, index: int):
+        with engine.connect() as conn:
+            max_key = conn.execute(text(f"SELECT MAX({self.key}) FROM {self.table}")).scalar() or 0
+            last_key = conn.execute(text(
+                "SELECT last_key FROM schema_migration_steps WHERE version = :v AND step = :s"
+            ), {"v": version, "s": index}).scalar()
+        if last_key is None:
+            with engine.connect() as conn:
+                last_key = (conn.execute(text(f"SELECT MIN({self.key}) FROM {self.table}")).scalar() or 1) - 1
+        else:
+            log.info("resuming backfill", table=self.table, key=self.key, last_key=last_key)
+
+        updated = 0
+        started = time.perf_counter()
+        while last_key < max_key:
+            upper = min(last_key + self.batch_size, max_key)
+            run_transaction([
+                f"UPDATE {self.table} SET {self.assignments} "
+                f"WHERE {self.key} > :lower AND {self.key} <= :upper AND ({self.where})",
+                "UPDATE schema_migration_steps SET last_key = :upper WHERE version = :v AND step = :s",
+            ], {"lower": last_key, "upper": upper, "v": version, "s": index})
+            updated += upper - last_key
+            last_key = upper
+            if self.pause_seconds:
+                time.sleep(self.pause_seconds)
+        log.info("backfill finished", table=self.table, key_range=updated,
+                 seconds=round(time.perf_counter() - started, 1))
+
+
+class Migration:
+    def __init__(self, version: int, name: str, steps: list):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+
+# -------------------------
+# Runner
+# -------------------------
+def ensure_version_tables():
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_seconds FLOAT
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migration_steps (
+                version INTEGER NOT NULL,
+                step INTEGER NOT NULL,
+                completed BOOLEAN DEFAULT FALSE,
+                last_key BIGINT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (version, step)
+            )
+        """))
+
+
+def applied_versions() -> dict:
+    """Applied migrations by version; none when the version table doesn't exist yet"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_TABLE):
+            return {}
+        rows = conn.execute(text("SELECT version, name, applied_at FROM schema_migrations ORDER BY version")).all()
+    return {row.version: row for row in rows}
+
+
+def completed_steps(version: int) -> set:
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT step FROM schema_migration_steps WHERE version = :v AND completed = :done"
+        ), {"v": version, "done": True}).all()
+    return {row.step for row in rows}
+
+
+def _start_step(version: int, index: int):
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM schema_migration_steps WHERE version = :v AND step = :s"
+        ), {"v": version, "s": index}).scalar()
+        if not exists:
+            conn.execute(text(
+                "INSERT INTO schema_migration_steps (version, step, completed) VALUES (:v, :s, :done)"
+            ), {"v": version, "s": index, "done": False})
+
+
+def _finish_step(version: int, index: int):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE schema_migration_steps SET completed = :done, updated_at = CURRENT_TIMESTAMP "
+            "WHERE version = :v AND step = :s"
+        ), {"v": version, "s": index, "done": True})
+
+
+def apply_migration(migration: Migration):
+    started = time.perf_counter()
+    done = completed_steps(migration.version)
+    for index, step in enumerate(migration.steps):
+        if index in done:
+            continue
+        log.info("applying step", version=migration.version, step=f"{index + 1}/{len(migration.steps)}",
+                 description=step.describe())
+        _start_step(migration.version, index)
+        step.apply(migration.version, index)
+        _finish_step(migration.version, index)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO schema_migrations (version, name, duration_seconds) VALUES (:v, :n, :d)"
+        ), {"v": migration.version, "n": migration.name, "d": time.perf_counter() - started})
+
+
+def pending_migrations(migrations: list, target: int = None) -> list:
+    applied = applied_versions()
+    return [
+        m for m in migrations
+        if m.version not in applied and (target is None or m.version <= target)
+    ]
+
+
+def print_plan(pending: list):
+    if not pending:
+        print("Nothing to apply")
+        return
+    with engine.connect() as conn:
+        for migration in pending:
+            print(f"{migration.version}  {migration.name}")
+            for index, step in enumerate(migration.steps):
+                print(f"    {index + 1}/{len(migration.steps)}  {step.describe()}")
+                print(f"          lock: {step.lock_impact(conn)}")
+
+
+def print_status(migrations: list):
+    applied = applied_versions()
+    for migration in migrations:
+        row = applied.get(migration.version)
+        state = f"applied {row.applied_at}" if row else "pending"
+        print(f"{migration.version:>4}  {state:<35}  {migration.name}")
+
+
+class _RunnerLock:
+    """
+    Only one runner at a time: a session-level advisory lock on Postgres, an
+    exclusive lock on <database file>.migrate.lock on SQLite (which has no
+    advisory locks, and only ever has runners on the same host).
+    """
+
+    def __enter__(self):
+        self.conn = engine.connect()
+        self.lock_file = None
+        if is_postgres(self.conn):
+            log.info("waiting for migration lock")
+            self.conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": ADVISORY_LOCK_KEY})
+        elif fcntl is not None and engine.url.database not in (None, "", ":memory:"):
+            self.lock_file = open(f"{engine.url.database}.migrate.lock", "w")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if is_postgres(self.conn):
+            self.conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": ADVISORY_LOCK_KEY})
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+        self.conn.close()
+
+
+def migrate(target: int = None, dry_run: bool = False) -> int:
+    """Apply (or with dry_run, describe) pending migrations; returns the number applied"""
+    from migrations import MIGRATIONS
+
+    if dry_run:
+        print_plan(pending_migrations(MIGRATIONS, target))
+        return 0
+
+    with _RunnerLock():
+        ensure_version_tables()
+        pending = pending_migrations(MIGRATIONS, target)
+        for migration in pending:
+            log.info("applying migration", version=migration.version, name=migration.name)
+            apply_migration(migration)
+    log.info("migrations completed", applied=len(pending))
+    return len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--dry-run", action="store_true", help="print pending steps and lock impact only")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--target", type=int, help="apply up to this version")
+    args = parser.parse_args()
+
+    if args.status:
+        from migrations import MIGRATIONS
+        print_status(MIGRATIONS)
+        return
+    try:
+        migrate(args.target, args.dry_run)
+    except Exception:
+        log.exception("migration failed")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    migrate()
+    main()
@@ -0,0 +1,151 @@
+"""
+Schema migrations, applied in order by migrate.py.
+
+Never edit a migration that has shipped; add a new version instead. Anything
+touching a large table should use ConcurrentIndex / Backfill rather than SQL.
+"""
+from migrate import AddColumn, Backfill, ConcurrentIndex, CreateTables, Migration, SQL
+
+MIGRATIONS = [
+    Migration(1, "baseline", [
+        CreateTables(),
+        AddColumn("trips", "company_id", "INTEGER DEFAULT 1"),
+        AddColumn("supplier_reports", "weight", "FLOAT DEFAULT 0.0"),
+        AddColumn("supplier_reports", "route_id", "INTEGER REFERENCES route_geometries(id)"),
+        AddColumn("trucks", "capacity_tons", "FLOAT DEFAULT 10.0"),
+        SQL("""
+            INSERT INTO companies (id, name, industry, carbon_credits, carbon_credits_redeemed)
+            VALUES (1, 'Default Company', 'Logistics', 0.0, 0.0)
+            ON CONFLICT DO NOTHING
+        """, table="companies", lock="ROW EXCLUSIVE", note="single-row insert"),
+        # Used to pick up pending supplier verifications on startup
+        ConcurrentIndex("ix_supplier_reports_verification_status", "supplier_reports", ["verification_status"]),
+    ]),
+    Migration(2, "trip and gps time indexes", [
+        # Date-range filters and newest-first listings on trips
+        ConcurrentIndex("ix_trips_created_at", "trips", ["created_at"]),
+        ConcurrentIndex("ix_trips_company_id_created_at", "trips", ["company_id", "created_at"]),
+        # Live position / history per vehicle, and the last-24h fleet view
+        ConcurrentIndex("ix_gps_tracking_vehicle_id_timestamp", "gps_tracking", ["vehicle_id", "timestamp"]),
+        ConcurrentIndex("ix_gps_tracking_timestamp", "gps_tracking", ["timestamp"]),
+    ]),
+    Migration(3, "backfill trip company", [
+        # Rows written outside the ORM can have no company; reports treat them as company 1
+        Backfill("trips", "company_id = 1", where="company_id IS NULL", batch_size=10000),
+    ]),
+    Migration(4, "simulation leases", [
+        # Shared GPS simulation registry (simulations.py)
+        CreateTables(),
+    ]),
+    Migration(5, "supplier report time index", [
+        # Date-range bulk exports of supplier reports (exports.py)
+        ConcurrentIndex("ix_supplier_reports_created_at", "supplier_reports", ["created_at"]),
+    ]),
+    Migration(6, "replica heartbeat", [
+        # Replication lag probe for read-replica routing (replica.py)
+        CreateTables(),
+    ]),
+    Migration(7, "supplier report verification error", [
+        # Reports the worker gave up on are marked failed with the reason (verification_worker.py)
+        AddColumn("supplier_reports", "verification_error", "VARCHAR"),
+    ]),
+    Migration(8, "trip change counter", [
+        # Lets the what-if scenario cache (scenarios.py) see new, updated and deleted trips
+        # without counting the table. Inserts add their row count; updates and deletes bump
+        # modified once per statement. Superseded by 9; the table is spelled out because
+        # models.py no longer has it.
+        SQL("""
+            CREATE TABLE IF NOT EXISTS trip_changes (
+                id INTEGER PRIMARY KEY,
+                inserted INTEGER NOT NULL,
+                modified INTEGER NOT NULL
+            )
+        """, note="new table only"),
+        SQL("INSERT INTO trip_changes (id, inserted, modified) VALUES (1, 0, 0) ON CONFLICT DO NOTHING",
+            table="trip_changes", lock="ROW EXCLUSIVE", note="single-row insert"),
+        SQL("""
+            CREATE OR REPLACE FUNCTION count_trip_changes() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE trip_changes SET inserted = inserted + (SELECT COUNT(*) FROM new_rows) WHERE id = 1;
+                ELSE
+                    UPDATE trip_changes SET modified = modified + 1 WHERE id = 1;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """, dialect="postgresql", note="function only"),
+        SQL("""
+            DROP TRIGGER IF EXISTS trips_count_inserts ON trips;
+            CREATE TRIGGER trips_count_inserts AFTER INSERT ON trips
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION count_trip_changes()
+        """, table="trips", lock="SHARE ROW EXCLUSIVE", note="writes wait for the catalog change only",
+            dialect="postgresql"),
+        SQL("""
+            DROP TRIGGER IF EXISTS trips_count_modifications ON trips;
+            CREATE TRIGGER trips_count_modifications AFTER UPDATE OR DELETE OR TRUNCATE ON trips
+                FOR EACH STATEMENT EXECUTE FUNCTION count_trip_changes()
+        """, table="trips", lock="SHARE ROW EXCLUSIVE", note="writes wait for the catalog change only",
+            dialect="postgresql"),
+        SQL("""
+            CREATE TRIGGER IF NOT EXISTS trips_count_inserts AFTER INSERT ON trips
+            BEGIN UPDATE trip_changes SET inserted = inserted + 1 WHERE id = 1; END
+        """, dialect="sqlite"),
+        SQL("""
+            CREATE TRIGGER IF NOT EXISTS trips_count_updates AFTER UPDATE ON trips
+            BEGIN UPDATE trip_changes SET modified = modified + 1 WHERE id = 1; END
+        """, dialect="sqlite"),
+        SQL("""
+            CREATE TRIGGER IF NOT EXISTS trips_count_deletes AFTER DELETE ON trips
+            BEGIN UPDATE trip_changes SET modified = modified + 1 WHERE id = 1; END
+        """, dialect="sqlite"),
+    ]),    Migration(9, "trip modification log", [
+        # Every trips write in 8 updated the same trip_changes row, so writers queued on its
+        # row lock. scenarios.py now spots inserts from max(id) and the ids it is missing,
+        # and updates, deletes and truncates from a log that gets one new row per statement.
+        SQL("DROP TRIGGER IF EXISTS trips_count_inserts ON trips", table="trips",
+            lock="SHARE ROW EXCLUSIVE", note="writes wait for the catalog change only", dialect="postgresql"),
+        SQL("DROP TRIGGER IF EXISTS trips_count_modifications ON trips", table="trips",
+            lock="SHARE ROW EXCLUSIVE", note="writes wait for the catalog change only", dialect="postgresql"),
+        SQL("DROP FUNCTION IF EXISTS count_trip_changes()", note="function only", dialect="postgresql"),
+        SQL("DROP TRIGGER IF EXISTS trips_count_inserts", dialect="sqlite"),
+        SQL("DROP TRIGGER IF EXISTS trips_count_updates", dialect="sqlite"),
+        SQL("DROP TRIGGER IF EXISTS trips_count_deletes", dialect="sqlite"),
+        SQL("DROP TABLE IF EXISTS trip_changes", table="trip_changes", note="single-row table"),
+        CreateTables(),
+        SQL("""
+            CREATE OR REPLACE FUNCTION log_trip_modification() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO trip_modifications (modified_at) VALUES (now() AT TIME ZONE 'utc');
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """, dialect="postgresql", note="function only"),
+        SQL("""
+            DROP TRIGGER IF EXISTS trips_log_modifications ON trips;
+            CREATE TRIGGER trips_log_modifications AFTER UPDATE OR DELETE OR TRUNCATE ON trips
+                FOR EACH STATEMENT EXECUTE FUNCTION log_trip_modification()
+        """, table="trips", lock="SHARE ROW EXCLUSIVE", note="writes wait for the catalog change only",
+            dialect="postgresql"),
+        SQL("""
+            CREATE TRIGGER IF NOT EXISTS trips_log_updates AFTER UPDATE ON trips
+            BEGIN INSERT INTO trip_modifications (modified_at) VALUES (CURRENT_TIMESTAMP); END
+        """, dialect="sqlite"),
+        SQL("""
+            CREATE TRIGGER IF NOT EXISTS trips_log_deletes AFTER DELETE ON trips
+            BEGIN INSERT INTO trip_modifications (modified_at) VALUES (CURRENT_TIMESTAMP); END
+        """, dialect="sqlite"),
+    ]),    Migration(10, "company id sequence", [
+        # Migration 1 seeds the default company with an explicit id, which leaves the serial
+        # sequence at 1; move it past the existing rows so new companies don't collide
+        SQL("""
+            SELECT setval(pg_get_serial_sequence('companies', 'id'), (SELECT COALESCE(MAX(id), 1) FROM companies))
+        """, note="sequence only", dialect="postgresql"),
+    ]),    Migration(11, "simulation lease failures", [
+        # Simulations that keep dying at the same point are marked failed instead of
+        # being adopted forever (simulations.py)
+        AddColumn("simulation_leases", "adoptions", "INTEGER DEFAULT 0"),
+        AddColumn("simulation_leases", "error", "VARCHAR"),
+    ]),
+]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
 from database import Base
 from datetime import datetime
 
@@ -77,7 +77,27 @@ class SupplierReport(Base):
     weight = Column(Float)
     reported_co2 = Column(Float)
     verified_co2 = Column(Float)
-    verification_status = Column(String)  # verified / flagged / warning
+    verification_status = Column(String, index=True)  # pending / verified / flagged / warning / failed
+    verification_error = Column(String, nullable=True)  # why a failed verification gave up
+    route_id = Column(Integer, ForeignKey("route_geometries.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RouteGeometry(Base):
+    """Routed lane (origin/destination pair), stored once and shared by every report on it"""
+    __tablename__ = "route_geometries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lane_key = Column(String, unique=True, index=True)
+    start_lat = Column(Float)
+    start_lng = Column(Float)
+    end_lat = Column(Float)
+    end_lng = Column(Float)
+    distance_km = Column(Float)
+    duration_hours = Column(Float)
+    polyline = Column(Text)  # encoded polyline, full resolution
+    simplified_polyline = Column(Text)  # Douglas-Peucker simplified, for listings
+    point_count = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -92,5 +112,75 @@ class Truck(Base):
     end_lat = Column(Float)
     end_lng = Column(Float)
     vehicle_type = Column(String, default="diesel")
+    capacity_tons = Column(Float, default=10.0)  # max shipment weight for /optimize/assign
     status = Column(String, default="active")  # active, inactive, completed
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SupplierStats(Base):
+    """
+    Running discrepancy statistics per supplier, updated as reports are verified.
+    Deviation is the absolute distance discrepancy in percent; mean/M2 follow
+    Welford's algorithm so variance never needs a rescan of supplier_reports.
+    """
+    __tablename__ = "supplier_stats"
+
+    supplier_name = Column(String, primary_key=True)
+    report_count = Column(Integer, default=0)
+    verified_count = Column(Integer, default=0)
+    warning_count = Column(Integer, default=0)
+    flagged_count = Column(Integer, default=0)
+    mean_deviation_pct = Column(Float, default=0.0)
+    m2_deviation = Column(Float, default=0.0)
+    max_deviation_pct = Column(Float, default=0.0)
+    cumulative_co2_delta = Column(Float, default=0.0)  # reported - verified, kg
+    last_report_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SimulationLease(Base):
+    """
+    One GPS simulation per truck, shared by every worker process (simulations.py).
+    The owner drives it while it keeps renewing lease_expires_at; generation
+    changes whenever the truck is restarted or adopted, which ends the old driver.
+    """
+    __tablename__ = "simulation_leases"
+
+    truck_id = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)  # host:pid:nonce of the driving worker
+    generation = Column(Integer, nullable=False, default=1)
+    status = Column(String, nullable=False, default="running")  # running, stopped, completed, failed
+    vehicle_type = Column(String, default="diesel")
+    start_lat = Column(Float)
+    start_lng = Column(Float)
+    end_lat = Column(Float)
+    end_lng = Column(Float)
+    points_done = Column(Integer, default=0)  # resume point after a takeover
+    adoptions = Column(Integer, default=0)  # takeovers since the driver last made progress
+    error = Column(String)  # why it failed
+    started_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)
+    lease_expires_at = Column(DateTime, index=True)
+
+
+class ReplicaHeartbeat(Base):
+    """
+    One row the primary rewrites every REPLICA_CHECK_SECONDS; how old it is on
+    the read replica is the replication lag (replica.py).
+    """
+    __tablename__ = "replica_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    beat_at = Column(Float)  # epoch seconds
+
+
+class TripModification(Base):
+    """
+    Append-only log written by triggers on trips (migration 9): one row per
+    statement that updated, deleted or truncated trips, so concurrent writers
+    never touch the same row. scenarios.py reloads when it changes and trims
+    old entries.
+    """
+    __tablename__ = "trip_modifications"
+
+    id = Column(Integer, primary_key=True)
+    modified_at = Column(DateTime, nullable=False, index=True)
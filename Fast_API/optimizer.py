@@ -0,0 +1,90 @@
+"""
+Fleet-scale vehicle switch suggestions.
+
+Vectorized version of the /optimize engine: for N (distance, weight, vehicle)
+rows the emissions of every vehicle type are computed as one N x K matrix and
+compared with the current vehicle, and savings are aggregated per switch option
+(e.g. diesel -> electric). Inputs can be processed in chunks so very large trip
+sets stream with constant memory.
+"""
+import numpy as np
+
+from emissions import EMISSION_FACTORS, emission_factor_array
+
+VEHICLES = list(EMISSION_FACTORS)
+VEHICLE_FACTORS = np.array([EMISSION_FACTORS[v] for v in VEHICLES])
+
+
+def evaluate(distance_km, weight, current_vehicles) -> dict:
+    """
+    Emissions for the current vehicle and every alternative.
+    Returns current (N), alternatives (N x K) and saved (N x K, <= 0 where not better).
+    """
+    distance_km = np.asarray(distance_km, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    load = distance_km * weight
+
+    current = load * emission_factor_array(current_vehicles)
+    alternatives = load[:, None] * VEHICLE_FACTORS[None, :]
+    return {
+        "current": current,
+        "alternatives": alternatives,
+        "saved": current[:, None] - alternatives,
+    }
+
+
+def suggestions(result: dict) -> list:
+    """Per-row suggestion lists, shaped like the /optimize response"""
+    better = (result["saved"] > 0).tolist()
+    alternatives = np.round(result["alternatives"], 2).tolist()
+    saved = np.round(result["saved"], 2).tolist()
+    return [
+        [
+            {"better_vehicle": VEHICLES[k], "new_emission": alternatives[i][k], "co2_saved": saved[i][k]}
+            for k in range(len(VEHICLES)) if better[i][k]
+        ]
+        for i in range(len(better))
+    ]
+
+
+class SavingsSummary:
+    """Accumulates totals per switch option across chunks"""
+
+    def __init__(self):
+        self.rows = 0
+        self.current_emission = 0.0
+        self.best_case_emission = 0.0
+        self.options = {}
+
+    def add(self, current_vehicles, result: dict):
+        current = result["current"]
+        saved = result["saved"]
+        self.rows += len(current)
+        self.current_emission += float(current.sum())
+        self.best_case_emission += float((current - np.maximum(saved.max(axis=1), 0)).sum())
+
+        names = np.asarray([v.lower() for v in current_vehicles], dtype=object)
+        for name in np.unique(names):
+            mask = names == name
+            for k, vehicle in enumerate(VEHICLES):
+                option_saved = saved[mask, k]
+                better = option_saved > 0
+                count = int(better.sum())
+                if not count:
+                    continue
+                key = f"{name}->{vehicle}"
+                option = self.options.setdefault(key, {
+                    "from_vehicle": name, "to_vehicle": vehicle, "rows": 0, "co2_saved": 0.0,
+                })
+                option["rows"] += count
+                option["co2_saved"] += float(option_saved[better].sum())
+
+    def result(self) -> dict:
+        options = sorted(self.options.values(), key=lambda o: o["co2_saved"], reverse=True)
+        return {
+            "rows": self.rows,
+            "total_current_emission": round(self.current_emission, 2),
+            "best_case_emission": round(self.best_case_emission, 2),
+            "max_co2_saved": round(self.current_emission - self.best_case_emission, 2),
+            "switch_options": [dict(o, co2_saved=round(o["co2_saved"], 2)) for o in options],
+        }
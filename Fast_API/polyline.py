@@ -0,0 +1,87 @@
+"""
+Compact route geometry: Google encoded polylines and Douglas-Peucker simplification.
+
+Coordinates are GeoJSON order ([lng, lat]); the encoded form stores lat/lng
+pairs at 1e-5 degree precision (~1 m), typically 5-10x smaller than GeoJSON.
+"""
+import numpy as np
+
+PRECISION = 5
+
+
+def _encode_value(value: int, out: list):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode(coordinates, precision: int = PRECISION) -> str:
+    """[[lng, lat], ...] -> encoded polyline string"""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lng, lat in coordinates:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lng_i - prev_lng, out)
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(out)
+
+
+def decode(encoded: str, precision: int = PRECISION) -> list:
+    """Encoded polyline string -> [[lng, lat], ...]"""
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append([lng / factor, lat / factor])
+    return coordinates
+
+
+def simplify(coordinates, tolerance_deg: float = 0.0005) -> list:
+    """
+    Douglas-Peucker simplification (iterative, vectorized per segment).
+    The default tolerance (~50 m) keeps the shape at list/overview zoom levels.
+    """
+    points = np.asarray(coordinates, dtype=float)
+    if len(points) < 3:
+        return points.tolist()
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        inner = points[start + 1:end] - points[start]
+        norm = np.hypot(*segment)
+        if norm == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / norm
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance_deg:
+            split = start + 1 + index
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep].tolist()
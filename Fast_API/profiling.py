@@ -0,0 +1,342 @@
+"""
+On-demand statistical profiling of single requests, stored as flame graphs.
+
+A request is profiled when it carries X-Profile-Token: <PROFILE_ADMIN_TOKEN>
+(the response then has an X-Profile-Id header) or is picked by
+PROFILE_SAMPLE_RATE. While it runs, a sampler thread reads every
+PROFILE_INTERVAL_MS the stacks of the threads working on it:
+
+- the event loop (routing, validation, serialization, async endpoints), while
+  this request's coroutine is on its stack,
+- the threadpool worker running a sync endpoint (SQL, ORM hydration, Python
+  loops).
+
+Sampling is wall-clock, so time blocked on the database shows up under the
+driver call. The sampler needs the GIL, so during CPU-bound Python it gets
+about one sample per switch interval (5 ms) whatever PROFILE_INTERVAL_MS says. Each profile is tagged with its route, split into sql / orm /
+serialization / python by the innermost recognised frame, and written off the
+request path in collapsed-stack format (flamegraph.pl, speedscope) next to a
+JSON summary. PROFILE_DIR keeps the newest PROFILE_MAX_FILES profiles.
+
+GET /profiles and GET /profiles/{id} (collapsed or speedscope JSON) need the
+same admin token. Profiling is off unless the token or a sample rate is set.
+"""
+import functools
+import hmac
+import inspect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi import HTTPException
+
+import metrics
+import structured_log
+
+log = structured_log.get_logger("profiling")
+
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(__file__).parent / "profiles")))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+# Sampled (not header-requested) profiles running at once, to bound the overhead
+PROFILE_MAX_SAMPLED = int(os.getenv("PROFILE_MAX_SAMPLED", "2"))
+
+TOKEN_HEADER = "x-profile-token"
+UNPROFILED_PREFIXES = ("/profiles", "/metrics", "/health")
+
+# Where a sample's time goes, by the innermost frame from one of these paths
+CATEGORIES = (
+    ("orm", ("sqlalchemy/orm/",)),
+    ("sql", ("sqlalchemy/", "psycopg", "sqlite3/")),
+    ("serialization", ("pydantic", "fastapi/encoders", "fastapi/_compat", "json/", "orjson", "starlette/responses")),
+)
+
+_PROFILE_ID = re.compile(r"^\d{8}-\d{9}-[0-9a-f]{8}$")
+_SEARCH_PATHS = sorted({p for p in sys.path if p}, key=len, reverse=True)
+
+current_profile = ContextVar("current_profile", default=None)
+_sampled_running = 0  # only touched on the event loop
+
+_labels = {}
+_categories = {}
+
+
+def _label(code) -> str:
+    """'qualname (path:line)', with paths relative to sys.path so library frames read as fastapi/routing.py"""
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in _SEARCH_PATHS:
+            if filename.startswith(prefix + os.sep):
+                filename = filename[len(prefix) + 1:]
+                break
+        label = _labels[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def _category(code):
+    if code not in _categories:
+        filename = code.co_filename.replace(os.sep, "/")
+        _categories[code] = next(
+            (name for name, parts in CATEGORIES if any(part in filename for part in parts)), None
+        )
+    return _categories[code]
+
+
+class Profile:
+    """Samples of one request; markers are the frames (per thread) below which a stack belongs to it"""
+
+    def __init__(self, method: str, route: str, path: str, trigger: str):
+        now = time.time()
+        # Sortable by start time (store eviction relies on it)
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))}{int(now % 1 * 1000):03d}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.route = route
+        self.path = path
+        self.trigger = trigger
+        self.status = None
+        self.markers = {}  # frame -> root label ("event loop" / "threadpool")
+        self.stacks = Counter()  # (root, (code, ...) outermost first) -> samples
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profile-{self.id}", daemon=True)
+
+    def start(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self, status: int):
+        """Called on the event loop: signals the sampler, which exits within one interval"""
+        self.duration = time.perf_counter() - self._started
+        self.status = status
+        self.markers.clear()  # nothing sampled after this point belongs to the request
+        self._stop.set()
+
+    def join(self, timeout: float = None):
+        """Wait for the sampler to exit, off the event loop (the store thread does it before reading stacks)"""
+        self._thread.join(timeout)
+
+    def _sample(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        own = threading.get_ident()
+        while not self._stop.wait(interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    root = self.markers.get(frame)
+                    if root is not None:
+                        self.stacks[(root, tuple(reversed(codes)))] += 1
+                        break
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+
+    def collapsed(self) -> str:
+        """One 'frame;frame;frame count' line per distinct stack, rooted at 'METHOD /route'"""
+        head = f"{self.method} {self.route}"
+        lines = [
+            ";".join([head, root] + [_label(code) for code in codes]) + f" {count}"
+            for (root, codes), count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        samples = sum(self.stacks.values())
+        spent = Counter()
+        for (root, codes), count in self.stacks.items():
+            spent[next((c for c in map(_category, reversed(codes)) if c), "python")] += count
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "breakdown": {name: round(count / samples, 3) for name, count in spent.most_common()} if samples else {},
+        }
+
+
+class ProfileStore:
+    """Newest max_files profiles as <id>.collapsed + <id>.json; written on a background thread"""
+
+    def __init__(self, directory: Path, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-store")
+
+    def save(self, profile: Profile):
+        self._executor.submit(self._write, profile)
+
+    def _write(self, profile: Profile):
+        try:
+            profile.join()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            summary = profile.summary()
+            (self.directory / f"{profile.id}.collapsed").write_text(profile.collapsed())
+            # Summary last: listing only sees complete profiles
+            (self.directory / f"{profile.id}.json").write_text(json.dumps(summary))
+            for stale in sorted(self.directory.glob("*.json"))[:-self.max_files]:
+                stale.unlink(missing_ok=True)
+                stale.with_suffix(".collapsed").unlink(missing_ok=True)
+            log.info("profile stored", profile_id=profile.id, route=profile.route,
+                     duration_ms=summary["duration_ms"], samples=summary["samples"])
+        except Exception:
+            log.exception("profile not stored", profile_id=profile.id)
+
+    def list(self, route: str = None, limit: int = 50) -> list:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                summary = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # evicted while listing
+            if route is None or summary["route"] == route:
+                profiles.append(summary)
+                if len(profiles) >= limit:
+                    break
+        return profiles
+
+    def load(self, profile_id: str):
+        """(summary, collapsed text), or None"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            summary = json.loads((self.directory / f"{profile_id}.json").read_text())
+            return summary, (self.directory / f"{profile_id}.collapsed").read_text()
+        except (OSError, ValueError):
+            return None
+
+
+store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+def speedscope(summary: dict, collapsed: str) -> dict:
+    """Collapsed stacks as a speedscope 'sampled' profile, weighted in milliseconds"""
+    frames, index, samples, weights = [], {}, [], []
+    ms_per_sample = summary["duration_ms"] / summary["samples"] if summary["samples"] else 0
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        sample = []
+        for name in stack.split(";"):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            sample.append(index[name])
+        samples.append(sample)
+        weights.append(int(count) * ms_per_sample)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{summary['method']} {summary['path']} ({summary['id']})",
+        "exporter": "carbon-api profiling",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{summary['method']} {summary['route']}",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def require_admin(token: str):
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling admin token not configured")
+    if not token or not hmac.compare_digest(token, PROFILE_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+def _trigger(request):
+    global _sampled_running
+    if PROFILE_ADMIN_TOKEN:
+        token = request.headers.get(TOKEN_HEADER)
+        if token and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN):
+            return "header"
+    if PROFILE_SAMPLE_RATE > 0 and _sampled_running < PROFILE_MAX_SAMPLED and random.random() < PROFILE_SAMPLE_RATE:
+        _sampled_running += 1
+        return "sampled"
+    return None
+
+
+def _mark_threadpool(endpoint):
+    """Sync endpoints run on a threadpool worker; mark its frame while a profiled request uses it"""
+
+    @functools.wraps(endpoint)
+    def marked(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        frame = sys._getframe()
+        profile.markers[frame] = "threadpool"
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.markers.pop(frame, None)
+
+    return marked
+
+
+class ProfiledRoute(metrics.InstrumentedRoute):
+    """InstrumentedRoute that can profile a request end to end (header or sampled)"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _mark_threadpool(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if self.path.startswith(UNPROFILED_PREFIXES) or not (PROFILE_ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0):
+            return handler
+        route = self.path
+
+        async def profiled(request):
+            global _sampled_running
+            trigger = _trigger(request)
+            if trigger is None:
+                return await handler(request)
+            profile = Profile(request.method, route, request.url.path, trigger)
+            profile.markers[sys._getframe()] = "event loop"
+            token = current_profile.set(profile)
+            profile.start()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                if trigger == "header":
+                    response.headers["X-Profile-Id"] = profile.id
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                profile.stop(status)
+                current_profile.reset(token)
+                if trigger == "sampled":
+                    _sampled_running -= 1
+                store.save(profile)
+
+        return profiled
@@ -0,0 +1,135 @@
+"""
+Per-request SQL auditing: query budgets, slow-query log and N+1 detection.
+
+Runs on the request accumulator that metrics.InstrumentedRoute opens and the
+SQLAlchemy cursor events fill in (so it needs METRICS_ENABLED). A sampled
+share of requests records every statement with its timing; at the end of the
+request it checks
+
+- the route's statement budget (QUERY_BUDGETS),
+- repeated statement shapes: the same SQL with different parameters issued
+  N_PLUS_ONE_THRESHOLD times or more in one request, the N+1 pattern.
+
+Statements slower than SLOW_QUERY_MS are logged with their plan (EXPLAIN on
+Postgres, EXPLAIN QUERY PLAN on SQLite) whether or not the request is
+sampled; plans are fetched on a background thread, off the request path.
+
+Production samples a few requests (QUERY_AUDIT_SAMPLE_RATE, default 1%); the
+benchmark suite and tests set it to 1 and QUERY_BUDGET_ENFORCE=true, which
+turns a budget overrun into a failed request.
+"""
+import os
+import random
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import structured_log
+
+log = structured_log.get_logger("query_audit")
+
+QUERY_AUDIT_SAMPLE_RATE = float(os.getenv("QUERY_AUDIT_SAMPLE_RATE", "0.01"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET_ENFORCE = os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() in ("1", "true", "yes")
+
+# Most SQL statements one request may issue, by "METHOD /route/template"
+QUERY_BUDGETS = {
+    "POST /trips": 3,
+    "POST /gps/update": 1,
+    "GET /gps/live/{vehicle_id}": 2,
+    "GET /stats/summary": 2,
+    "GET /footprint/daily": 1,
+    "GET /footprint/daily/trend": 1,
+    "GET /footprint/monthly": 1,
+    "GET /footprint/daily/all": 1,
+    "GET /footprint/monthly/all": 1,
+    "GET /insights/summary": 3,
+    "GET /trips/recent": 1,
+    "GET /charts/routes": 1,
+    "GET /charts/vehicles": 1,
+    "GET /trucks": 1,
+    "GET /trucks/{truck_id}": 1,
+    "POST /supplier/report": 2,
+    "GET /supplier/reports/status": 1,
+    "GET /carbon-credits/{company_id}": 3,
+}
+
+# Slow statements whose plan was already logged; each shape is explained once
+_explained = set()
+_explained_lock = threading.Lock()
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+# Budget overruns seen by this process, for the benchmark suite and tests
+violations = []
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))+\s*\)")
+_POSTCOMPILE = re.compile(r"__\[POSTCOMPILE_\w+\]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def shape(statement: str) -> str:
+    """Statement with IN-lists collapsed and whitespace normalized, so batches of the same query compare equal"""
+    statement = _POSTCOMPILE.sub("(?)", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def sampled() -> bool:
+    return QUERY_AUDIT_SAMPLE_RATE >= 1 or random.random() < QUERY_AUDIT_SAMPLE_RATE
+
+
+def slow(engine, statement: str, parameters, elapsed: float, route: str, explain: bool = True):
+    """Log a slow statement; its plan is fetched once per shape on the explain thread"""
+    log.warning("slow query", route=route, ms=round(elapsed * 1000, 1), statement=shape(statement)[:500], every=1)
+    if not explain:
+        return
+    key = shape(statement)
+    with _explained_lock:
+        if key in _explained:
+            return
+        _explained.add(key)
+    _explain_executor.submit(_log_plan, engine, statement, parameters, route)
+
+
+def _log_plan(engine, statement: str, parameters, route: str):
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + statement, parameters)
+        plan = [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+        cursor.close()
+        log.info("slow query plan", route=route, statement=shape(statement)[:500], plan=plan)
+    except Exception as e:
+        log.warning("could not explain slow query", route=route, error=str(e))
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def finish(method: str, route: str, statements: list):
+    """Check a sampled request's statements [(statement, seconds)]; raises when a budget is enforced"""
+    endpoint = f"{method} {route}"
+    repeated = Counter(shape(statement) for statement, _ in statements)
+    for statement, count in repeated.items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            log.warning("possible N+1", endpoint=endpoint, count=count, statement=statement[:300], every=10)
+
+    budget = QUERY_BUDGETS.get(endpoint)
+    if budget is not None and len(statements) > budget:
+        db_ms = sum(seconds for _, seconds in statements) * 1000
+        message = f"{endpoint} issued {len(statements)} statements (budget {budget}, {db_ms:.1f} ms in DB)"
+        violations.append({"endpoint": endpoint, "statements": len(statements), "budget": budget})
+        log.warning("query budget exceeded", endpoint=endpoint, statements=len(statements), budget=budget,
+                    db_ms=round(db_ms, 1), queries=[f"{seconds * 1000:.2f} ms {shape(statement)[:200]}"
+                                                     for statement, seconds in statements])
+        if QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(message)
@@ -0,0 +1,124 @@
+"""
+Background warm-up and readiness reporting.
+
+The app starts serving immediately; everything that needs the database or
+loads caches runs here after startup instead of at import time. Each step is
+tracked as a component so /health/ready can tell a load balancer when the
+instance is actually warm. An unreachable database does not stop the process:
+the check is retried with backoff and the instance stays "not ready" meanwhile.
+"""
+import asyncio
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from database import DB_PROFILE, engine
+import structured_log
+
+log = structured_log.get_logger("readiness")
+
+# Startup migrations and the in-memory trip cache default to on only for the local SQLite
+# profile (dev / benchmarks). Elsewhere every worker would run them: apply migrate.py once
+# per deploy instead, and opt in to the cache where a worker can hold the trips table.
+_LOCAL_DEFAULT = "true" if DB_PROFILE == "sqlite" else "false"
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", _LOCAL_DEFAULT).lower() in ("1", "true", "yes")
+WARM_SCENARIO_CACHE = os.getenv("WARM_SCENARIO_CACHE", _LOCAL_DEFAULT).lower() in ("1", "true", "yes")
+
+DB_RETRY_INITIAL_SECONDS = 1.0
+DB_RETRY_MAX_SECONDS = 30.0
+
+
+class Readiness:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.components = {}
+
+    def pending(self, *names):
+        for name in names:
+            self.components[name] = {"ready": False, "detail": "pending", "seconds": None}
+
+    def mark(self, name: str, ready: bool, detail: str = None):
+        self.components[name] = {
+            "ready": ready,
+            "detail": detail,
+            "seconds": round(time.monotonic() - self.started_at, 3),
+        }
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.components) and all(c["ready"] for c in self.components.values())
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "components": self.components,
+        }
+
+
+def check_database():
+    """Connect once and, if enabled, apply pending migrations"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    if AUTO_CREATE_SCHEMA:
+        import migrate
+        migrate.migrate()
+
+
+async def _wait_for_database(state: Readiness):
+    delay = DB_RETRY_INITIAL_SECONDS
+    while True:
+        try:
+            await run_in_threadpool(check_database)
+            state.mark("database", True)
+            return
+        except Exception as e:
+            state.mark("database", False, f"{type(e).__name__}; retrying in {delay:.0f}s")
+            log.warning("database not reachable yet", error=type(e).__name__, retry_in_seconds=delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_MAX_SECONDS)
+
+
+async def _step(state: Readiness, name: str, func, *args):
+    try:
+        result = func(*args)
+        if asyncio.iscoroutine(result):
+            await result
+        state.mark(name, True)
+    except Exception as e:
+        state.mark(name, False, f"{type(e).__name__}: {e}")
+        log.exception("startup step failed", step=name)
+
+
+async def warm_up(state: Readiness):
+    """Run every startup step; the lifespan schedules this as a background task"""
+    from database import SessionLocal
+    from routing import load_road_graph
+    from scenarios import trip_columns
+    from verification_worker import worker as verification_worker
+
+    def refresh_trip_columns():
+        db = SessionLocal()
+        try:
+            trip_columns.refresh(db)
+        finally:
+            db.close()
+
+    steps = ["database", "road_graph", "verification_worker"]
+    if WARM_SCENARIO_CACHE:
+        steps.append("scenario_cache")
+    state.pending(*steps)
+
+    # The road graph is a local file, no need to wait for the database
+    road_graph = asyncio.create_task(_step(state, "road_graph", run_in_threadpool, load_road_graph))
+
+    await _wait_for_database(state)
+    await _step(state, "verification_worker", verification_worker.start)
+    if WARM_SCENARIO_CACHE:
+        await _step(state, "scenario_cache", run_in_threadpool, refresh_trip_columns)
+    await road_graph
+
+
+state = Readiness()
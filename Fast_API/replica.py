@@ -0,0 +1,110 @@
+"""
+Read-replica lag monitor and read-your-writes cookie (see database.py).
+
+Lag is measured with a heartbeat row: every REPLICA_CHECK_SECONDS a worker
+reads replica_heartbeat on the replica, then writes the current time to it on
+the primary. When the replica still shows an older beat than the one this
+worker wrote last time, the gap is the lag; otherwise it is under one check
+interval and counts as 0. This works the same for Postgres streaming or
+logical replication and for a SQLite file copied over by hand.
+
+Responses to successful writes (anything but GET / HEAD / OPTIONS) carry a
+last_write cookie. A client's reads go to the primary until the replica shows
+a heartbeat newer than that write, which is never longer than
+REPLICA_MAX_LAG_SECONDS: past that the replica is out of rotation anyway.
+"""
+import asyncio
+import math
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from starlette.datastructures import MutableHeaders
+
+import database
+from database import engine, read_engine
+from models import ReplicaHeartbeat
+import structured_log
+
+log = structured_log.get_logger("replica")
+
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+else:
+    from sqlalchemy.dialects.sqlite import insert
+
+_last_beat = None  # value this worker last wrote to the primary
+
+
+def enabled() -> bool:
+    return read_engine is not engine
+
+
+def check():
+    """Measure the replica's lag into database.replica_state, then beat on the primary"""
+    global _last_beat
+    state = database.replica_state
+    try:
+        with read_engine.connect() as conn:
+            seen = conn.execute(select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == 1)).scalar()
+    except Exception as e:
+        state.lag = None
+        log.warning("replica unreachable, reading from the primary", error=str(e), every=60)
+    else:
+        state.visible_at = seen
+        if seen is None:
+            state.lag = None  # no heartbeat replicated yet
+        elif _last_beat is None:
+            state.lag = max(0.0, time.time() - seen)
+        else:
+            state.lag = max(0.0, _last_beat - seen)
+        if state.lag is not None and state.lag > database.REPLICA_MAX_LAG_SECONDS:
+            log.warning("replica lagging, reading from the primary", lag_seconds=round(state.lag, 2), every=60)
+
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(ReplicaHeartbeat).values(id=1, beat_at=now)
+            .on_conflict_do_update(index_elements=[ReplicaHeartbeat.id], set_={"beat_at": now})
+        )
+    _last_beat = now
+
+
+async def run_monitor():
+    """Lifespan task: keep database.replica_state current while a replica is configured"""
+    if not enabled():
+        return
+    while True:
+        try:
+            await run_in_threadpool(check)
+        except Exception as e:
+            log.warning("replica heartbeat failed", error=str(e), every=60)
+        await asyncio.sleep(REPLICA_CHECK_SECONDS)
+
+
+class ReadYourWritesMiddleware:
+    """Sets the last_write cookie on responses to successful writes"""
+
+    def __init__(self, app):
+        self.app = app
+        self.cookie = (
+            f"{database.LAST_WRITE_COOKIE}={{:.3f}}; Max-Age={math.ceil(database.REPLICA_MAX_LAG_SECONDS) + 1}; "
+            "Path=/; SameSite=Lax; HttpOnly"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def stamped(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie.format(time.time()))
+            await send(message)
+
+        await self.app(scope, receive, stamped)
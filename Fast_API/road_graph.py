@@ -0,0 +1,337 @@
+"""
+Offline road-network routing for supplier verification.
+
+A road graph exported from OpenStreetMap (osmnx GraphML, e.g. `ox.save_graphml`)
+is preprocessed once into compact CSR adjacency arrays:
+
+    node_lat, node_lon   float64[N]   node coordinates
+    indptr               int64[N+1]   outgoing edges of node i are indptr[i]:indptr[i+1]
+    indices              int32[E]     edge target node
+    edge_length_m        float32[E]   edge length in metres
+    edge_time_s          float32[E]   edge travel time in seconds
+
+The arrays are cached as .npy files next to the source file and memory-mapped on
+load, so startup cost does not depend on the graph size. Queries snap both ends
+to the nearest node and run A* on travel time with a straight-line heuristic.
+"""
+import heapq
+import json
+import math
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+CACHE_VERSION = 1
+
+ARRAY_NAMES = ("node_lat", "node_lon", "indptr", "indices", "edge_length_m", "edge_time_s")
+
+# Default speeds (km/h) when an OSM way has no usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 100,
+    "trunk": 80,
+    "primary": 65,
+    "secondary": 55,
+    "tertiary": 45,
+    "unclassified": 40,
+    "residential": 30,
+    "living_street": 10,
+    "service": 20,
+}
+DEFAULT_SPEED_KMH = 40
+LINK_SPEED_FACTOR = 0.75
+
+# Endpoints further than this from the road network are not snapped
+MAX_SNAP_DISTANCE_KM = float(os.getenv("ROAD_GRAPH_MAX_SNAP_KM", "5"))
+
+EARTH_RADIUS_KM = 6371
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    a = math.sin((lat2_rad - lat1_rad) / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_km_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def _parse_speed_kmh(maxspeed: str, highway: str) -> float:
+    """Speed from an OSM maxspeed tag, falling back to the highway class default"""
+    if maxspeed:
+        # osmnx stores multi-valued tags as "['50', '60']"
+        token = maxspeed.strip("[]").split(",")[0].strip(" '\"")
+        number = "".join(ch for ch in token if ch.isdigit() or ch == ".")
+        if number:
+            speed = float(number)
+            if "mph" in token:
+                speed *= 1.609
+            if speed > 0:
+                return speed
+
+    highway = (highway or "").strip("[]").split(",")[0].strip(" '\"")
+    if highway.endswith("_link"):
+        return HIGHWAY_SPEEDS_KMH.get(highway[:-5], DEFAULT_SPEED_KMH) * LINK_SPEED_FACTOR
+    return HIGHWAY_SPEEDS_KMH.get(highway, DEFAULT_SPEED_KMH)
+
+
+def read_graphml(path) -> tuple:
+    """
+    Stream an osmnx GraphML file.
+    Returns (node_lat, node_lon, sources, targets, length_m, speed_kmh) as numpy arrays.
+    """
+    ns = "{http://graphml.graphdrawing.org/xmlns}"
+    keys = {}
+    node_index = {}
+    node_lat, node_lon = [], []
+    sources, targets, lengths, speeds = [], [], [], []
+    directed = True
+
+    for event, elem in ET.iterparse(str(path), events=("start", "end")):
+        tag = elem.tag.replace(ns, "")
+        if event == "start":
+            if tag == "graph":
+                directed = elem.get("edgedefault", "directed") == "directed"
+            continue
+
+        if tag == "key":
+            keys[elem.get("id")] = elem.get("attr.name")
+        elif tag == "node":
+            data = {keys.get(d.get("key")): d.text for d in elem.findall(f"{ns}data")}
+            node_index[elem.get("id")] = len(node_lat)
+            node_lat.append(float(data["y"]))
+            node_lon.append(float(data["x"]))
+            elem.clear()
+        elif tag == "edge":
+            data = {keys.get(d.get("key")): d.text for d in elem.findall(f"{ns}data")}
+            u = node_index[elem.get("source")]
+            v = node_index[elem.get("target")]
+            if data.get("length"):
+                length_m = float(data["length"])
+            else:
+                length_m = _haversine_km(node_lat[u], node_lon[u], node_lat[v], node_lon[v]) * 1000
+            speed = _parse_speed_kmh(data.get("maxspeed") or "", data.get("highway") or "")
+            sources.append(u)
+            targets.append(v)
+            lengths.append(length_m)
+            speeds.append(speed)
+            if not directed:
+                sources.append(v)
+                targets.append(u)
+                lengths.append(length_m)
+                speeds.append(speed)
+            elem.clear()
+
+    return (
+        np.asarray(node_lat, dtype=np.float64),
+        np.asarray(node_lon, dtype=np.float64),
+        np.asarray(sources, dtype=np.int64),
+        np.asarray(targets, dtype=np.int64),
+        np.asarray(lengths, dtype=np.float64),
+        np.asarray(speeds, dtype=np.float64),
+    )
+
+
+def build_csr(node_lat, node_lon, sources, targets, length_m, speed_kmh) -> dict:
+    """Turn an edge list into CSR adjacency arrays"""
+    num_nodes = len(node_lat)
+    order = np.argsort(sources, kind="stable")
+    counts = np.bincount(sources, minlength=num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    length_m = np.asarray(length_m, dtype=np.float64)[order]
+    speed_kmh = np.maximum(np.asarray(speed_kmh, dtype=np.float64)[order], 1.0)
+
+    return {
+        "node_lat": np.asarray(node_lat, dtype=np.float64),
+        "node_lon": np.asarray(node_lon, dtype=np.float64),
+        "indptr": indptr,
+        "indices": np.asarray(targets, dtype=np.int32)[order],
+        "edge_length_m": length_m.astype(np.float32),
+        "edge_time_s": (length_m / (speed_kmh / 3.6)).astype(np.float32),
+    }
+
+
+class RoadGraph:
+    """CSR road graph answering shortest-path distance / duration queries"""
+
+    def __init__(self, arrays: dict):
+        self.node_lat = arrays["node_lat"]
+        self.node_lon = arrays["node_lon"]
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.edge_length_m = arrays["edge_length_m"]
+        self.edge_time_s = arrays["edge_time_s"]
+
+        # The fastest straight-line progress any edge allows bounds the A* heuristic. Using
+        # the distance between the edge's ends as well as its recorded length keeps the
+        # heuristic admissible where OSM lengths come out shorter than the straight line.
+        lengths = np.asarray(self.edge_length_m, dtype=np.float64)
+        times = np.maximum(np.asarray(self.edge_time_s, dtype=np.float64), 1e-6)
+        sources = np.repeat(np.arange(len(self.node_lat)), np.diff(self.indptr))
+        targets = np.asarray(self.indices)
+        straight_m = _haversine_km_array(
+            self.node_lat[sources], self.node_lon[sources], self.node_lat[targets], self.node_lon[targets]
+        ) * 1000
+        self.max_speed_mps = float((np.maximum(lengths, straight_m) / times).max()) if len(lengths) else 1.0
+
+        self._cos_lat = np.cos(np.radians(self.node_lat))
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_lat)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    # -------------------------
+    # Preprocessing cache
+    # -------------------------
+    @staticmethod
+    def cache_dir_for(source_path) -> Path:
+        return Path(str(source_path) + ".cache")
+
+    @classmethod
+    def save(cls, arrays: dict, cache_dir, source_stat=None):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(cache_dir / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+        meta = {"version": CACHE_VERSION, "num_nodes": int(len(arrays["node_lat"])), "num_edges": int(len(arrays["indices"]))}
+        if source_stat is not None:
+            meta["source_size"] = source_stat.st_size
+            meta["source_mtime"] = source_stat.st_mtime
+        (cache_dir / "meta.json").write_text(json.dumps(meta))
+
+    @classmethod
+    def load_cache(cls, cache_dir) -> "RoadGraph":
+        cache_dir = Path(cache_dir)
+        arrays = {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in ARRAY_NAMES}
+        return cls(arrays)
+
+    @classmethod
+    def _cache_is_fresh(cls, cache_dir: Path, source_stat) -> bool:
+        meta_path = cache_dir / "meta.json"
+        if not meta_path.exists():
+            return False
+        meta = json.loads(meta_path.read_text())
+        return (
+            meta.get("version") == CACHE_VERSION
+            and meta.get("source_size") == source_stat.st_size
+            and meta.get("source_mtime") == source_stat.st_mtime
+        )
+
+    @classmethod
+    def from_file(cls, path) -> "RoadGraph":
+        """
+        Load a graph, preprocessing `path` only when its cache is missing or stale.
+        `path` may also point directly at a cache directory.
+        """
+        path = Path(path)
+        if path.is_dir():
+            return cls.load_cache(path)
+
+        cache_dir = cls.cache_dir_for(path)
+        source_stat = path.stat()
+        if not cls._cache_is_fresh(cache_dir, source_stat):
+            arrays = build_csr(*read_graphml(path))
+            cls.save(arrays, cache_dir, source_stat)
+        return cls.load_cache(cache_dir)
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def nearest_node(self, lat: float, lon: float) -> tuple:
+        """Index of the closest node and its distance in km (equirectangular)"""
+        dlat = np.radians(self.node_lat - lat)
+        dlon = np.radians(self.node_lon - lon) * self._cos_lat
+        d2 = dlat * dlat + dlon * dlon
+        index = int(np.argmin(d2))
+        return index, math.sqrt(float(d2[index])) * EARTH_RADIUS_KM
+
+    def shortest_path(self, source: int, target: int):
+        """
+        A* on travel time. Returns (path_nodes, length_m, time_s) or None if unreachable.
+        """
+        if source == target:
+            return [source], 0.0, 0.0
+
+        indptr = self.indptr
+        indices = self.indices
+        edge_time = self.edge_time_s
+        edge_length = self.edge_length_m
+        node_lat = self.node_lat
+        node_lon = self.node_lon
+        target_lat = float(node_lat[target])
+        target_lon = float(node_lon[target])
+        max_speed_kmps = self.max_speed_mps / 1000
+
+        def heuristic(node: int) -> float:
+            return _haversine_km(float(node_lat[node]), float(node_lon[node]), target_lat, target_lon) / max_speed_kmps
+
+        best_time = {source: 0.0}
+        best_length = {source: 0.0}
+        parent = {source: -1}
+        closed = set()
+        heap = [(heuristic(source), 0.0, source)]
+
+        while heap:
+            _, time_s, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            if node == target:
+                path = [node]
+                while parent[path[-1]] != -1:
+                    path.append(parent[path[-1]])
+                path.reverse()
+                return path, best_length[node], time_s
+            closed.add(node)
+
+            start, end = int(indptr[node]), int(indptr[node + 1])
+            if start == end:
+                continue
+            neighbours = indices[start:end].tolist()
+            times = edge_time[start:end].tolist()
+            lengths = edge_length[start:end].tolist()
+            length_so_far = best_length[node]
+
+            for neighbour, edge_s, edge_m in zip(neighbours, times, lengths):
+                if neighbour in closed:
+                    continue
+                candidate = time_s + edge_s
+                if candidate < best_time.get(neighbour, math.inf):
+                    best_time[neighbour] = candidate
+                    best_length[neighbour] = length_so_far + edge_m
+                    parent[neighbour] = node
+                    heapq.heappush(heap, (candidate + heuristic(neighbour), candidate, neighbour))
+
+        return None
+
+    def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+        """
+        Same shape as routing.get_mapbox_route_data: (distance_km, duration_hours, geometry),
+        or None when either end cannot be snapped or no path exists.
+        """
+        source, source_snap_km = self.nearest_node(start_lat, start_lng)
+        target, target_snap_km = self.nearest_node(end_lat, end_lng)
+        if source_snap_km > MAX_SNAP_DISTANCE_KM or target_snap_km > MAX_SNAP_DISTANCE_KM:
+            return None
+
+        result = self.shortest_path(source, target)
+        if result is None:
+            return None
+
+        path, length_m, time_s = result
+        geometry = {
+            "type": "LineString",
+            "coordinates": [[float(self.node_lon[n]), float(self.node_lat[n])] for n in path],
+        }
+        return length_m / 1000, time_s / 3600, geometry
@@ -0,0 +1,121 @@
+"""
+Per-lane store of routed distance, duration and geometry.
+
+Verification saves every route the provider returns with a geometry, keyed by
+the rounded lane, so report maps and later verifications of the same lane are
+served from the database instead of calling the routing API again. Haversine
+fallbacks (no geometry) are not stored and get retried with the provider.
+"""
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import polyline
+from models import RouteGeometry
+from verification import LANE_PRECISION
+
+# Keep IN lists to a size every backend handles well
+LOOKUP_CHUNK_SIZE = 500
+
+
+def lane_id(lane: tuple) -> str:
+    return "{:.5f},{:.5f};{:.5f},{:.5f}".format(*lane)
+
+
+def lookup(db: Session, lanes) -> dict:
+    """{lane: (route_id, distance_km, duration_hours)} for lanes already stored"""
+    keys = {lane_id(lane): lane for lane in lanes}
+    found = {}
+    key_list = list(keys)
+    for i in range(0, len(key_list), LOOKUP_CHUNK_SIZE):
+        rows = db.query(
+            RouteGeometry.id, RouteGeometry.lane_key, RouteGeometry.distance_km, RouteGeometry.duration_hours
+        ).filter(RouteGeometry.lane_key.in_(key_list[i:i + LOOKUP_CHUNK_SIZE])).all()
+        for row in rows:
+            found[keys[row.lane_key]] = (row.id, row.distance_km, row.duration_hours)
+    return found
+
+
+def lookup_between(db: Session, points) -> dict:
+    """
+    Every stored lane between two of the given (lat, lng) points, in either direction,
+    as {lane: (route_id, distance_km, duration_hours)}. One query for the whole set
+    instead of an IN list over all n² lane keys.
+    """
+    rounded = {(round(lat, LANE_PRECISION), round(lng, LANE_PRECISION)) for lat, lng in points}
+    lats = sorted({lat for lat, _ in rounded})
+    if not lats:
+        return {}
+    rows = db.query(
+        RouteGeometry.id, RouteGeometry.start_lat, RouteGeometry.start_lng,
+        RouteGeometry.end_lat, RouteGeometry.end_lng,
+        RouteGeometry.distance_km, RouteGeometry.duration_hours,
+    ).filter(RouteGeometry.start_lat.in_(lats), RouteGeometry.end_lat.in_(lats)).all()
+
+    found = {}
+    for row in rows:
+        start = (row.start_lat, row.start_lng)
+        end = (row.end_lat, row.end_lng)
+        if start in rounded and end in rounded:
+            found[start + end] = (row.id, row.distance_km, row.duration_hours)
+    return found
+
+
+def get(db: Session, lane: tuple):
+    return db.query(RouteGeometry).filter(RouteGeometry.lane_key == lane_id(lane)).first()
+
+
+def _new_route(lane: tuple, distance_km: float, duration_hours: float, geometry: dict) -> RouteGeometry:
+    coordinates = geometry["coordinates"]
+    return RouteGeometry(
+        lane_key=lane_id(lane),
+        start_lat=lane[0],
+        start_lng=lane[1],
+        end_lat=lane[2],
+        end_lng=lane[3],
+        distance_km=distance_km,
+        duration_hours=duration_hours,
+        polyline=polyline.encode(coordinates),
+        simplified_polyline=polyline.encode(polyline.simplify(coordinates)),
+        point_count=len(coordinates),
+    )
+
+
+def store(db: Session, routes: dict) -> dict:
+    """
+    Save routes that carry a geometry; returns {lane: route_id}.
+    Lanes stored concurrently by another writer resolve to the existing row.
+    Caller commits.
+    """
+    routable = {
+        lane: result for lane, result in routes.items()
+        if result[2] and result[2].get("coordinates")
+    }
+    if not routable:
+        return {}
+
+    try:
+        with db.begin_nested():
+            new_routes = {lane: _new_route(lane, *result) for lane, result in routable.items()}
+            db.add_all(new_routes.values())
+        return {lane: route.id for lane, route in new_routes.items()}
+    except IntegrityError:
+        pass
+
+    # Lost a race on some lane: insert one by one, reusing existing rows
+    ids = {}
+    for lane, result in routable.items():
+        try:
+            with db.begin_nested():
+                route = _new_route(lane, *result)
+                db.add(route)
+            ids[lane] = route.id
+        except IntegrityError:
+            existing = get(db, lane)
+            if existing is not None:
+                ids[lane] = existing.id
+    return ids
+
+
+def geometry(route: RouteGeometry, simplified: bool = False) -> dict:
+    encoded = route.simplified_polyline if simplified else route.polyline
+    return {"type": "LineString", "coordinates": polyline.decode(encoded)}
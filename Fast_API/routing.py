@@ -0,0 +1,324 @@
+"""
+Routing provider used by supplier verification.
+
+All Mapbox Directions calls go through one shared, pooled async HTTP client
+(keep-alive, HTTP/2 when the `h2` package is installed) with a bounded
+concurrency semaphore. A circuit breaker short-circuits to the fallback after
+repeated failures instead of waiting out every timeout.
+
+When ROAD_GRAPH_PATH points at an OSM road graph, the offline road_graph
+provider answers instead of the straight-line Haversine fallback. Setting
+ROUTING_PROVIDER=local skips Mapbox entirely (air-gapped sites).
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import structured_log
+
+log = structured_log.get_logger("routing")
+
+MAPBOX_BASE_URL = os.getenv("MAPBOX_BASE_URL", "https://api.mapbox.com")
+ROUTING_TIMEOUT_SECONDS = float(os.getenv("ROUTING_TIMEOUT_SECONDS", "10"))
+ROUTING_MAX_CONCURRENCY = int(os.getenv("ROUTING_MAX_CONCURRENCY", "16"))
+ROUTING_MAX_KEEPALIVE = int(os.getenv("ROUTING_MAX_KEEPALIVE", "16"))
+# Per-batch cap so one bulk upload can't take every routing slot
+ROUTING_BATCH_CONCURRENCY = int(os.getenv("ROUTING_BATCH_CONCURRENCY", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("ROUTING_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("ROUTING_BREAKER_RESET_SECONDS", "30"))
+# Upper bound on how long a Retry-After from Mapbox keeps the breaker open
+BREAKER_MAX_RETRY_AFTER_SECONDS = float(os.getenv("ROUTING_BREAKER_MAX_RETRY_AFTER_SECONDS", "600"))
+
+# Client-side statuses that still mean "Mapbox can't serve us right now"
+THROTTLED_STATUSES = (408, 429)
+
+ROUTING_PROVIDER = os.getenv("ROUTING_PROVIDER", "mapbox")  # mapbox | local
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "")
+
+# Assumed average speed for the straight-line fallback
+FALLBACK_SPEED_KMH = 60
+
+
+def calculate_haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two points using Haversine formula (in km) - fallback method"""
+    R = 6371  # Earth's radius in kilometers
+
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return R * c
+
+
+def haversine_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+    """Straight-line fallback with the same (distance_km, duration_hours, geometry) shape"""
+    distance_km = calculate_haversine_distance(start_lat, start_lng, end_lat, end_lng)
+    duration_hours = distance_km / FALLBACK_SPEED_KMH
+    return distance_km, duration_hours, None
+
+
+_road_graph = None
+_road_graph_lock = threading.Lock()
+
+
+def load_road_graph():
+    """Load (memory-map) the offline road graph once; None when not configured"""
+    global _road_graph
+    if _road_graph is None and ROAD_GRAPH_PATH:
+        with _road_graph_lock:
+            if _road_graph is None:
+                from road_graph import RoadGraph
+                _road_graph = RoadGraph.from_file(ROAD_GRAPH_PATH)
+                log.info("road graph loaded", nodes=_road_graph.num_nodes, edges=_road_graph.num_edges)
+    return _road_graph
+
+
+def get_local_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+    """
+    Offline road-network route, same interface as get_mapbox_route_data.
+    Falls back to Haversine when no graph is configured or no path is found.
+    """
+    graph = load_road_graph()
+    if graph is not None:
+        result = graph.route(start_lat, start_lng, end_lat, end_lng)
+        if result is not None:
+            return result
+    return haversine_route_data(start_lat, start_lng, end_lat, end_lng)
+
+
+async def fallback_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+    """Route without Mapbox: road graph when available, else Haversine"""
+    if not ROAD_GRAPH_PATH:
+        return haversine_route_data(start_lat, start_lng, end_lat, end_lng)
+    # A* is CPU-bound, keep it off the event loop
+    return await asyncio.to_thread(get_local_route_data, start_lat, start_lng, end_lat, end_lng)
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call is rejected until `reset_seconds` have passed. The next call is then let
+    through as a trial: success closes the breaker, failure re-opens it, and a
+    trial that ends without either (cancelled) frees the slot for the next call.
+    A failure that comes with a Retry-After opens the breaker straight away for
+    that long.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.open_seconds = reset_seconds
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self, retry_after: float = None):
+        self.failures += 1
+        self.trial_in_flight = False
+        if retry_after is not None:
+            self.opened_at = time.monotonic()
+            self.open_seconds = min(retry_after, BREAKER_MAX_RETRY_AFTER_SECONDS)
+        elif self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.open_seconds = self.reset_seconds
+
+    def release_trial(self):
+        self.trial_in_flight = False
+
+    def reset(self):
+        self.record_success()
+
+
+breaker = CircuitBreaker()
+
+_client = None
+_semaphore = None
+_warned_missing_token = False
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client():
+    """Return the shared pooled httpx.AsyncClient, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        # Imported here so app startup doesn't pay for the HTTP stack
+        import httpx
+
+        _client = httpx.AsyncClient(
+            base_url=MAPBOX_BASE_URL,
+            http2=_http2_available(),
+            timeout=httpx.Timeout(ROUTING_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=ROUTING_MAX_CONCURRENCY,
+                max_keepalive_connections=ROUTING_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(ROUTING_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close_http_client():
+    """Close the shared client (called on application shutdown)"""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+
+def _get_mapbox_token() -> str:
+    global _warned_missing_token
+    mapbox_token = os.getenv("MAPBOX_TOKEN", "")
+    if not mapbox_token or mapbox_token == "your_mapbox_token_here":
+        if not _warned_missing_token:
+            _warned_missing_token = True
+            log.warning("MAPBOX_TOKEN not configured, using offline/Haversine fallback",
+                        hint="set MAPBOX_TOKEN in Fast_API/.env (https://account.mapbox.com/access-tokens/)")
+        return ""
+    return mapbox_token
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delta or HTTP date), None when absent or unreadable"""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+async def get_mapbox_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+    """
+    Call Mapbox Directions API to get real road distance and travel time
+    Returns: (distance_km, duration_hours, route_geometry)
+    """
+    mapbox_token = _get_mapbox_token()
+    if not mapbox_token:
+        return await fallback_route_data(start_lat, start_lng, end_lat, end_lng)
+
+    # Fail fast while Mapbox is known to be unhealthy
+    trial = breaker.state == "half_open"
+    if not breaker.allow_request():
+        return await fallback_route_data(start_lat, start_lng, end_lat, end_lng)
+
+    path = f"/directions/v5/mapbox/driving/{start_lng},{start_lat};{end_lng},{end_lat}"
+    params = {
+        "access_token": mapbox_token,
+        "geometries": "geojson",
+        "overview": "full"
+    }
+
+    try:
+        async with _get_semaphore():
+            response = await get_http_client().get(path, params=params)
+        response.raise_for_status()
+        data = response.json()
+    except Exception as e:
+        import httpx  # already loaded by get_http_client
+
+        status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+        if status in THROTTLED_STATUSES:
+            # Rate limited: back off for as long as Mapbox asks instead of retrying right away
+            breaker.record_failure(retry_after=_retry_after(e.response))
+        elif status is not None and status < 500:
+            # Bad token or coordinates Mapbox can't route: Mapbox itself is up
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        # Avoid echoing the request URL, it carries the access token
+        log.warning("mapbox request failed", error=status or type(e).__name__, circuit=breaker.state, every=10)
+        return await fallback_route_data(start_lat, start_lng, end_lat, end_lng)
+    finally:
+        if trial:
+            # Also when the trial is cancelled (CancelledError skips the except above);
+            # a slot left taken would keep the breaker from ever trying Mapbox again
+            breaker.release_trial()
+
+    breaker.record_success()
+
+    if data.get("routes") and len(data["routes"]) > 0:
+        route = data["routes"][0]
+        distance_km = route.get("distance", 0) / 1000
+        duration_hours = route.get("duration", 0) / 3600
+        return distance_km, duration_hours, route.get("geometry", None)
+
+    # Fallback if no routes found
+    return await fallback_route_data(start_lat, start_lng, end_lat, end_lng)
+
+
+async def get_route_data(start_lat: float, start_lng: float, end_lat: float, end_lng: float):
+    """
+    Route through the configured provider.
+    Returns: (distance_km, duration_hours, route_geometry)
+    """
+    if ROUTING_PROVIDER == "local":
+        return await fallback_route_data(start_lat, start_lng, end_lat, end_lng)
+    return await get_mapbox_route_data(start_lat, start_lng, end_lat, end_lng)
+
+
+async def resolve_lanes(lanes, max_concurrency: int = ROUTING_BATCH_CONCURRENCY) -> dict:
+    """
+    Resolve many (start_lat, start_lng, end_lat, end_lng) lanes concurrently.
+    Duplicate lanes are only requested once; at most `max_concurrency` calls
+    from this batch are in flight at a time.
+    Returns {lane: (distance_km, duration_hours, route_geometry)}.
+    """
+    unique_lanes = list(dict.fromkeys(lanes))
+    batch_semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def resolve(lane):
+        async with batch_semaphore:
+            return await get_route_data(*lane)
+
+    results = await asyncio.gather(*(resolve(lane) for lane in unique_lanes))
+    return dict(zip(unique_lanes, results))
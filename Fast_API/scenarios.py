@@ -0,0 +1,299 @@
+"""
+What-if fleet conversion scenarios over historical trips.
+
+The trip columns a scenario needs (vehicle, route, distance, CO2, company, day)
+are loaded once into numpy arrays, with vehicle types and routes stored as
+integer codes. Later requests only look at trips above the cached max(id),
+plus ids below it that were missing at the last look (a transaction that took
+an id but had not committed yet), and append what they find. Updates, deletes
+and truncates are logged by triggers in trip_modifications (migration 9), one
+new row per statement, and reload everything when the log changes. Neither
+signal writes a shared row, so trip writers never wait on each other, and
+repeated scenarios run in milliseconds.
+
+A rule moves a share of matching trips (by original vehicle type, route and
+distance band) to another vehicle type. Converted CO2 is rescaled by the ratio
+of emission factors, which keeps whatever formula produced the stored co2_kg,
+and credits are recomputed from the per-km credit multipliers. Shares are
+applied as expected values, so results are deterministic. Rules apply in
+order; each one only converts what earlier rules left on the original vehicle.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.orm import Session
+
+from emissions import EMISSION_FACTORS, DEFAULT_EMISSION_FACTOR, CREDIT_MULTIPLIERS, DEFAULT_CREDIT_MULTIPLIER
+from models import Trip, TripModification
+import structured_log
+
+log = structured_log.get_logger("scenarios")
+
+# Same naming as /charts/routes and /insights, so route names can be copied into rules
+ROUTE_SEPARATOR = " - "
+
+# Routes listed in every result so rules can name them
+TOP_ROUTES_LISTED = 10
+
+# Missing ids below max(id) are re-checked for this long before they count as
+# rolled back; at most this many of the most recent ones are tracked
+TRIP_ID_GAP_SECONDS = float(os.getenv("SCENARIO_TRIP_ID_GAP_SECONDS", "600"))
+TRIP_ID_GAP_LIMIT = int(os.getenv("SCENARIO_TRIP_ID_GAP_LIMIT", "1000"))
+# trip_modifications entries are trimmed once the oldest is twice this old, so
+# trimming (which makes every process reload once) happens at most this often
+TRIP_MODIFICATION_RETENTION_SECONDS = float(os.getenv("SCENARIO_TRIP_MODIFICATION_RETENTION_SECONDS", "86400"))
+
+
+def route_name(start_location, end_location) -> str:
+    return f"{start_location or ''}{ROUTE_SEPARATOR}{end_location or ''}"
+
+
+class TripColumns:
+    """Columnar snapshot of the trips table, refreshed incrementally"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.max_id = 0
+        self.row_count = 0
+        self.modifications = None  # (count, max id) of trip_modifications when the snapshot was taken
+        self.gaps = {}  # missing trip id below max_id -> time.monotonic() it was first missed
+        self.vehicle_names = []
+        self.route_names = []
+        self._vehicle_codes = {}
+        self._route_codes = {}
+        self.columns = self._empty()
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "id": np.zeros(0, dtype=np.int64),
+            "company_id": np.zeros(0, dtype=np.int64),
+            "vehicle": np.zeros(0, dtype=np.int32),
+            "route": np.zeros(0, dtype=np.int32),
+            "distance_km": np.zeros(0),
+            "co2_kg": np.zeros(0),
+            "day": np.zeros(0, dtype="datetime64[D]"),
+        }
+
+    def _code(self, codes: dict, names: list, name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def _fetch(self, db: Session, after_id: int = 0, also_ids=()) -> dict:
+        condition = Trip.id > after_id
+        if also_ids:
+            condition = or_(condition, Trip.id.in_(list(also_ids)))
+        rows = db.execute(
+            select(
+                Trip.id, Trip.company_id, Trip.vehicle_type, Trip.start_location,
+                Trip.end_location, Trip.distance_km, Trip.co2_kg, Trip.created_at,
+            ).where(condition).order_by(Trip.id)
+        ).all()
+        return {
+            "id": np.array([r.id for r in rows], dtype=np.int64),
+            "company_id": np.array([r.company_id or 1 for r in rows], dtype=np.int64),
+            "vehicle": np.array([
+                self._code(self._vehicle_codes, self.vehicle_names, (r.vehicle_type or "").lower()) for r in rows
+            ], dtype=np.int32),
+            "route": np.array([
+                self._code(self._route_codes, self.route_names, route_name(r.start_location, r.end_location))
+                for r in rows
+            ], dtype=np.int32),
+            "distance_km": np.array([r.distance_km or 0 for r in rows], dtype=float),
+            "co2_kg": np.array([r.co2_kg or 0 for r in rows], dtype=float),
+            "day": np.array([r.created_at for r in rows], dtype="datetime64[D]"),
+        }
+
+    def _track_gaps(self, ids: np.ndarray, previous_max_id: int):
+        """Remember ids in (previous_max_id, max_id] that weren't there, forget stale ones"""
+        now = time.monotonic()
+        found = set(ids[ids <= previous_max_id].tolist())
+        self.gaps = {
+            gap: missed_at for gap, missed_at in self.gaps.items()
+            if now - missed_at < TRIP_ID_GAP_SECONDS and gap not in found
+        }
+        low = max(previous_max_id, self.max_id - TRIP_ID_GAP_LIMIT) + 1
+        expected = np.arange(low, self.max_id + 1, dtype=np.int64)
+        for gap in np.setdiff1d(expected, ids[ids >= low]).tolist():
+            self.gaps[gap] = now
+        if len(self.gaps) > TRIP_ID_GAP_LIMIT:
+            self.gaps = dict(sorted(self.gaps.items())[-TRIP_ID_GAP_LIMIT:])
+
+    def _trim_modifications(self, db: Session, oldest):
+        """Drop log entries past retention once the oldest is twice as old"""
+        now = datetime.utcnow()
+        if oldest is None or oldest > now - timedelta(seconds=2 * TRIP_MODIFICATION_RETENTION_SECONDS):
+            return
+        cutoff = now - timedelta(seconds=TRIP_MODIFICATION_RETENTION_SECONDS)
+        db.execute(delete(TripModification).where(TripModification.modified_at < cutoff))
+        db.commit()
+
+    def refresh(self, db: Session) -> bool:
+        """
+        Bring the snapshot up to date. Returns True when the cached columns were
+        used as-is. New trips are appended; updates and deletes reload.
+        """
+        # Read before the rows: a modification committed after this is seen next time.
+        # The count also changes when an entry commits below the max id already seen.
+        count, last_id, oldest = db.execute(
+            select(func.count(), func.max(TripModification.id), func.min(TripModification.modified_at))
+        ).one()
+        modifications = (count, last_id)
+        with self._lock:
+            cached = self._update(db, modifications)
+        self._trim_modifications(db, oldest)
+        return cached
+
+    def _update(self, db: Session, modifications: tuple) -> bool:
+        if self.loaded_at is not None and modifications == self.modifications:
+            new = self._fetch(db, self.max_id, self.gaps)
+            previous_max_id = self.max_id
+            if len(new["id"]):
+                self.columns = {name: np.concatenate([self.columns[name], new[name]]) for name in new}
+                self.row_count += len(new["id"])
+                self.max_id = max(self.max_id, int(new["id"].max()))
+            self._track_gaps(new["id"], previous_max_id)
+            return not len(new["id"])
+
+        self._vehicle_codes = {}
+        self._route_codes = {}
+        self.vehicle_names = []
+        self.route_names = []
+        self.columns = self._fetch(db)
+        self.row_count = len(self.columns["id"])
+        self.max_id = int(self.columns["id"].max()) if self.row_count else 0
+        self.gaps = {}
+        self._track_gaps(self.columns["id"], 0)
+        self.modifications = modifications
+        self.loaded_at = time.time()
+        return False
+
+    def snapshot(self) -> tuple:
+        """(columns, vehicle_names, route_names) consistent with each other"""
+        with self._lock:
+            return self.columns, list(self.vehicle_names), list(self.route_names)
+
+
+def _lookup(table: dict, default: float, names: list) -> np.ndarray:
+    return np.array([table.get(name, default) for name in names], dtype=float)
+
+
+def evaluate(columns: dict, vehicle_names: list, route_names: list, rules: list,
+             start_date=None, end_date=None, company_id=None, granularity: str = "day") -> dict:
+    """
+    Apply conversion rules to the trips in scope.
+    Each rule is a dict with from_vehicle, to_vehicle, share and optional
+    routes (route names), top_routes, min_distance_km, max_distance_km.
+    """
+    scope = np.ones(len(columns["id"]), dtype=bool)
+    if start_date is not None:
+        scope &= columns["day"] >= np.datetime64(start_date, "D")
+    if end_date is not None:
+        scope &= columns["day"] <= np.datetime64(end_date, "D")
+    if company_id is not None:
+        scope &= columns["company_id"] == company_id
+
+    # Unfiltered scenarios work on the cached arrays directly, without copies
+    filtered = not scope.all()
+    vehicle, route, distance, co2, day = (
+        columns[name][scope] if filtered else columns[name]
+        for name in ("vehicle", "route", "distance_km", "co2_kg", "day")
+    )
+
+    credit_by_code = _lookup(CREDIT_MULTIPLIERS, DEFAULT_CREDIT_MULTIPLIER, vehicle_names)
+    baseline_credits = distance * credit_by_code[vehicle] if len(vehicle_names) else np.zeros(0)
+    route_co2 = np.bincount(route, weights=co2, minlength=len(route_names))
+    route_index = {name: code for code, name in enumerate(route_names)}
+
+    remaining = np.ones(len(co2))
+    co2_delta = np.zeros(len(co2))
+    credit_delta = np.zeros(len(co2))
+    rule_results = []
+
+    for rule in rules:
+        from_vehicle = rule["from_vehicle"].lower()
+        to_vehicle = rule["to_vehicle"].lower()
+        mask = vehicle == (vehicle_names.index(from_vehicle) if from_vehicle in vehicle_names else -1)
+
+        if rule.get("routes"):
+            selected = np.zeros(len(route_names), dtype=bool)
+            selected[[route_index[name] for name in rule["routes"] if name in route_index]] = True
+            mask &= selected[route]
+        if rule.get("top_routes"):
+            top = np.argsort(route_co2)[::-1][:rule["top_routes"]]
+            selected = np.zeros(len(route_names), dtype=bool)
+            selected[top[route_co2[top] > 0]] = True
+            mask &= selected[route]
+        if rule.get("min_distance_km") is not None:
+            mask &= distance >= rule["min_distance_km"]
+        if rule.get("max_distance_km") is not None:
+            mask &= distance < rule["max_distance_km"]
+
+        converted = np.where(mask, remaining * rule.get("share", 1.0), 0.0)
+        from_factor = EMISSION_FACTORS.get(from_vehicle, DEFAULT_EMISSION_FACTOR)
+        to_factor = EMISSION_FACTORS.get(to_vehicle, DEFAULT_EMISSION_FACTOR)
+        rule_co2 = converted * co2 * (to_factor / from_factor - 1)
+        rule_credits = converted * distance * (
+            CREDIT_MULTIPLIERS.get(to_vehicle, DEFAULT_CREDIT_MULTIPLIER)
+            - CREDIT_MULTIPLIERS.get(from_vehicle, DEFAULT_CREDIT_MULTIPLIER)
+        )
+        remaining -= converted
+        co2_delta += rule_co2
+        credit_delta += rule_credits
+        rule_results.append({
+            "from_vehicle": from_vehicle,
+            "to_vehicle": to_vehicle,
+            "matched_trips": int(mask.sum()),
+            "converted_trips": round(float(converted.sum()), 2),
+            "co2_delta_kg": round(float(rule_co2.sum()), 2),
+            "credits_delta": round(float(rule_credits.sum()), 2),
+        })
+
+    # Periods as offsets from the first one, so the series is a bincount (no sort)
+    unit = "M" if granularity == "month" else "D"
+    period = day.astype(f"datetime64[{unit}]")
+    dated = ~np.isnat(period)
+    period_number = period[dated].astype(np.int64)
+    first = period_number.min() if len(period_number) else 0
+    offset = period_number - first
+    baseline_series = np.bincount(offset, weights=co2[dated])
+    scenario_series = np.bincount(offset, weights=(co2 + co2_delta)[dated])
+    present = np.flatnonzero(np.bincount(offset))
+
+    baseline_co2 = float(co2.sum())
+    scenario_co2 = baseline_co2 + float(co2_delta.sum())
+    baseline_total_credits = float(baseline_credits.sum())
+    return {
+        "trips": int(len(co2)),
+        "baseline_co2_kg": round(baseline_co2, 2),
+        "scenario_co2_kg": round(scenario_co2, 2),
+        "co2_delta_kg": round(scenario_co2 - baseline_co2, 2),
+        "co2_delta_pct": round((scenario_co2 - baseline_co2) / baseline_co2 * 100, 2) if baseline_co2 else 0,
+        "baseline_credits": round(baseline_total_credits, 2),
+        "scenario_credits": round(baseline_total_credits + float(credit_delta.sum()), 2),
+        "credits_delta": round(float(credit_delta.sum()), 2),
+        "rules": rule_results,
+        "top_routes": [
+            {"route": route_names[code], "co2_kg": round(float(route_co2[code]), 2)}
+            for code in np.argsort(route_co2)[::-1][:TOP_ROUTES_LISTED] if route_co2[code] > 0
+        ],
+        "series": [
+            {
+                "period": str(np.datetime64(int(first + i), unit)),
+                "baseline_co2_kg": round(float(baseline_series[i]), 2),
+                "scenario_co2_kg": round(float(scenario_series[i]), 2),
+            }
+            for i in present
+        ],
+    }
+
+
+trip_columns = TripColumns()
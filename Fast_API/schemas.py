@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional
 
 
@@ -22,6 +22,72 @@ class OptimizationRequest(BaseModel):
     current_vehicle: str
 
 
+class OptimizationBatchRow(BaseModel):
+    distance_km: float
+    current_vehicle: str
+    weight: float = 1.0
+
+
+class TripFilter(BaseModel):
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    vehicle_type: Optional[str] = None
+    company_id: Optional[int] = None
+    start_location: Optional[str] = None
+    end_location: Optional[str] = None
+
+
+class OptimizationBatchRequest(BaseModel):
+    rows: Optional[list[OptimizationBatchRow]] = None
+    trip_filter: Optional[TripFilter] = None
+    stream: bool = False
+
+
+class AssignmentShipment(BaseModel):
+    shipment_id: Optional[str] = None
+    distance_km: float
+    weight: float
+    window_start: datetime
+    window_end: datetime
+
+
+class AssignmentRequest(BaseModel):
+    shipments: list[AssignmentShipment]
+    truck_ids: Optional[list[str]] = None  # default: every truck that is not inactive
+
+
+class MultiStopStop(BaseModel):
+    lat: float
+    lng: float
+    name: Optional[str] = None
+
+
+class MultiStopRequest(BaseModel):
+    stops: list[MultiStopStop]  # first stop is the depot
+    vehicle_type: str = "diesel"
+    weight: float = 1.0
+    return_to_start: bool = True
+    time_budget_ms: int = 1000
+
+
+class ScenarioRule(BaseModel):
+    from_vehicle: str
+    to_vehicle: str
+    share: float = 1.0  # fraction of matching trips converted
+    routes: Optional[list[str]] = None  # "Start - End", as returned by /scenarios/evaluate and /charts/routes
+    top_routes: Optional[int] = None  # only the N routes with the highest CO2 in scope
+    min_distance_km: Optional[float] = None
+    max_distance_km: Optional[float] = None
+
+
+class ScenarioRequest(BaseModel):
+    rules: list[ScenarioRule]
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    company_id: Optional[int] = None
+    granularity: str = "day"  # day or month
+
+
 class CompanyCreate(BaseModel):
     name: str
     industry: str
@@ -84,19 +150,40 @@ class SupplierReportResponse(BaseModel):
     end_lng: float
     reported_distance: float
     reported_time: float
-    verified_distance: float
-    verified_time: float
+    verified_distance: Optional[float] = None
+    verified_time: Optional[float] = None
     vehicle_type: str
     weight: float
     reported_co2: float
-    verified_co2: float
+    verified_co2: Optional[float] = None
     verification_status: str
+    verification_error: Optional[str] = None
+    route_id: Optional[int] = None
+    route_polyline: Optional[str] = None  # simplified encoded polyline, only with include_geometry
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class SupplierReportBatchCreate(BaseModel):
+    reports: list[SupplierReportCreate]
+
+
+class SupplierReportBatchRow(SupplierReportResponse):
+    distance_diff_pct: Optional[float] = None
+
+
+class SupplierReportBatchResponse(BaseModel):
+    total_reports: int
+    unique_lanes: int
+    cached_lanes: int = 0
+    status_counts: dict[str, int]
+    routing_seconds: float
+    elapsed_seconds: float
+    reports: list[SupplierReportBatchRow]
+
+
 class UserSignup(BaseModel):
     email: str
     password: str
@@ -151,6 +238,7 @@ class TruckCreate(BaseModel):
     end_lat: float
     end_lng: float
     vehicle_type: str = "diesel"
+    capacity_tons: float = 10.0
 
 
 class TruckResponse(BaseModel):
@@ -162,8 +250,49 @@ class TruckResponse(BaseModel):
     end_lat: float
     end_lng: float
     vehicle_type: str
+    capacity_tons: Optional[float] = None
     status: str
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Lean row models for the list endpoints. They document the response shape;
+# the endpoints send plain column rows through fast_json without validating them.
+class TripSummary(BaseModel):
+    id: int
+    vehicle_type: str
+    start_location: str
+    end_location: str
+    distance_km: float
+    co2_kg: float
+    created_at: datetime
+
+
+class DailyFootprint(BaseModel):
+    date: str
+    co2: float
+
+
+class GPSPoint(BaseModel):
+    id: int
+    lat: float
+    lng: float
+    distance_segment: float
+    co2_segment: float
+    timestamp: datetime
+
+
+class GPSHistoryResponse(BaseModel):
+    vehicle_id: str
+    total_points: int
+    points: list[GPSPoint]
+
+
+class TruckSummary(BaseModel):
+    id: int
+    truck_id: str
+    driver_name: Optional[str] = None
+    status: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    capacity_tons: Optional[float] = None
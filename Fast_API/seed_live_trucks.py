@@ -3,6 +3,9 @@ Seed script to add live tracking trucks to the database
 """
 from database import SessionLocal
 from models import Truck
+import structured_log
+
+log = structured_log.get_logger("seed_live_trucks")
 
 def seed_trucks():
     db = SessionLocal()
@@ -36,13 +39,13 @@ def seed_trucks():
         if not existing:
             truck = Truck(**truck_data)
             db.add(truck)
-            print(f"✅ Added truck: {truck_data['truck_id']} - {truck_data['driver_name']}")
+            log.info("truck added", truck_id=truck_data["truck_id"], driver=truck_data["driver_name"])
         else:
-            print(f"⏭️  Truck {truck_data['truck_id']} already exists")
+            log.info("truck already exists", truck_id=truck_data["truck_id"])
     
     db.commit()
     db.close()
-    print("\n✅ Trucks seeded successfully!")
+    log.info("trucks seeded", trucks=len(trucks_data))
 
 if __name__ == "__main__":
     seed_trucks()
@@ -0,0 +1,402 @@
+"""
+Deterministic synthetic data at scale: companies, trucks, trips (with their
+carbon credits) and GPS tracks, for load tests and query benchmarks.
+
+    python seed_synthetic.py --companies 20 --trucks 500 --trips 1000000 --gps-points 10000000
+    python seed_synthetic.py --trips 50000 --gps-points 0 --start-date 2025-01-01 --end-date 2025-12-31 --seed 3
+
+Data looks like what the app records, with realistic skew:
+- route popularity follows a Zipf curve, so a few lanes carry most trips;
+- fleets are diesel-heavy, each company with its own mix, and company sizes
+  are skewed (a few large fleets, many small ones);
+- trips cluster on weekdays and daytime hours; CO2 and credits use the same
+  formulas as POST /trips;
+- GPS tracks follow a curved path along a route at 30 s intervals.
+
+The same arguments and seed produce the same rows: every chunk draws from its
+own generator keyed by (seed, table, chunk). Rows are appended after existing
+ids and loaded with COPY on Postgres or executemany on SQLite, a chunk per
+transaction.
+"""
+import argparse
+import io
+import math
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from emissions import (
+    CREDIT_MULTIPLIERS, DEFAULT_CREDIT_MULTIPLIER, EMISSION_FACTORS, calculate_co2_emissions_array,
+)
+import structured_log
+
+log = structured_log.get_logger("seed_synthetic")
+
+CITIES = {
+    "Mumbai": (19.0760, 72.8777), "Pune": (18.5204, 73.8567), "Delhi": (28.7041, 77.1025),
+    "Bengaluru": (12.9716, 77.5946), "Chennai": (13.0827, 80.2707), "Hyderabad": (17.3850, 78.4867),
+    "Ahmedabad": (23.0225, 72.5714), "Kolkata": (22.5726, 88.3639), "Surat": (21.1702, 72.8311),
+    "Jaipur": (26.9124, 75.7873), "Nagpur": (21.1458, 79.0882), "Indore": (22.7196, 75.8577),
+    "Bhopal": (23.2599, 77.4126), "Nashik": (19.9975, 73.7898), "Goa": (15.2993, 74.1240),
+    "Udaipur": (24.5854, 73.7125), "Patna": (25.5941, 85.1376), "Lucknow": (26.8467, 80.9462),
+    "Kochi": (9.9312, 76.2673), "Visakhapatnam": (17.6868, 83.2185), "Vadodara": (22.3072, 73.1812),
+    "Coimbatore": (11.0168, 76.9558), "Aurangabad": (19.8762, 75.3433), "Raipur": (21.2514, 81.6296),
+}
+VEHICLE_TYPES = ["diesel", "petrol", "electric"]
+FLEET_MIX = [0.65, 0.25, 0.10]   # average share per vehicle type
+FLEET_MIX_SPREAD = 20             # Dirichlet concentration; lower = companies differ more
+ROUTE_SKEW = 1.1                  # Zipf exponent of route popularity
+COMPANY_SKEW = 1.0                # Zipf exponent of fleet sizes
+ROAD_FACTOR = 1.25                # road distance / great-circle distance
+CAPACITY_TONS = [7.5, 10.0, 16.0, 25.0]
+CAPACITY_MIX = [0.2, 0.45, 0.25, 0.1]
+INDUSTRIES = ["Logistics", "Retail", "Manufacturing", "FMCG", "Pharma", "Automotive"]
+DRIVER_FIRST = ["Aarav", "Vivaan", "Aditya", "Arjun", "Sai", "Ishaan", "Rohan", "Kabir", "Ananya", "Diya", "Meera", "Priya"]
+DRIVER_LAST = ["Sharma", "Patil", "Singh", "Kumar", "Reddy", "Iyer", "Desai", "Khan", "Joshi", "Nair", "Gupta", "Rao"]
+
+GPS_INTERVAL_SECONDS = 30
+GPS_POINTS_PER_TRACK = 240        # two hours of driving
+GPS_SPEED_KMH = 55
+GPS_NOISE_DEG = 0.0003            # ~30 m receiver jitter
+ROUTE_BEND = 0.08                 # max sideways bend of a route, as a share of its length
+
+CHUNK_ROWS = 200_000              # rows per generator chunk and per transaction
+EARTH_RADIUS_KM = 6371
+
+
+def _rng(seed: int, *stream) -> np.random.Generator:
+    return np.random.default_rng([seed, *stream])
+
+
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _epoch_seconds(day: date) -> float:
+    """UTC midnight of day; timestamps are stored naive UTC like datetime.utcnow()"""
+    return (day - date(1970, 1, 1)).days * 86400.0
+
+
+def _timestamps(epoch_seconds: np.ndarray) -> np.ndarray:
+    """'YYYY-MM-DD HH:MM:SS.ffffff', the format SQLAlchemy stores DateTime in on SQLite"""
+    stamps = (epoch_seconds * 1e6).astype("int64").astype("datetime64[us]")
+    return np.char.replace(np.datetime_as_string(stamps, unit="us"), "T", " ")
+
+
+class BulkWriter:
+    """Append rows column-wise: COPY on Postgres, executemany elsewhere; one transaction per call"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.postgres = engine.dialect.name == "postgresql"
+        self.connection = engine.raw_connection()
+
+    def max_id(self, table: str) -> int:
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT MAX(id) FROM {table}")
+        value = cursor.fetchone()[0]
+        cursor.close()
+        return int(value or 0)
+
+    def write(self, table: str, columns: dict):
+        names = list(columns)
+        if self.postgres:
+            self._copy(table, names, columns)
+        else:
+            placeholders = ", ".join("?" for _ in names)
+            rows = list(zip(*(np.asarray(columns[name]).tolist() for name in names)))
+            cursor = self.connection.cursor()
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(names)}) VALUES ({placeholders})", rows)
+            cursor.close()
+        self.connection.commit()
+
+    def _copy(self, table: str, names: list, columns: dict):
+        # Generated values never contain tabs, newlines or backslashes, so no escaping is needed
+        text_columns = [np.asarray(columns[name]).astype(str) for name in names]
+        data = "\n".join("\t".join(row) for row in zip(*text_columns)) + "\n"
+        statement = f"COPY {table} ({', '.join(names)}) FROM STDIN"
+        cursor = self.connection.cursor()
+        if hasattr(cursor, "copy"):  # psycopg 3
+            with cursor.copy(statement) as copy:
+                copy.write(data)
+        else:  # psycopg2
+            cursor.copy_expert(statement, io.StringIO(data))
+        cursor.close()
+
+    def reset_sequences(self, tables: list):
+        """Explicit ids bypass SERIAL sequences; move them past the new rows"""
+        if not self.postgres:
+            return
+        cursor = self.connection.cursor()
+        for table in tables:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            )
+        cursor.close()
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def build_routes(seed: int):
+    """Every ordered city pair, ranked by a seeded shuffle; popularity follows the Zipf curve"""
+    names = list(CITIES)
+    coords = np.array([CITIES[name] for name in names])
+    start, end = np.nonzero(~np.eye(len(names), dtype=bool))
+    rank = _rng(seed, 0).permutation(len(start))
+    start, end = start[rank], end[rank]
+    distance = _haversine_km(coords[start, 0], coords[start, 1], coords[end, 0], coords[end, 1]) * ROAD_FACTOR
+    bend = _rng(seed, 1).uniform(-ROUTE_BEND, ROUTE_BEND, len(start))
+    return {
+        "start_name": np.array(names)[start],
+        "end_name": np.array(names)[end],
+        "start": coords[start],
+        "end": coords[end],
+        "distance_km": distance,
+        "bend": bend,
+        "weight": _zipf_weights(len(start), ROUTE_SKEW),
+    }
+
+
+def build_fleet(seed: int, companies: int, trucks: int, first_company_id: int, first_truck_id: int, routes: dict,
+                created_at: float):
+    """Companies and trucks; created_at (epoch seconds) comes from the date range, not the clock"""
+    rng = _rng(seed, 2)
+    company_weight = _zipf_weights(companies, COMPANY_SKEW)[rng.permutation(companies)]
+    mix = rng.dirichlet(np.array(FLEET_MIX) * FLEET_MIX_SPREAD, companies)
+    cumulative_mix = np.cumsum(mix, axis=1)
+
+    owner = rng.choice(companies, trucks, p=company_weight)
+    if trucks >= companies:
+        owner[:companies] = np.arange(companies)  # every company has at least one truck
+    vehicle = (rng.random(trucks)[:, None] > cumulative_mix[owner]).sum(axis=1).clip(0, len(VEHICLE_TYPES) - 1)
+    home_route = rng.choice(len(routes["weight"]), trucks, p=routes["weight"])
+    company_ids = np.arange(first_company_id, first_company_id + companies)
+
+    company_rows = {
+        "id": company_ids,
+        "name": np.array([f"Synthetic Company {seed}-{i + 1}" for i in range(companies)]),
+        "industry": np.array(INDUSTRIES)[rng.integers(0, len(INDUSTRIES), companies)],
+        "carbon_credits": np.zeros(companies),
+        "carbon_credits_redeemed": np.zeros(companies),
+        "created_at": _timestamps(np.full(companies, created_at)),
+    }
+    truck_rows = {
+        "id": np.arange(first_truck_id, first_truck_id + trucks),
+        "truck_id": np.array([f"SYN{seed}-{first_truck_id + i:06d}" for i in range(trucks)]),
+        "driver_name": np.char.add(
+            np.char.add(np.array(DRIVER_FIRST)[rng.integers(0, len(DRIVER_FIRST), trucks)], " "),
+            np.array(DRIVER_LAST)[rng.integers(0, len(DRIVER_LAST), trucks)],
+        ),
+        "start_lat": routes["start"][home_route, 0],
+        "start_lng": routes["start"][home_route, 1],
+        "end_lat": routes["end"][home_route, 0],
+        "end_lng": routes["end"][home_route, 1],
+        "vehicle_type": np.array(VEHICLE_TYPES)[vehicle],
+        "capacity_tons": np.array(CAPACITY_TONS)[rng.choice(len(CAPACITY_TONS), trucks, p=CAPACITY_MIX)],
+        "status": np.where(rng.random(trucks) < 0.9, "active", "inactive"),
+        "created_at": _timestamps(np.full(trucks, created_at)),
+    }
+    fleet_size = np.bincount(owner, minlength=companies)
+    return company_rows, truck_rows, {
+        "company_ids": company_ids,
+        "company_weight": fleet_size / fleet_size.sum(),
+        "cumulative_mix": cumulative_mix,
+        "truck_vehicle": vehicle,
+        "truck_route": home_route,
+    }
+
+
+def _trip_times(rng, count: int, start: date, end: date) -> np.ndarray:
+    """Epoch seconds: weekdays twice as busy as weekends, daytime-heavy hours"""
+    days = (end - start).days + 1
+    weekday = (np.arange(days) + start.weekday()) % 7
+    day_weight = np.where(weekday < 5, 2.0, 1.0)
+    day = rng.choice(days, count, p=day_weight / day_weight.sum())
+    hour = np.clip(rng.normal(13, 4, count), 0, 23.999)
+    base = _epoch_seconds(start)
+    return base + day * 86400 + hour * 3600
+
+
+def generate_trips(writer: BulkWriter, seed: int, count: int, start: date, end: date,
+                   routes: dict, fleet: dict, credits: bool, progress) -> np.ndarray:
+    """Insert trips (and their credits); returns credits earned per company"""
+    first_trip_id = writer.max_id("trips") + 1
+    first_credit_id = writer.max_id("carbon_credits") + 1
+    earned = np.zeros(len(fleet["company_ids"]))
+    factors = np.array([EMISSION_FACTORS[v] for v in VEHICLE_TYPES])
+    multipliers = np.array([CREDIT_MULTIPLIERS.get(v, DEFAULT_CREDIT_MULTIPLIER) for v in VEHICLE_TYPES])
+
+    for chunk, offset in enumerate(range(0, count, CHUNK_ROWS)):
+        n = min(CHUNK_ROWS, count - offset)
+        rng = _rng(seed, 10, chunk)
+        company = rng.choice(len(fleet["company_ids"]), n, p=fleet["company_weight"])
+        vehicle = (rng.random(n)[:, None] > fleet["cumulative_mix"][company]).sum(axis=1).clip(0, len(VEHICLE_TYPES) - 1)
+        route = rng.choice(len(routes["weight"]), n, p=routes["weight"])
+        distance = np.round(routes["distance_km"][route] * rng.uniform(0.95, 1.1, n), 2)
+        # Same formula as POST /trips: weight argument is the estimated hours at 60 km/h
+        co2 = calculate_co2_emissions_array(distance, distance / 60.0, factors[vehicle])
+        ids = np.arange(first_trip_id + offset, first_trip_id + offset + n)
+        created_at = _timestamps(_trip_times(rng, n, start, end))
+        vehicle_names = np.array(VEHICLE_TYPES)[vehicle]
+
+        writer.write("trips", {
+            "id": ids,
+            "company_id": fleet["company_ids"][company],
+            "vehicle_type": vehicle_names,
+            "start_location": routes["start_name"][route],
+            "end_location": routes["end_name"][route],
+            "distance_km": distance,
+            "co2_kg": co2,
+            "created_at": created_at,
+        })
+        if credits:
+            earned_here = distance * multipliers[vehicle]
+            earned += np.bincount(company, weights=earned_here, minlength=len(earned))
+            writer.write("carbon_credits", {
+                "id": np.arange(first_credit_id + offset, first_credit_id + offset + n),
+                "company_id": fleet["company_ids"][company],
+                "trip_id": ids,
+                "credits": earned_here,
+                "reason": np.char.add(np.char.add(np.char.add(np.char.add(
+                    "Trip: ", routes["start_name"][route]), " to "), routes["end_name"][route]),
+                    np.char.add(np.char.add(" (", vehicle_names), ")")),
+                "redeemed": np.zeros(n, dtype=bool),
+                "created_at": created_at,
+            })
+        progress("trips", offset + n, count)
+    return earned
+
+
+def generate_gps(writer: BulkWriter, seed: int, count: int, start: date, end: date,
+                 routes: dict, fleet: dict, truck_ids: np.ndarray, progress):
+    """Insert GPS points as tracks of GPS_POINTS_PER_TRACK fixes along each truck's routes"""
+    first_id = writer.max_id("gps_tracking") + 1
+    points = GPS_POINTS_PER_TRACK
+    tracks_per_chunk = max(1, CHUNK_ROWS // points)
+    step_km = GPS_SPEED_KMH * GPS_INTERVAL_SECONDS / 3600
+    span_seconds = (end - start).days * 86400 + 86400
+    base = _epoch_seconds(start)
+    factors = np.array([EMISSION_FACTORS[v] for v in VEHICLE_TYPES])
+    tracks = math.ceil(count / points)
+    written = 0
+
+    for chunk, first_track in enumerate(range(0, tracks, tracks_per_chunk)):
+        n_tracks = min(tracks_per_chunk, tracks - first_track)
+        rng = _rng(seed, 20, chunk)
+        truck = rng.integers(0, len(truck_ids), n_tracks)
+        # Mostly the truck's home lane, sometimes any popular route
+        route = np.where(rng.random(n_tracks) < 0.7, fleet["truck_route"][truck],
+                         rng.choice(len(routes["weight"]), n_tracks, p=routes["weight"]))
+        length = routes["distance_km"][route]
+        step = step_km / length
+        t0 = rng.random(n_tracks) * np.clip(1 - step * points, 0, None)
+        t = np.clip(t0[:, None] + step[:, None] * np.arange(points)[None, :], 0, 1)
+
+        start_xy = routes["start"][route]
+        end_xy = routes["end"][route]
+        direction = end_xy - start_xy
+        normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+        bend = (routes["bend"][route][:, None] * np.sin(np.pi * t))[..., None]
+        xy = start_xy[:, None, :] + t[..., None] * direction[:, None, :] + bend * normal[:, None, :]
+        xy += rng.normal(0, GPS_NOISE_DEG, xy.shape)
+
+        segment = np.zeros((n_tracks, points))
+        segment[:, 1:] = _haversine_km(xy[:, :-1, 0], xy[:, :-1, 1], xy[:, 1:, 0], xy[:, 1:, 1])
+        started_at = base + rng.random(n_tracks) * span_seconds
+        stamps = started_at[:, None] + GPS_INTERVAL_SECONDS * np.arange(points)[None, :]
+
+        n = min(n_tracks * points, count - written)
+        segment = segment.ravel()[:n]
+        writer.write("gps_tracking", {
+            "id": np.arange(first_id + written, first_id + written + n),
+            "vehicle_id": np.repeat(truck_ids[truck], points)[:n],
+            "latitude": np.round(xy[..., 0].ravel()[:n], 6),
+            "longitude": np.round(xy[..., 1].ravel()[:n], 6),
+            "distance_segment": np.round(segment, 4),
+            "co2_segment": np.round(segment * np.repeat(factors[fleet["truck_vehicle"][truck]], points)[:n], 4),
+            "timestamp": _timestamps(stamps.ravel()[:n]),
+        })
+        written += n
+        progress("gps_tracking", written, count)
+
+
+def generate(engine, companies: int, trucks: int, trips: int, gps_points: int,
+             start: date, end: date, seed: int = 42, credits: bool = True, progress=None) -> dict:
+    """Generate everything; returns the new company ids and truck ids"""
+    progress = progress or (lambda table, done, total: None)
+    writer = BulkWriter(engine)
+    try:
+        routes = build_routes(seed)
+        company_rows, truck_rows, fleet = build_fleet(
+            seed, companies, trucks, writer.max_id("companies") + 1, writer.max_id("trucks") + 1, routes,
+            _epoch_seconds(end),
+        )
+        writer.write("companies", company_rows)
+        writer.write("trucks", truck_rows)
+
+        earned = generate_trips(writer, seed, trips, start, end, routes, fleet, credits, progress)
+        generate_gps(writer, seed, gps_points, start, end, routes, fleet, truck_rows["truck_id"], progress)
+        writer.reset_sequences(["companies", "trucks", "trips", "carbon_credits", "gps_tracking"])
+    finally:
+        writer.close()
+
+    with engine.begin() as conn:
+        for company_id, amount in zip(fleet["company_ids"].tolist(), earned.tolist()):
+            conn.execute(text("UPDATE companies SET carbon_credits = :c WHERE id = :id"), {"c": amount, "id": company_id})
+    return {"company_ids": fleet["company_ids"].tolist(), "truck_ids": truck_rows["truck_id"].tolist()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--trucks", type=int, default=200)
+    parser.add_argument("--trips", type=int, default=100_000)
+    parser.add_argument("--gps-points", type=int, default=1_000_000)
+    parser.add_argument("--start-date", type=date.fromisoformat, help="default: --days before --end-date")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-credits", action="store_true", help="skip the carbon credit row per trip")
+    args = parser.parse_args()
+
+    import migrate
+    from database import engine
+
+    start = args.start_date or args.end_date - timedelta(days=args.days - 1)
+    if start > args.end_date:
+        parser.error("--start-date is after --end-date")
+    if args.trucks < 1 or args.companies < 1:
+        parser.error("need at least one company and one truck")
+
+    migrate.migrate()
+    started = time.perf_counter()
+
+    def progress(table, done, total):
+        elapsed = round(time.perf_counter() - started, 1)
+        if done == total:
+            log.info("table seeded", table=table, rows=total, seconds=elapsed)
+        else:
+            log.info("seeding", table=table, rows=done, total=total, seconds=elapsed, every=5)
+
+    generate(
+        engine, args.companies, args.trucks, args.trips, args.gps_points, start, args.end_date,
+        args.seed, not args.no_credits, progress,
+    )
+    log.info("synthetic data seeded", companies=args.companies, trucks=args.trucks, trips=args.trips,
+             gps_points=args.gps_points, start=start, end=args.end_date,
+             seconds=round(time.perf_counter() - started, 1))
+
+
+if __name__ == "__main__":
+    main()
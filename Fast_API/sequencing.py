@@ -0,0 +1,190 @@
+"""
+Multi-stop (milk-run) route sequencing.
+
+Stops are ordered on a dense cost matrix (kg CO2 per leg = distance × weight ×
+EmissionFactor, so asymmetric road distances are handled). A nearest-neighbour
+tour from the depot (stop 0) is improved with best-improvement 2-opt and
+Or-opt moves until no move helps or the time budget runs out. Every move
+evaluation is a numpy expression over all candidate positions at once; segment
+reversal costs come from prefix sums of the tour in both directions.
+
+Open routes (no return to the depot) are solved as a closed tour through a
+dummy node that is free to enter and leads only back to the depot.
+"""
+import time
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Improvements smaller than this (kg CO2) are treated as no improvement
+IMPROVEMENT_EPSILON = 1e-9
+
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+
+
+def haversine_matrix(lat, lng) -> np.ndarray:
+    """Great-circle distance in km between every pair of points"""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lng = np.radians(np.asarray(lng, dtype=float))
+    dlat = lat[None, :] - lat[:, None]
+    dlng = lng[None, :] - lng[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def nearest_neighbour(cost: np.ndarray) -> list:
+    """Greedy tour from node 0, always moving to the cheapest unvisited node"""
+    n = len(cost)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    order = [0]
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, cost[order[-1]])
+        nxt = int(np.argmin(row))
+        visited[nxt] = True
+        order.append(nxt)
+    return order
+
+
+def best_two_opt(cost: np.ndarray, order: np.ndarray) -> tuple:
+    """
+    Best segment reversal order[i..j] (1 <= i < j <= n-1).
+    Returns (delta, i, j); delta >= 0 means no improving move.
+    """
+    n = len(order)
+    nxt = np.roll(order, -1)
+    forward = np.concatenate([[0.0], np.cumsum(cost[order, nxt])])   # forward[k]: cost of edges 0..k-1
+    backward = np.concatenate([[0.0], np.cumsum(cost[nxt, order])])  # same edges walked in reverse
+
+    i = np.arange(1, n)[:, None]
+    j = np.arange(1, n)[None, :]
+    prev_i = order[i - 1]
+    node_i = order[i]
+    node_j = order[j]
+    after_j = order[(j + 1) % n]
+
+    delta = (
+        cost[prev_i, node_j] + cost[node_i, after_j]
+        - cost[prev_i, node_i] - cost[node_j, after_j]
+        + (backward[j] - backward[i]) - (forward[j] - forward[i])
+    )
+    delta = np.where(j > i, delta, np.inf)
+
+    flat = int(np.argmin(delta))
+    row, col = divmod(flat, n - 1)
+    return float(delta[row, col]), row + 1, col + 1
+
+
+def best_or_opt(cost: np.ndarray, order: np.ndarray) -> tuple:
+    """
+    Best move of a segment of 1-3 stops (kept in direction) to another position.
+    Returns (delta, start, length, after) where the segment order[start:start+length]
+    is reinserted after order[after]; delta >= 0 means no improving move.
+    """
+    n = len(order)
+    best = (np.inf, 0, 0, 0)
+    p = np.arange(n)[None, :]
+    node_p = order[p]
+    after_p = order[(p + 1) % n]
+    for length in OR_OPT_SEGMENT_LENGTHS:
+        if length > n - 2:
+            break
+        start = np.arange(1, n - length + 1)[:, None]
+        end = start + length - 1
+        prev_s = order[start - 1]
+        first = order[start]
+        last = order[end]
+        after_s = order[(end + 1) % n]
+
+        delta = (
+            cost[prev_s, after_s] - cost[prev_s, first] - cost[last, after_s]
+            + cost[node_p, first] + cost[last, after_p] - cost[node_p, after_p]
+        )
+        invalid = (p >= start - 1) & (p <= end)
+        delta = np.where(invalid, np.inf, delta)
+
+        flat = int(np.argmin(delta))
+        row, col = divmod(flat, n)
+        if delta[row, col] < best[0]:
+            best = (float(delta[row, col]), row + 1, length, col)
+    return best
+
+
+def _apply_or_opt(order: np.ndarray, start: int, length: int, after: int) -> np.ndarray:
+    segment = order[start:start + length]
+    rest = np.concatenate([order[:start], order[start + length:]])
+    insert_at = after + 1 if after < start else after + 1 - length
+    return np.concatenate([rest[:insert_at], segment, rest[insert_at:]])
+
+
+def improve(cost: np.ndarray, order, deadline: float) -> dict:
+    """Local search until no improving move is left or time.perf_counter() passes deadline"""
+    order = np.asarray(order, dtype=np.int64)
+    two_opt_moves = 0
+    or_opt_moves = 0
+    converged = len(order) < 4
+
+    while not converged and time.perf_counter() < deadline:
+        delta, i, j = best_two_opt(cost, order)
+        if delta < -IMPROVEMENT_EPSILON:
+            order[i:j + 1] = order[i:j + 1][::-1]
+            two_opt_moves += 1
+            continue
+
+        delta, start, length, after = best_or_opt(cost, order)
+        if delta < -IMPROVEMENT_EPSILON:
+            order = _apply_or_opt(order, start, length, after)
+            or_opt_moves += 1
+            continue
+
+        converged = True
+
+    return {
+        "order": order,
+        "two_opt_moves": two_opt_moves,
+        "or_opt_moves": or_opt_moves,
+        "converged": converged,
+    }
+
+
+def sequence(cost: np.ndarray, return_to_start: bool = True, time_budget_seconds: float = 1.0) -> dict:
+    """
+    Order stops 0..n-1 starting at stop 0.
+    Returns the visiting order (ending back at 0 when return_to_start), the
+    construction-only order, and timing / move statistics.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget_seconds
+    n = len(cost)
+    matrix = np.asarray(cost, dtype=float)
+
+    if not return_to_start and n > 1:
+        # Dummy node n: entered for free from any stop, leaves only to the depot
+        large = float(matrix.max()) * n + 1.0
+        matrix = np.pad(matrix, ((0, 1), (0, 1)))
+        matrix[n, 1:n] = large
+
+    initial = nearest_neighbour(matrix[:n, :n])
+    if len(matrix) > n:
+        initial.append(n)
+    construction_seconds = time.perf_counter() - started
+
+    result = improve(matrix, initial, deadline)
+    improvement_seconds = time.perf_counter() - started - construction_seconds
+
+    def finish(order) -> list:
+        order = [int(node) for node in order]
+        if not return_to_start:
+            return [node for node in order if node != n]
+        return order + [0] if n > 1 else order
+
+    return {
+        "order": finish(result["order"]),
+        "initial_order": finish(initial),
+        "two_opt_moves": result["two_opt_moves"],
+        "or_opt_moves": result["or_opt_moves"],
+        "converged": result["converged"],
+        "construction_seconds": construction_seconds,
+        "improvement_seconds": improvement_seconds,
+    }
@@ -0,0 +1,204 @@
+"""
+GPS simulation registry shared by every worker process.
+
+Simulations are rows in simulation_leases, so whichever worker (uvicorn
+--workers, gunicorn, several hosts) gets a status or stop request can answer
+it. The worker that starts a simulation drives it on a local thread and holds
+its lease:
+
+- every tick the driver renews the lease with a conditional UPDATE on
+  (truck_id, generation, status='running'); when that matches no row, the
+  simulation was stopped or taken over and the thread ends,
+- starting a truck that is already running bumps its generation, so the old
+  driver (on whatever worker) stops at its next tick,
+- a worker that dies stops renewing; once its lease has expired
+  (SIMULATION_LEASE_SECONDS) the first worker whose reaper sees it adopts the
+  simulation and resumes from the last saved point,
+- a simulation adopted SIMULATION_MAX_ADOPTIONS times without its driver
+  getting past that point is marked failed instead of being adopted again, and
+  a driver that hits an error a retry won't fix marks it failed right away.
+
+Claims and adoptions are single atomic statements, so each truck has exactly
+one driver at a time. Lease times come from the workers' clocks, which are
+assumed to be in sync (NTP).
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import DBAPIError
+
+from database import engine
+from models import SimulationLease
+import structured_log
+
+log = structured_log.get_logger("simulations")
+
+SIMULATION_LEASE_SECONDS = float(os.getenv("SIMULATION_LEASE_SECONDS", "15"))
+SIMULATION_REAP_SECONDS = float(os.getenv("SIMULATION_REAP_SECONDS", "5"))
+SIMULATION_MAX_ADOPTIONS = int(os.getenv("SIMULATION_MAX_ADOPTIONS", "3"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Simulations this process is driving: truck_id -> generation
+driving = {}
+
+if engine.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+else:
+    from sqlalchemy.dialects.sqlite import insert
+
+
+def _lease_expiry(now: datetime) -> datetime:
+    return now + timedelta(seconds=SIMULATION_LEASE_SECONDS)
+
+
+def claim(truck_id: str, vehicle_type: str, start_lat: float, start_lng: float,
+          end_lat: float, end_lng: float) -> int:
+    """Start (or restart) a truck's simulation owned by this worker; returns the new generation"""
+    now = datetime.utcnow()
+    route = {
+        "vehicle_type": vehicle_type, "start_lat": start_lat, "start_lng": start_lng,
+        "end_lat": end_lat, "end_lng": end_lng,
+    }
+    statement = insert(SimulationLease).values(
+        truck_id=truck_id, owner=WORKER_ID, generation=1, status="running", points_done=0, adoptions=0,
+        error=None, started_at=now, heartbeat_at=now, lease_expires_at=_lease_expiry(now), **route,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[SimulationLease.truck_id],
+        set_=dict(
+            owner=WORKER_ID, generation=SimulationLease.generation + 1, status="running", points_done=0,
+            adoptions=0, error=None, started_at=now, heartbeat_at=now, lease_expires_at=_lease_expiry(now), **route,
+        ),
+    ).returning(SimulationLease.generation)
+    with engine.begin() as conn:
+        generation = conn.execute(statement).scalar_one()
+    driving[truck_id] = generation
+    return generation
+
+
+def renew(truck_id: str, generation: int, points_done: int) -> bool:
+    """Heartbeat from the driver; False once it no longer holds the lease"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        held = conn.execute(
+            update(SimulationLease)
+            .where(SimulationLease.truck_id == truck_id, SimulationLease.generation == generation,
+                   SimulationLease.status == "running")
+            .values(heartbeat_at=now, lease_expires_at=_lease_expiry(now), points_done=points_done,
+                    # Progress since the last takeover: the driver isn't stuck
+                    adoptions=case((SimulationLease.points_done < points_done, 0), else_=SimulationLease.adoptions))
+        ).rowcount == 1
+    if not held:
+        release(truck_id, generation)
+    return held
+
+
+def finish(truck_id: str, generation: int):
+    """Mark a simulation that ran to the end as completed"""
+    with engine.begin() as conn:
+        conn.execute(
+            update(SimulationLease)
+            .where(SimulationLease.truck_id == truck_id, SimulationLease.generation == generation,
+                   SimulationLease.status == "running")
+            .values(status="completed", heartbeat_at=datetime.utcnow())
+        )
+    release(truck_id, generation)
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors another attempt may not hit (the database went away); anything else would repeat"""
+    return isinstance(error, (DBAPIError, ConnectionError, TimeoutError))
+
+
+def fail(truck_id: str, generation: int, error: str):
+    """Mark a simulation whose driver hit an error that adopting it again would repeat"""
+    with engine.begin() as conn:
+        conn.execute(
+            update(SimulationLease)
+            .where(SimulationLease.truck_id == truck_id, SimulationLease.generation == generation,
+                   SimulationLease.status == "running")
+            .values(status="failed", error=error[:500], heartbeat_at=datetime.utcnow())
+        )
+    release(truck_id, generation)
+
+
+def release(truck_id: str, generation: int):
+    """Forget a simulation locally (its driver thread has ended)"""
+    if driving.get(truck_id) == generation:
+        del driving[truck_id]
+
+
+def stop(truck_id: str) -> bool:
+    """
+    Ask whichever worker drives the truck to stop; False if nothing was running.
+    Expired leases count too: their driver died, and the reaper would otherwise resume them.
+    """
+    with engine.begin() as conn:
+        return conn.execute(
+            update(SimulationLease)
+            .where(SimulationLease.truck_id == truck_id, SimulationLease.status == "running")
+            .values(status="stopped")
+        ).rowcount == 1
+
+
+def is_running(truck_id: str) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(SimulationLease.truck_id)
+            .where(SimulationLease.truck_id == truck_id, SimulationLease.status == "running",
+                   SimulationLease.lease_expires_at > datetime.utcnow())
+        ).first() is not None
+
+
+def adopt_expired() -> list:
+    """
+    Take over running simulations whose driver stopped renewing; returns the adopted rows.
+    Ones already adopted SIMULATION_MAX_ADOPTIONS times without progress are marked failed.
+    """
+    now = datetime.utcnow()
+    adoptions = func.coalesce(SimulationLease.adoptions, 0)
+    expired = (SimulationLease.status == "running", SimulationLease.lease_expires_at < now)
+    with engine.begin() as conn:
+        failed = conn.execute(
+            update(SimulationLease)
+            .where(*expired, adoptions >= SIMULATION_MAX_ADOPTIONS)
+            .values(status="failed", heartbeat_at=now,
+                    error=f"driver died {SIMULATION_MAX_ADOPTIONS} times in a row without progress")
+            .returning(SimulationLease.truck_id, SimulationLease.points_done)
+        ).all()
+        adopted = conn.execute(
+            update(SimulationLease)
+            .where(*expired)
+            .values(owner=WORKER_ID, generation=SimulationLease.generation + 1, adoptions=adoptions + 1,
+                    heartbeat_at=now, lease_expires_at=_lease_expiry(now))
+            .returning(
+                SimulationLease.truck_id, SimulationLease.generation, SimulationLease.vehicle_type,
+                SimulationLease.start_lat, SimulationLease.start_lng, SimulationLease.end_lat,
+                SimulationLease.end_lng, SimulationLease.points_done, SimulationLease.adoptions,
+            )
+        ).all()
+    for lease in failed:
+        log.error("simulation failed, not adopting it again", truck_id=lease.truck_id,
+                  points_done=lease.points_done, adoptions=SIMULATION_MAX_ADOPTIONS)
+    for lease in adopted:
+        driving[lease.truck_id] = lease.generation
+        log.warning("adopted orphaned simulation", truck_id=lease.truck_id, generation=lease.generation,
+                    points_done=lease.points_done, adoptions=lease.adoptions)
+    return adopted
+
+
+async def run_reaper(resume):
+    """Lifespan task: periodically adopt expired simulations and hand each to resume(lease)"""
+    while True:
+        await asyncio.sleep(SIMULATION_REAP_SECONDS)
+        try:
+            for lease in await run_in_threadpool(adopt_expired):
+                resume(lease)
+        except Exception as e:
+            log.warning("simulation reaper failed", error=str(e), every=60)
@@ -0,0 +1,167 @@
+"""
+Structured, non-blocking logging.
+
+Records go onto a bounded in-memory queue and are formatted and written to
+stdout by a listener thread, so a log call on the request or simulation path
+costs a record and a queue put, never a stdout write. When the queue is full
+the record is dropped and counted (dropped()) instead of stalling the caller.
+
+    log = structured_log.get_logger("main")
+    log.info("trip recorded", trip_id=trip.id, co2_kg=co2)
+    log.debug("gps point saved", truck_id=truck_id, every=5)   # at most once per 5s from this line
+    log.info("lane resolved", lane=lane, sample=0.01)          # 1% of calls from this line
+
+Keyword arguments become JSON fields. every= and sample= throttle per call
+site (file and line); the next record let through carries the number of
+records suppressed since the last one.
+
+LOG_LEVEL (default INFO), LOG_FORMAT json | text (text is "message key=value",
+for reading a CLI run in a terminal), LOG_QUEUE_SIZE (default 10000).
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Chatty library loggers held at WARNING; httpx's request lines carry the Mapbox token in the URL
+QUIET_LOGGERS = ("httpx", "httpcore")
+
+# Keyword arguments that keep their logging meaning; everything else is a field
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel")
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger taking JSON fields (and every= / sample=) as keyword arguments"""
+
+    def process(self, msg, kwargs):
+        fields = {name: kwargs.pop(name) for name in list(kwargs) if name not in _LOGGING_KWARGS}
+        kwargs["extra"] = {
+            "fields": fields,
+            "every": fields.pop("every", None),
+            "sample": fields.pop("sample", None),
+        }
+        return msg, kwargs
+
+
+class Throttle(logging.Filter):
+    """Per-call-site rate limiting (every=) and sampling (sample=)"""
+
+    def __init__(self):
+        super().__init__()
+        self._sites = {}  # (path, line) -> [last emitted, suppressed since]
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        every = getattr(record, "every", None)
+        sample = getattr(record, "sample", None)
+        if every is None and sample is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.setdefault((record.pathname, record.lineno), [float("-inf"), 0])
+            if (sample is not None and random.random() >= sample) or (every is not None and now - state[0] < every):
+                state[1] += 1
+                return False
+            if state[1]:
+                record.fields = dict(record.fields, suppressed=state[1])
+            state[0], state[1] = now, 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; drops (and counts) them when the queue is full"""
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # Render message and traceback now: args and exc_info belong to the calling thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        line = record.getMessage()
+        if record.levelno >= logging.WARNING:
+            line = f"{record.levelname}: {line}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+_handler = None
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure():
+    """Send root logging through the queue to stdout; idempotent"""
+    global _handler, _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+        records = queue.Queue(LOG_QUEUE_SIZE)
+        _handler = DroppingQueueHandler(records)
+        _handler.addFilter(Throttle())
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        atexit.register(_listener.stop)  # drains the queue on exit
+
+
+def get_logger(name: str) -> StructuredLogger:
+    configure()
+    return StructuredLogger(logging.getLogger(name), {})
+
+
+def dropped() -> int:
+    """Records dropped because the queue was full"""
+    return _handler.dropped if _handler is not None else 0
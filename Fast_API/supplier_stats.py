@@ -0,0 +1,172 @@
+"""
+Incremental per-supplier discrepancy statistics.
+
+Each verified batch is summarised per supplier (count, mean, M2 of the absolute
+distance deviation, status counts, CO2 delta) and merged into supplier_stats
+with the parallel form of Welford's algorithm:
+
+    n   = n_a + n_b
+    d   = mean_b - mean_a
+    mean = mean_a + d * n_b / n
+    M2  = M2_a + M2_b + d² * n_a * n_b / n
+
+The merge is a single UPDATE whose right-hand side only reads the old row, so
+concurrent writers never lose updates and no row lock is needed.
+
+Rebuild from existing reports with: python supplier_stats.py --rebuild
+"""
+from datetime import datetime
+
+from sqlalchemy import update, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import SupplierStats, SupplierReport
+
+STATUS_COLUMNS = {
+    "verified": "verified_count",
+    "warning": "warning_count",
+    "flagged": "flagged_count",
+}
+
+
+def summarize(rows) -> dict:
+    """
+    Per-supplier batch summary from dicts with supplier_name, distance_diff_pct,
+    verification_status and co2_delta.
+    """
+    summaries = {}
+    for row in rows:
+        summary = summaries.get(row["supplier_name"])
+        if summary is None:
+            summary = summaries[row["supplier_name"]] = {
+                "n": 0, "mean": 0.0, "m2": 0.0, "max": 0.0, "co2_delta": 0.0,
+                "verified_count": 0, "warning_count": 0, "flagged_count": 0,
+            }
+        x = float(row["distance_diff_pct"])
+        summary["n"] += 1
+        delta = x - summary["mean"]
+        summary["mean"] += delta / summary["n"]
+        summary["m2"] += delta * (x - summary["mean"])
+        summary["max"] = max(summary["max"], x)
+        summary["co2_delta"] += float(row["co2_delta"])
+        column = STATUS_COLUMNS.get(row["verification_status"])
+        if column:
+            summary[column] += 1
+    return summaries
+
+
+def _merge_values(summary: dict, now: datetime) -> dict:
+    n_a = SupplierStats.report_count
+    mean_a = SupplierStats.mean_deviation_pct
+    n_b = summary["n"]
+    mean_b = summary["mean"]
+    n = n_a + n_b
+    return {
+        "report_count": n,
+        "mean_deviation_pct": mean_a + (mean_b - mean_a) * n_b / n,
+        "m2_deviation": SupplierStats.m2_deviation + summary["m2"] + (mean_b - mean_a) * (mean_b - mean_a) * n_a * n_b / n,
+        "max_deviation_pct": case((SupplierStats.max_deviation_pct < summary["max"], summary["max"]), else_=SupplierStats.max_deviation_pct),
+        "verified_count": SupplierStats.verified_count + summary["verified_count"],
+        "warning_count": SupplierStats.warning_count + summary["warning_count"],
+        "flagged_count": SupplierStats.flagged_count + summary["flagged_count"],
+        "cumulative_co2_delta": SupplierStats.cumulative_co2_delta + summary["co2_delta"],
+        "last_report_at": now,
+        "updated_at": now,
+    }
+
+
+def apply_summaries(db: Session, summaries: dict):
+    """Merge batch summaries into supplier_stats (caller commits)"""
+    now = datetime.utcnow()
+    for supplier_name, summary in summaries.items():
+        statement = update(SupplierStats).where(SupplierStats.supplier_name == supplier_name)
+        if db.execute(statement.values(**_merge_values(summary, now))).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(SupplierStats(
+                    supplier_name=supplier_name,
+                    report_count=summary["n"],
+                    verified_count=summary["verified_count"],
+                    warning_count=summary["warning_count"],
+                    flagged_count=summary["flagged_count"],
+                    mean_deviation_pct=summary["mean"],
+                    m2_deviation=summary["m2"],
+                    max_deviation_pct=summary["max"],
+                    cumulative_co2_delta=summary["co2_delta"],
+                    last_report_at=now,
+                    updated_at=now,
+                ))
+        except IntegrityError:
+            # Another writer created the row first; merge into it instead
+            db.execute(statement.values(**_merge_values(summary, now)))
+
+
+def record_verified(db: Session, rows):
+    apply_summaries(db, summarize(rows))
+
+
+def stats_row(stats: SupplierStats) -> dict:
+    n = stats.report_count or 0
+    variance = stats.m2_deviation / (n - 1) if n > 1 else 0.0
+    return {
+        "supplier_name": stats.supplier_name,
+        "report_count": n,
+        "verified_count": stats.verified_count,
+        "warning_count": stats.warning_count,
+        "flagged_count": stats.flagged_count,
+        "flagged_rate": round(stats.flagged_count / n, 4) if n else 0.0,
+        "mean_deviation_pct": round(stats.mean_deviation_pct, 2),
+        "stddev_deviation_pct": round(variance ** 0.5, 2),
+        "max_deviation_pct": round(stats.max_deviation_pct, 2),
+        "cumulative_co2_delta": round(stats.cumulative_co2_delta, 2),
+        "last_report_at": stats.last_report_at.isoformat() if stats.last_report_at else None,
+    }
+
+
+def rebuild(db: Session) -> int:
+    """Recompute supplier_stats from every verified report (one pass, streamed)"""
+    db.query(SupplierStats).delete()
+    query = db.query(
+        SupplierReport.supplier_name,
+        SupplierReport.reported_distance,
+        SupplierReport.verified_distance,
+        SupplierReport.reported_co2,
+        SupplierReport.verified_co2,
+        SupplierReport.verification_status,
+    ).filter(
+        SupplierReport.verification_status.in_(list(STATUS_COLUMNS)),
+        SupplierReport.reported_distance.isnot(None),  # rows written outside the API; no deviation to count
+    ).yield_per(5000)
+
+    rows = (
+        {
+            "supplier_name": r.supplier_name,
+            "distance_diff_pct": abs(r.reported_distance - r.verified_distance) / r.verified_distance * 100 if r.verified_distance else 0,
+            "verification_status": r.verification_status,
+            "co2_delta": (r.reported_co2 or 0) - (r.verified_co2 or 0),
+        }
+        for r in query
+    )
+    summaries = summarize(rows)
+    apply_summaries(db, summaries)
+    db.commit()
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from database import SessionLocal
+
+    if "--rebuild" not in sys.argv:
+        print("Usage: python supplier_stats.py --rebuild")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = rebuild(session)
+        print(f"✅ Rebuilt statistics for {count} suppliers")
+    finally:
+        session.close()
@@ -0,0 +1,125 @@
+"""
+Analytics across the Parquet archive and the database: where the date range is
+split, how keys merge across the two halves, and /analytics/footprint totals
+against a direct SQL aggregate.
+
+Run with: pytest test_analytics.py
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, text
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+import analytics  # noqa: E402
+import archive  # noqa: E402
+from models import Company, Trip  # noqa: E402
+
+TODAY = date(2026, 3, 10)
+THROUGH = date(2026, 3, 9)
+
+# (created_at, vehicle, distance_km, co2_kg): archived days, then today
+TRIPS = [
+    (datetime(2026, 2, 27, 9), "diesel", 120.0, 32.4),
+    (datetime(2026, 3, 1, 8), "diesel", 100.0, 27.0),
+    (datetime(2026, 3, 1, 22), "electric", 80.0, 1.6),
+    (datetime(2026, 3, 9, 23, 59), "petrol", 50.0, 12.0),
+    (datetime(2026, 3, 10, 0, 1), "diesel", 40.0, 10.8),
+    (datetime(2026, 3, 10, 15), "electric", 60.0, 1.2),
+]
+
+
+@pytest.fixture
+def archived(db, tmp_path, monkeypatch):
+    """TRIPS in the database, with every day before TODAY archived"""
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(archive, "today", lambda: TODAY)
+    db.add_all([Company(id=1, name="One"), Company(id=2, name="Two")])
+    db.add_all([
+        Trip(vehicle_type=vehicle, start_location="Pune", end_location="Mumbai", distance_km=distance,
+             co2_kg=co2, company_id=1 + i % 2, created_at=at)
+        for i, (at, vehicle, distance, co2) in enumerate(TRIPS)
+    ])
+    db.commit()
+    archive.archive_closed_days(["trips"])
+    assert archive.archived_through("trips") == THROUGH
+    return db
+
+
+MEASURES = [
+    ("trips", "count(*)", func.count()),
+    ("co2_kg", "sum(co2_kg)", func.sum(Trip.co2_kg)),
+]
+
+
+def test_split_at_the_watermark(archived):
+    d = date
+    assert analytics.split("trips") == ((None, THROUGH), (TODAY, None))
+    assert analytics.split("trips", d(2026, 3, 1), d(2026, 3, 5)) == ((d(2026, 3, 1), d(2026, 3, 5)), None)
+    assert analytics.split("trips", THROUGH, TODAY) == ((THROUGH, THROUGH), (TODAY, TODAY))
+    assert analytics.split("trips", TODAY) == (None, (TODAY, None))
+    # Ranges reaching past today end today
+    assert analytics.split("trips", d(2026, 3, 1), d(2026, 4, 1)) == ((d(2026, 3, 1), THROUGH), (TODAY, TODAY))
+    # Nothing archived yet: all from the database
+    assert analytics.split("gps_tracking", d(2026, 3, 1)) == (None, (d(2026, 3, 1), None))
+
+
+def test_keys_merge_across_archive_and_database(archived):
+    by_month = analytics.aggregate("trips", None, None, [analytics.month_key("period", Trip.created_at)], MEASURES)
+    assert sorted((r["period"], r["trips"]) for r in by_month["rows"]) == [("2026-02", 1), ("2026-03", 5)]
+
+    by_day = analytics.aggregate("trips", THROUGH, TODAY, [analytics.day_key("period", Trip.created_at)], MEASURES)
+    assert sorted((r["period"], r["trips"]) for r in by_day["rows"]) == [("2026-03-09", 1), ("2026-03-10", 2)]
+    assert by_day["sources"] == {"archive": {"from": THROUGH, "to": THROUGH}, "database": {"from": TODAY, "to": TODAY}}
+
+    by_vehicle = analytics.aggregate("trips", None, None, [analytics.column_key("vehicle", Trip.vehicle_type)], MEASURES)
+    totals = {r["vehicle"]: (r["trips"], round(r["co2_kg"], 2)) for r in by_vehicle["rows"]}
+    assert totals == {"diesel": (3, 70.2), "electric": (2, 2.8), "petrol": (1, 12.0)}
+
+
+def test_archived_days_are_read_from_parquet(archived):
+    # Rows changed in the database after archiving don't show up for archived days
+    archived.execute(text("UPDATE trips SET co2_kg = 0"))
+    archived.commit()
+    result = analytics.aggregate("trips", None, None, [analytics.column_key("vehicle", Trip.vehicle_type)], MEASURES)
+    assert round(sum(r["co2_kg"] for r in result["rows"]), 2) == round(sum(t[3] for t in TRIPS[:4]), 2)
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"group_by": "month"},
+    {"group_by": "vehicle_type"},
+    {"start_date": "2026-03-01", "end_date": "2026-03-10"},
+    {"start_date": "2026-03-09", "company_id": 2},
+])
+def test_footprint_matches_sql(archived, client, params):
+    where, values = ["created_at < :tomorrow"], {"tomorrow": datetime(2026, 3, 11)}
+    if "start_date" in params:
+        where.append("created_at >= :start")
+        values["start"] = datetime.fromisoformat(params["start_date"])
+    if "company_id" in params:
+        where.append("company_id = :company")
+        values["company"] = params["company_id"]
+    trips, distance, co2 = archived.execute(text(
+        f"SELECT COUNT(*), SUM(distance_km), SUM(co2_kg) FROM trips WHERE {' AND '.join(where)}"
+    ), values).one()
+
+    response = client.get("/analytics/footprint", params=params)
+    assert response.status_code == 200
+    rows = response.json()["rows"]
+    assert sum(r["trips"] for r in rows) == trips
+    assert sum(r["distance_km"] for r in rows) == pytest.approx(distance)
+    assert sum(r["co2_kg"] for r in rows) == pytest.approx(co2)
+    assert response.json()["sources"]["database"]["from"] == TODAY.isoformat()
+
+
+def test_footprint_days_match_sql(archived, client):
+    expected = archived.execute(text(
+        "SELECT date(created_at), COUNT(*), SUM(co2_kg) FROM trips GROUP BY date(created_at) ORDER BY 1"
+    )).all()
+    rows = client.get("/analytics/footprint").json()["rows"]
+    assert [(r["period"], r["trips"], r["co2_kg"]) for r in rows] == [
+        (day, trips, round(co2, 2)) for day, trips, co2 in expected
+    ]
@@ -0,0 +1,104 @@
+"""
+Parquet archive of closed days: partitions, the watermark and --rebuild-from.
+
+The archive is written to a temporary ARCHIVE_DIR, with "today" pinned so the
+open day is known.
+
+Run with: pytest test_archive.py
+"""
+from datetime import date, datetime
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+import archive  # noqa: E402
+from models import Company, GPSTrack, Trip  # noqa: E402
+
+TODAY = date(2026, 3, 10)
+
+
+@pytest.fixture
+def archive_dir(db, tmp_path, monkeypatch):
+    db.add(Company(id=1, name="One"))
+    db.commit()
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(archive, "today", lambda: TODAY)
+    return tmp_path
+
+
+def add_trips(db, *times, vehicle: str = "diesel"):
+    db.add_all([
+        Trip(vehicle_type=vehicle, start_location="Pune", end_location="Mumbai", distance_km=100,
+             co2_kg=27, company_id=1, created_at=at)
+        for at in times
+    ])
+    db.commit()
+
+
+def partition(day: date):
+    return pq.read_table(archive.day_path("trips", day))
+
+
+def test_closed_days_become_sorted_partitions(db, archive_dir):
+    add_trips(db, datetime(2026, 3, 7, 18), datetime(2026, 3, 7, 6), datetime(2026, 3, 9, 12),
+              datetime(2026, 3, 10, 1))
+
+    assert archive.archive_closed_days(["trips"]) == 2
+    assert sorted(path.parent.name for path in archive_dir.glob("trips/day=*/data.parquet")) == [
+        "day=2026-03-07", "day=2026-03-09",
+    ]
+    # Every closed day is covered, the empty 8th included; today stays in the database
+    assert archive.archived_through("trips") == date(2026, 3, 9)
+
+    table = partition(date(2026, 3, 7))
+    assert table.column_names == [column.name for column in Trip.__table__.columns]
+    assert table.column("created_at").to_pylist() == [datetime(2026, 3, 7, 6), datetime(2026, 3, 7, 18)]
+    assert table.column("co2_kg").to_pylist() == [27.0, 27.0]
+    metadata = pq.ParquetFile(archive.day_path("trips", date(2026, 3, 7))).metadata
+    assert metadata.row_group(0).column(0).statistics.has_min_max
+
+
+def test_gps_partitions_sort_by_vehicle_then_time(db, archive_dir):
+    db.add_all([
+        GPSTrack(vehicle_id=vehicle, latitude=18.5, longitude=73.8, distance_segment=1, co2_segment=0.27,
+                 timestamp=datetime(2026, 3, 9, hour))
+        for vehicle, hour in (("B", 1), ("A", 5), ("B", 0), ("A", 2))
+    ])
+    db.commit()
+
+    archive.archive_closed_days(["gps_tracking"])
+    table = pq.read_table(archive.day_path("gps_tracking", date(2026, 3, 9)))
+    assert list(zip(table.column("vehicle_id").to_pylist(), [t.hour for t in table.column("timestamp").to_pylist()])) == [
+        ("A", 2), ("A", 5), ("B", 0), ("B", 1),
+    ]
+
+
+def test_watermark_and_rebuild_from(db, archive_dir, monkeypatch):
+    add_trips(db, datetime(2026, 3, 7, 6), datetime(2026, 3, 9, 12), datetime(2026, 3, 10, 1))
+    archive.archive_closed_days(["trips"])
+
+    # Rows added later for an archived day are not picked up by a normal run
+    add_trips(db, datetime(2026, 3, 7, 20))
+    assert archive.archive_closed_days(["trips"]) == 0
+    assert partition(date(2026, 3, 7)).num_rows == 1
+
+    # Once the day closes, the next run only writes it
+    monkeypatch.setattr(archive, "today", lambda: date(2026, 3, 11))
+    assert archive.archive_closed_days(["trips"]) == 1
+    assert archive.archived_through("trips") == date(2026, 3, 10)
+    assert partition(date(2026, 3, 7)).num_rows == 1
+
+    # --rebuild-from rewrites from that day on, and drops days that are now empty
+    db.query(Trip).filter(Trip.created_at >= datetime(2026, 3, 9), Trip.created_at < datetime(2026, 3, 10)).delete()
+    db.commit()
+    assert archive.archive_closed_days(["trips"], rebuild_from=date(2026, 3, 7)) == 2
+    assert partition(date(2026, 3, 7)).num_rows == 2
+    assert not archive.day_path("trips", date(2026, 3, 9)).exists()
+    assert archive.archived_through("trips") == date(2026, 3, 10)
+
+
+def test_nothing_to_archive(db, archive_dir):
+    assert archive.archive_closed_days(["trips"]) == 0
+    assert archive.archived_through("trips") is None
+    assert not any(archive_dir.iterdir())
@@ -0,0 +1,96 @@
+"""
+Shipment-to-truck assignment: the solver must place as many shipments as
+possible at minimal CO2, matching a brute-force search on small fleets.
+
+Run with: pytest test_assignment.py
+"""
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+import assignment
+from emissions import EMISSION_FACTORS, emission_factor_array
+
+VEHICLE_TYPES = list(EMISSION_FACTORS)
+
+
+def brute_force(load, weight, factors, capacity) -> tuple:
+    """(placed, co2) of the best assignment, trying every truck choice per shipment"""
+    best = (0, 0.0)
+    for choice in itertools.product(range(-1, len(capacity)), repeat=len(load)):
+        used = [t for t in choice if t >= 0]
+        if len(used) != len(set(used)):
+            continue
+        if any(t >= 0 and weight[s] > capacity[t] for s, t in enumerate(choice)):
+            continue
+        co2 = sum(load[s] * factors[t] for s, t in enumerate(choice) if t >= 0)
+        if len(used) > best[0] or (len(used) == best[0] and co2 < best[1]):
+            best = (len(used), co2)
+    return best
+
+
+def check(truck, load, weight, factors, capacity) -> tuple:
+    """Validate a solver result and return its (placed, co2)"""
+    used = truck[truck >= 0]
+    assert len(used) == len(set(used.tolist())), "truck used twice"
+    placed = np.flatnonzero(truck >= 0)
+    assert (weight[placed] <= capacity[truck[placed]]).all(), "truck over capacity"
+    return len(placed), float((load[placed] * factors[truck[placed]]).sum())
+
+
+def instances(count: int = 60, seed: int = 7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        shipments = rng.randint(1, 5)
+        trucks = rng.randint(1, 5)
+        weight = np.array([rng.choice([2.0, 5.0, 8.0, 12.0, 20.0]) for _ in range(shipments)])
+        load = np.array([rng.uniform(10, 500) for _ in range(shipments)]) * weight
+        capacity = np.array([rng.choice([5.0, 10.0, 20.0]) for _ in range(trucks)])
+        factors = emission_factor_array([rng.choice(VEHICLE_TYPES) for _ in range(trucks)])
+        yield load, weight, factors, capacity
+
+
+def solvers():
+    yield assignment._class_flow_assign
+    if assignment._scipy_solver() is not None:
+        yield assignment._scipy_assign
+
+
+@pytest.mark.parametrize("solver", list(solvers()), ids=lambda solver: solver.__name__)
+def test_solver_matches_brute_force(solver):
+    for load, weight, factors, capacity in instances():
+        placed, co2 = check(solver(load, weight, factors, capacity), load, weight, factors, capacity)
+        best_placed, best_co2 = brute_force(load, weight, factors, capacity)
+        assert placed == best_placed
+        assert co2 == pytest.approx(best_co2)
+
+
+def test_waves_group_overlapping_windows():
+    start = [0, 5, 1, 20, 30, 29]
+    end = [4, 10, 6, 25, 35, 31]
+    assert assignment.waves(start, end) == [[0, 2, 1], [3], [5, 4]]
+    # Touching windows don't overlap
+    assert assignment.waves([0, 10], [10, 20]) == [[0], [1]]
+
+
+def test_assign_reuses_trucks_across_waves_and_explains_leftovers():
+    result = assignment.assign(
+        distance_km=[100, 100, 100, 100],
+        weight=[5, 5, 5, 50],
+        window_start=[0, 0, 10, 10],
+        window_end=[5, 5, 15, 15],
+        capacity_tons=[10, 10],
+        vehicle_types=["electric", "diesel"],
+    )
+
+    assert result["waves"] == 2
+    assert sorted(result["truck"][:2].tolist()) == [0, 1]
+    assert result["truck"][2] == 0  # electric is free again in the second wave
+    assert result["co2"][2] == pytest.approx(100 * 5 * EMISSION_FACTORS["electric"])
+    assert result["truck"][3] == -1 and np.isnan(result["co2"][3])
+    assert result["reason"] == [None, None, None, assignment.UNASSIGNED_NO_CAPACITY]
+
+    busy = assignment.assign([100, 100], [5, 5], [0, 0], [5, 5], [10], ["diesel"])
+    assert busy["reason"].count(assignment.UNASSIGNED_FLEET_BUSY) == 1
@@ -0,0 +1,93 @@
+"""
+Streaming exports: filters, time order, NDJSON / CSV / gzip encoding across
+chunk boundaries, and the connection going back to the pool.
+
+Run with: pytest test_exports.py
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime
+
+import pytest
+
+from database import engine
+import exports
+from models import Company, Trip
+
+
+@pytest.fixture
+def trips(db, monkeypatch):
+    """Seven trips for two companies over three days, inserted out of time order"""
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_SIZE", 2)
+    db.add_all([Company(id=1, name="One"), Company(id=2, name="Two")])
+    days = [3, 1, 2, 1, 3, 2, 1]
+    db.add_all([
+        Trip(id=i + 1, company_id=1 + i % 2, vehicle_type="diesel", start_location="Pune", end_location="Mumbai",
+             distance_km=10.0 * (i + 1), co2_kg=1.5 * (i + 1), created_at=datetime(2026, 3, day, 8, i))
+        for i, day in enumerate(days)
+    ])
+    db.commit()
+    return db
+
+
+def export(format: str = "ndjson", gzip_: bool = False, start_date=None, end_date=None, **filters) -> bytes:
+    query = exports.statement(exports.DATASETS["trips"], start_date, end_date, **filters)
+    return b"".join(exports.stream("trips", query, format, gzip_))
+
+
+def test_ndjson_in_time_order_across_chunks(trips):
+    chunks = list(exports.stream("trips", exports.statement(exports.DATASETS["trips"]), "ndjson", False))
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+    assert len(chunks) == 4  # EXPORT_CHUNK_SIZE rows per chunk
+
+    assert len(rows) == 7
+    created = [row["created_at"] for row in rows]
+    assert created == sorted(created)
+    assert set(rows[0]) == {column.key for column in exports.DATASETS["trips"].columns}
+
+
+def test_date_range_and_filters(trips):
+    rows = [json.loads(line) for line in export(start_date=date(2026, 3, 2), end_date=date(2026, 3, 2)).splitlines()]
+    assert sorted(row["id"] for row in rows) == [3, 6]
+
+    rows = [json.loads(line) for line in export(start_date=date(2026, 3, 2), company_id=1).splitlines()]
+    assert sorted(row["id"] for row in rows) == [1, 3, 5]
+
+    assert export(company_id=None).count(b"\n") == 7
+
+
+def test_csv_has_one_header_and_every_row(trips):
+    rows = list(csv.reader(io.StringIO(export("csv").decode("utf-8"))))
+
+    assert rows[0] == [column.key for column in exports.DATASETS["trips"].columns]
+    assert len(rows) == 8
+    assert rows[1][-1] == "2026-03-01T08:01:00"
+
+
+def test_csv_without_matches_is_header_only(trips):
+    body = export("csv", start_date=date(2027, 1, 1)).decode("utf-8")
+    assert body.strip() == ",".join(column.key for column in exports.DATASETS["trips"].columns)
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_gzip_matches_the_plain_export(trips, format):
+    assert gzip.decompress(export(format, gzip_=True)) == export(format)
+
+
+def test_abandoned_export_returns_the_connection(trips):
+    query = exports.statement(exports.DATASETS["trips"])
+    body = exports.stream("trips", query, "ndjson", False)
+
+    next(body)
+    assert engine.pool.checkedout() == 1
+    body.close()  # client went away
+    assert engine.pool.checkedout() == 0
+
+
+def test_filename():
+    assert exports.filename("trips", "csv", False) == "trips-start-end.csv"
+    assert exports.filename("gps", "ndjson", True, date(2026, 3, 1), date(2026, 3, 31)) == \
+        "gps-2026-03-01-2026-03-31.ndjson.gz"
@@ -0,0 +1,130 @@
+"""
+Migration runner: dry runs, status, idempotent re-runs, resumable backfills
+and concurrent runners on SQLite.
+
+Run with: pytest test_migrate.py
+"""
+import threading
+
+import pytest
+from sqlalchemy import inspect, text
+
+from database import Base, engine
+import migrate
+from migrate import AddColumn, Backfill, Migration
+from migrations import MIGRATIONS
+
+
+@pytest.fixture
+def empty_database():
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+        conn.execute(text("DROP TABLE IF EXISTS schema_migration_steps"))
+    yield
+
+
+def tables() -> set:
+    with engine.connect() as conn:
+        return set(inspect(conn).get_table_names())
+
+
+def test_dry_run_changes_nothing(empty_database, capsys):
+    assert migrate.migrate(dry_run=True) == 0
+
+    assert tables() == set()
+    plan = capsys.readouterr().out
+    for migration in MIGRATIONS:
+        assert f"{migration.version}  {migration.name}" in plan
+    assert "lock: " in plan
+
+
+def test_status_on_a_new_database(empty_database, capsys):
+    migrate.print_status(MIGRATIONS)
+
+    assert tables() == set()
+    assert capsys.readouterr().out.count("pending") == len(MIGRATIONS)
+
+
+def test_migrate_applies_everything_once(empty_database, capsys):
+    assert migrate.migrate() == len(MIGRATIONS)
+    assert migrate.migrate() == 0
+
+    assert set(migrate.applied_versions()) == {m.version for m in MIGRATIONS}
+    assert set(Base.metadata.tables) <= tables()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM companies WHERE id = 1")).scalar() == "Default Company"
+
+    migrate.print_status(MIGRATIONS)
+    assert "pending" not in capsys.readouterr().out
+
+
+def test_target_stops_at_version(empty_database):
+    assert migrate.migrate(target=2) == 2
+    assert set(migrate.applied_versions()) == {1, 2}
+
+
+def test_concurrent_runners_apply_each_migration_once(empty_database):
+    applied, errors = [], []
+
+    def run():
+        try:
+            applied.append(migrate.migrate())
+        except Exception as e:
+            errors.append(e)
+
+    runners = [threading.Thread(target=run) for _ in range(4)]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+
+    assert errors == []
+    assert sorted(applied) == [0, 0, 0, len(MIGRATIONS)]
+
+
+def test_backfill_resumes_after_interruption(empty_database, monkeypatch):
+    migrate.migrate()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO trips (id, company_id) VALUES " + ", ".join(f"({i}, NULL)" for i in range(1, 101))))
+
+    step = Backfill("trips", "company_id = 1", where="company_id IS NULL", batch_size=10, pause_seconds=0)
+    migration = Migration(100, "test backfill", [step])
+    calls = []
+    run_transaction = migrate.run_transaction
+
+    def interrupted(statements, params=None):
+        calls.append(params["upper"])
+        if len(calls) == 4:
+            raise RuntimeError("connection lost")
+        run_transaction(statements, params)
+
+    monkeypatch.setattr(migrate, "run_transaction", interrupted)
+    with pytest.raises(RuntimeError):
+        migrate.apply_migration(migration)
+    monkeypatch.setattr(migrate, "run_transaction", run_transaction)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM trips WHERE company_id = 1")).scalar() == 30
+        assert conn.execute(text(
+            "SELECT last_key FROM schema_migration_steps WHERE version = 100 AND step = 0"
+        )).scalar() == 30
+
+    migrate.apply_migration(migration)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM trips WHERE company_id = 1")).scalar() == 100
+    assert 100 in migrate.applied_versions()
+
+
+def test_add_column_is_idempotent_and_reports_foreign_key_locks(empty_database):
+    migrate.migrate()
+    step = AddColumn("trips", "note", "VARCHAR")
+    step.apply(100, 0)
+    step.apply(100, 0)
+    with engine.connect() as conn:
+        assert "note" in {c["name"] for c in inspect(conn).get_columns("trips")}
+        fk = AddColumn("supplier_reports", "route_id", "INTEGER REFERENCES route_geometries(id)").lock_impact(conn)
+        plain = step.lock_impact(conn)
+    assert "route_geometries" in fk and "metadata-only" not in fk
+    assert "metadata-only" in plain
@@ -0,0 +1,143 @@
+"""
+Fleet-scale switch suggestions (POST /optimize/batch): per-row results match
+/optimize, per-option savings add up, trip filters select the right trips,
+and large inputs stream as NDJSON.
+
+Run with: pytest test_optimize_batch.py
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from emissions import EMISSION_FACTORS
+import main
+from models import Company, Trip
+
+ROWS = [
+    {"distance_km": 120.0, "current_vehicle": "diesel", "weight": 1.0},
+    {"distance_km": 80.0, "current_vehicle": "Petrol", "weight": 2.5},
+    {"distance_km": 42.0, "current_vehicle": "electric", "weight": 1.0},
+    {"distance_km": 300.0, "current_vehicle": "diesel", "weight": 12.0},
+]
+
+
+def expected_summary(rows) -> dict:
+    """Per-option totals computed one row at a time"""
+    options = {}
+    current_total = best_total = 0.0
+    for row in rows:
+        load = row["distance_km"] * row["weight"]
+        current = load * EMISSION_FACTORS[row["current_vehicle"].lower()]
+        current_total += current
+        best_total += min([current] + [load * factor for factor in EMISSION_FACTORS.values()])
+        for vehicle, factor in EMISSION_FACTORS.items():
+            saved = current - load * factor
+            if saved > 0:
+                option = options.setdefault((row["current_vehicle"].lower(), vehicle), [0, 0.0])
+                option[0] += 1
+                option[1] += saved
+    return {
+        "total_current_emission": round(current_total, 2),
+        "best_case_emission": round(best_total, 2),
+        "options": {key: (count, round(saved, 2)) for key, (count, saved) in options.items()},
+    }
+
+
+def check_summary(summary: dict, rows):
+    expected = expected_summary(rows)
+    assert summary["rows"] == len(rows)
+    assert summary["total_current_emission"] == pytest.approx(expected["total_current_emission"])
+    assert summary["best_case_emission"] == pytest.approx(expected["best_case_emission"])
+    options = {(o["from_vehicle"], o["to_vehicle"]): (o["rows"], o["co2_saved"]) for o in summary["switch_options"]}
+    assert options == pytest.approx(expected["options"])
+    saved = [o["co2_saved"] for o in summary["switch_options"]]
+    assert saved == sorted(saved, reverse=True)
+
+
+def ndjson(response) -> list:
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_rows_match_single_optimize(client):
+    response = client.post("/optimize/batch", json={"rows": ROWS})
+
+    assert response.status_code == 200
+    body = response.json()
+    for i, (row, result) in enumerate(zip(ROWS, body["rows"])):
+        assert result["row"] == i
+        assert result["current_vehicle"] == row["current_vehicle"].lower()
+        if row["weight"] == 1.0:
+            single = client.post("/optimize", json={
+                "distance_km": row["distance_km"], "current_vehicle": row["current_vehicle"],
+            }).json()
+            assert result["current_emission"] == single["current_emission"]
+            assert result["suggestions"] == single["suggestions"]
+    # Weight scales every emission (Distance × Weight × EmissionFactor)
+    assert body["rows"][3]["current_emission"] == round(300 * 12 * EMISSION_FACTORS["diesel"], 2)
+    assert body["rows"][2]["suggestions"] == []
+    check_summary(body["summary"], ROWS)
+
+
+def test_rows_or_filter_required(client, monkeypatch):
+    assert client.post("/optimize/batch", json={}).status_code == 400
+    assert client.post("/optimize/batch", json={"rows": ROWS, "trip_filter": {}}).status_code == 400
+
+    monkeypatch.setattr(main, "OPTIMIZE_MAX_ROWS", 3)
+    assert client.post("/optimize/batch", json={"rows": ROWS}).status_code == 413
+
+
+def test_trip_filter_selects_matching_trips(client, db):
+    db.add_all([Company(id=1, name="One"), Company(id=2, name="Two")])
+    trips = [
+        (1, "diesel", "Pune", "Mumbai", 150.0, datetime(2026, 3, 1, 9)),
+        (1, "Diesel", "Pune", "Nashik", 210.0, datetime(2026, 3, 2, 9)),
+        (2, "diesel", "Pune", "Mumbai", 150.0, datetime(2026, 3, 2, 23, 59)),
+        (1, "petrol", "Pune", "Mumbai", 150.0, datetime(2026, 3, 3, 0, 0)),
+        (1, "electric", "Pune", "Mumbai", 150.0, datetime(2026, 2, 28, 9)),
+    ]
+    db.add_all([
+        Trip(id=i + 1, company_id=company, vehicle_type=vehicle, start_location=start, end_location=end,
+             distance_km=distance, co2_kg=0.0, created_at=created)
+        for i, (company, vehicle, start, end, distance, created) in enumerate(trips)
+    ])
+    db.commit()
+
+    def trip_ids(**trip_filter) -> list:
+        body = client.post("/optimize/batch", json={"trip_filter": trip_filter}).json()
+        return [row["trip_id"] for row in body["rows"]]
+
+    assert trip_ids() == [1, 2, 3, 4, 5]
+    assert trip_ids(start_date="2026-03-01", end_date="2026-03-02") == [1, 2, 3]
+    assert trip_ids(vehicle_type="DIESEL") == [1, 2, 3]
+    assert trip_ids(company_id=2) == [3]
+    assert trip_ids(start_location="Pune", end_location="Mumbai", vehicle_type="diesel") == [1, 3]
+
+    body = client.post("/optimize/batch", json={"trip_filter": {"end_location": "Nashik"}}).json()
+    assert body["rows"][0]["weight"] == 1.0
+    assert body["rows"][0]["current_emission"] == round(210 * EMISSION_FACTORS["diesel"], 2)
+
+
+def test_stream_flag_returns_ndjson_with_summary_last(client, monkeypatch):
+    monkeypatch.setattr(main, "OPTIMIZE_CHUNK_SIZE", 3)  # rows span several chunks
+    plain = client.post("/optimize/batch", json={"rows": ROWS * 5}).json()
+
+    lines = ndjson(client.post("/optimize/batch", json={"rows": ROWS * 5, "stream": True}))
+
+    assert lines[:-1] == plain["rows"]
+    assert lines[-1] == {"summary": plain["summary"]}
+    check_summary(lines[-1]["summary"], ROWS * 5)
+
+
+def test_streams_above_the_threshold(client):
+    rows = [{"distance_km": 10.0 + i % 50, "current_vehicle": "diesel", "weight": 1.0}
+            for i in range(main.OPTIMIZE_STREAM_THRESHOLD)]
+
+    at_threshold = client.post("/optimize/batch", json={"rows": rows})
+    assert at_threshold.headers["content-type"] == "application/json"
+    assert len(at_threshold.json()["rows"]) == main.OPTIMIZE_STREAM_THRESHOLD
+
+    lines = ndjson(client.post("/optimize/batch", json={"rows": rows + rows[:1]}))
+    assert len(lines) == main.OPTIMIZE_STREAM_THRESHOLD + 2
+    assert lines[-1]["summary"]["rows"] == main.OPTIMIZE_STREAM_THRESHOLD + 1
@@ -0,0 +1,121 @@
+"""
+Encoded polylines and Douglas-Peucker simplification, and the route store
+that keeps both forms.
+
+Run with: pytest test_polyline.py
+"""
+import math
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import RouteGeometry
+import polyline
+import route_cache
+
+# The example from Google's polyline algorithm documentation, as [lng, lat]
+GOOGLE_EXAMPLE = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+GOOGLE_ENCODED = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def road(points: int = 500, seed: int = 1) -> list:
+    """A wiggly route from Pune towards Mumbai"""
+    rng = random.Random(seed)
+    lng, lat = 73.8567, 18.5204
+    coordinates = []
+    for i in range(points):
+        lng -= 0.002 + rng.uniform(-0.0005, 0.0005)
+        lat += 0.001 * math.sin(i / 15) + rng.uniform(-0.0003, 0.0003)
+        coordinates.append([lng, lat])
+    return coordinates
+
+
+def flat(coordinates) -> list:
+    return [value for point in coordinates for value in point]
+
+
+def segment_distance(point, start, end) -> float:
+    (px, py), (ax, ay), (bx, by) = point, start, end
+    dx, dy = bx - ax, by - ay
+    if dx == dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def test_google_reference_example():
+    assert polyline.encode(GOOGLE_EXAMPLE) == GOOGLE_ENCODED
+    assert flat(polyline.decode(GOOGLE_ENCODED)) == pytest.approx(flat(GOOGLE_EXAMPLE))
+
+
+def test_round_trip_keeps_five_decimals():
+    coordinates = road() + [[0.0, 0.0], [-0.00001, 0.00001], [179.99999, -89.99999]]
+    decoded = polyline.decode(polyline.encode(coordinates))
+
+    assert len(decoded) == len(coordinates)
+    for (lng, lat), (decoded_lng, decoded_lat) in zip(coordinates, decoded):
+        assert abs(lng - decoded_lng) <= 0.5e-5 + 1e-12
+        assert abs(lat - decoded_lat) <= 0.5e-5 + 1e-12
+
+
+def test_empty_and_single_point():
+    assert polyline.encode([]) == ""
+    assert polyline.decode("") == []
+    assert polyline.decode(polyline.encode([[72.8777, 19.076]])) == [[72.8777, 19.076]]
+
+
+def test_simplify_keeps_every_point_within_tolerance():
+    coordinates = road()
+    tolerance = 0.0005
+    simplified = polyline.simplify(coordinates, tolerance)
+
+    assert simplified[0] == coordinates[0] and simplified[-1] == coordinates[-1]
+    assert 2 < len(simplified) < len(coordinates) / 3
+    # Kept points are a subsequence of the original, and every point is close to the simplified line
+    positions = [coordinates.index(point) for point in simplified]
+    assert positions == sorted(positions)
+    for (first, last) in zip(positions, positions[1:]):
+        for point in coordinates[first:last + 1]:
+            assert segment_distance(point, coordinates[first], coordinates[last]) <= tolerance + 1e-12
+
+
+def test_simplify_straight_line_and_short_inputs():
+    line = [[72.0 + i * 0.01, 19.0 + i * 0.005] for i in range(50)]
+    assert polyline.simplify(line) == [line[0], line[-1]]
+    assert polyline.simplify(line[:2]) == line[:2]
+    assert polyline.simplify([[1.0, 1.0], [1.0, 1.0], [1.0, 1.0]]) == [[1.0, 1.0], [1.0, 1.0]]
+
+
+def test_simplify_keeps_corners():
+    corner = [[0.0, 0.0], [0.5, 0.0], [1.0, 0.0], [1.0, 0.5], [1.0, 1.0]]
+    assert polyline.simplify(corner, 0.01) == [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0]]
+
+
+@pytest.fixture
+def db():
+    """In-memory database holding only the route store"""
+    engine = create_engine("sqlite://")
+    RouteGeometry.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_route_store_round_trip(db):
+    coordinates = road()
+    lane = (18.5204, 73.8567, 19.076, 72.8777)
+    ids = route_cache.store(db, {lane: (152.0, 3.0, {"type": "LineString", "coordinates": coordinates})})
+    db.commit()
+
+    route = route_cache.get(db, lane)
+    assert ids == {lane: route.id}
+    assert route.point_count == len(coordinates)
+    assert flat(route_cache.geometry(route)["coordinates"]) == pytest.approx(flat(coordinates), abs=1e-5)
+    simplified = route_cache.geometry(route, simplified=True)["coordinates"]
+    assert flat(simplified) == pytest.approx(flat(polyline.simplify(coordinates)), abs=1e-5)
+    assert len(route.simplified_polyline) < len(route.polyline)
+
+    # Storing the lane again resolves to the same row
+    assert route_cache.store(db, {lane: (152.0, 3.0, {"type": "LineString", "coordinates": coordinates})}) == ids
@@ -0,0 +1,156 @@
+"""
+Request profiling: token gating, the X-Profile-Id round trip, the profile
+store, speedscope export and the cap on sampled profiles.
+
+Profiled routes are decided when a route is built, so most tests build a small
+app on ProfiledRoute after configuring profiling.py.
+
+Run with: pytest test_profiling.py
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+
+TOKEN = "test-profile-token"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = profiling.ProfileStore(tmp_path, max_files=10)
+    monkeypatch.setattr(profiling, "store", store)
+    yield store
+    store._executor.shutdown(wait=True)
+
+
+def flush(store: profiling.ProfileStore):
+    """Wait for profiles already handed to the store thread"""
+    store._executor.submit(lambda: None).result()
+
+
+def profiled_app() -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = profiling.ProfiledRoute
+
+    @app.get("/work")
+    def work():
+        time.sleep(0.05)
+        return {"ok": True}
+
+    @app.get("/wait")
+    async def wait():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    return app
+
+
+def finished_profile(route: str = "/work") -> profiling.Profile:
+    profile = profiling.Profile("GET", route, route, "header")
+    profile.start()
+    profile.stop(200)
+    profile.join()
+    return profile
+
+
+def test_profile_endpoints_need_the_token(client, store, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKEN", "")
+    assert client.get("/profiles").status_code == 404
+
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKEN", TOKEN)
+    assert client.get("/profiles").status_code == 403
+    assert client.get("/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    assert client.get("/profiles/20260101-000000000-abcdef12").status_code == 403
+    response = client.get("/profiles", headers={"X-Profile-Token": TOKEN})
+    assert response.status_code == 200 and response.json() == []
+
+
+def test_token_header_profiles_the_request(client, store, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKEN", TOKEN)
+    app = TestClient(profiled_app())
+
+    assert "X-Profile-Id" not in app.get("/work").headers
+    assert "X-Profile-Id" not in app.get("/work", headers={"X-Profile-Token": "wrong"}).headers
+    response = app.get("/work", headers={"X-Profile-Token": TOKEN})
+    profile_id = response.headers["X-Profile-Id"]
+    flush(store)
+
+    # Listed and downloadable through the API, sleeping under the threadpool marker
+    headers = {"X-Profile-Token": TOKEN}
+    listed = client.get("/profiles", headers=headers).json()
+    assert [summary["id"] for summary in listed] == [profile_id]
+    assert listed[0]["route"] == "/work" and listed[0]["trigger"] == "header" and listed[0]["samples"] > 0
+    collapsed = client.get(f"/profiles/{profile_id}", headers=headers).text
+    assert all(line.startswith("GET /work;") for line in collapsed.splitlines())
+    assert any(";threadpool;" in line and "work (" in line for line in collapsed.splitlines())
+    exported = client.get(f"/profiles/{profile_id}", params={"format": "speedscope"}, headers=headers).json()
+    assert exported["profiles"][0]["name"] == "GET /work"
+    assert client.get("/profiles/not-an-id", headers=headers).status_code == 404
+
+
+def test_store_keeps_the_newest_profiles(tmp_path):
+    store = profiling.ProfileStore(tmp_path, max_files=2)
+    profiles = []
+    for _ in range(3):
+        profiles.append(finished_profile())
+        time.sleep(0.002)  # ids sort by start time, to the millisecond
+    for profile in profiles:
+        store.save(profile)
+    flush(store)
+
+    assert [summary["id"] for summary in store.list()] == [profiles[2].id, profiles[1].id]
+    assert store.load(profiles[0].id) is None
+    assert not (tmp_path / f"{profiles[0].id}.collapsed").exists()
+    assert store.list(route="/elsewhere") == []
+    store._executor.shutdown(wait=True)
+
+
+def test_speedscope_weights_samples_in_milliseconds():
+    summary = {"id": "p", "method": "GET", "path": "/work", "route": "/work", "duration_ms": 30.0, "samples": 6}
+    collapsed = "GET /work;threadpool;a;b 4\nGET /work;threadpool;a 2\n"
+
+    exported = profiling.speedscope(summary, collapsed)
+    frames = [frame["name"] for frame in exported["shared"]["frames"]]
+    profile = exported["profiles"][0]
+
+    assert frames == ["GET /work", "threadpool", "a", "b"]
+    assert profile["samples"] == [[0, 1, 2, 3], [0, 1, 2]]
+    assert profile["weights"] == [20.0, 10.0]
+    assert profile["endValue"] == 30.0 and profile["unit"] == "milliseconds"
+    assert profiling.speedscope(dict(summary, samples=0), "")["profiles"][0]["samples"] == []
+
+
+def test_sampled_profiles_are_capped(store, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKEN", "")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiling, "PROFILE_MAX_SAMPLED", 1)
+    app = profiled_app()
+
+    async def concurrent():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(http.get("/wait") for _ in range(3)))
+
+    responses = asyncio.run(concurrent())
+    flush(store)
+
+    assert all(response.status_code == 200 for response in responses)
+    assert [summary["trigger"] for summary in store.list()] == ["sampled"]
+    assert profiling._sampled_running == 0
+
+
+def test_stop_does_not_wait_for_the_sampler(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 500)
+    profile = profiling.Profile("GET", "/work", "/work", "header")
+    profile.start()
+
+    started = time.perf_counter()
+    profile.stop(200)
+    assert time.perf_counter() - started < 0.1
+    profile.join(timeout=2)
+    assert not profile._thread.is_alive()
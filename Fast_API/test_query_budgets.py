@@ -0,0 +1,100 @@
+"""
+Query budgets (query_audit.QUERY_BUDGETS) enforced on real requests.
+
+Every budgeted endpoint is called through the app with every request audited
+and QUERY_BUDGET_ENFORCE on, the way the benchmark suite runs, on a database
+built by migrate.py.
+
+Run with: pytest test_query_budgets.py
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+from models import Company
+import query_audit
+import throttle
+
+TRIP = {"vehicle_type": "diesel", "start_location": "Pune", "end_location": "Mumbai", "distance_km": 150}
+GPS = {"vehicle_id": "MH12-1", "latitude": 18.5, "longitude": 73.8, "distance_segment": 0.5}
+REPORT = {
+    "supplier_name": "Acme", "start_lat": 18.5, "start_lng": 73.8, "end_lat": 19.0, "end_lng": 72.8,
+    "reported_distance": 150, "reported_time": 3, "vehicle_type": "diesel", "weight": 10,
+}
+TRUCK = {"truck_id": "MH12-1", "driver_name": "Asha", "start_lat": 18.5, "start_lng": 73.8,
+         "end_lat": 19.0, "end_lng": 72.8}
+
+# "METHOD /route/template" -> (path, json body)
+REQUESTS = {
+    "POST /trips": ("/trips", TRIP),
+    "POST /gps/update": ("/gps/update", GPS),
+    "GET /gps/live/{vehicle_id}": ("/gps/live/MH12-1", None),
+    "GET /stats/summary": ("/stats/summary", None),
+    "GET /footprint/daily": ("/footprint/daily", None),
+    "GET /footprint/daily/trend": ("/footprint/daily/trend", None),
+    "GET /footprint/monthly": ("/footprint/monthly", None),
+    "GET /footprint/daily/all": ("/footprint/daily/all", None),
+    "GET /footprint/monthly/all": ("/footprint/monthly/all", None),
+    "GET /insights/summary": ("/insights/summary", None),
+    "GET /trips/recent": ("/trips/recent", None),
+    "GET /charts/routes": ("/charts/routes", None),
+    "GET /charts/vehicles": ("/charts/vehicles", None),
+    "GET /trucks": ("/trucks", None),
+    "GET /trucks/{truck_id}": ("/trucks/MH12-1", None),
+    "POST /supplier/report": ("/supplier/report", REPORT),
+    "GET /supplier/reports/status": ("/supplier/reports/status?ids=1", None),
+    "GET /carbon-credits/{company_id}": ("/carbon-credits/1", None),
+}
+
+
+@pytest.fixture
+def audited(migrated_db, monkeypatch):
+    """Client on a migrated database with every request audited and budgets enforced"""
+    if not metrics.METRICS_ENABLED:
+        pytest.skip("query budgets need METRICS_ENABLED")
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", False)
+    monkeypatch.setattr(query_audit, "QUERY_AUDIT_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(query_audit, "QUERY_BUDGET_ENFORCE", True)
+    monkeypatch.setattr(query_audit, "violations", [])
+    client = TestClient(main.app)
+    # Data for the lookups, so they take their normal path rather than a 404
+    assert client.post("/trucks", json=TRUCK).status_code == 200
+    return client
+
+
+def send(client, endpoint: str):
+    method = endpoint.split(" ", 1)[0]
+    path, body = REQUESTS[endpoint]
+    return client.request(method, path, json=body)
+
+
+def test_every_budget_is_exercised():
+    assert set(REQUESTS) == set(query_audit.QUERY_BUDGETS)
+
+
+def test_budgeted_endpoints_stay_within_budget(audited):
+    for _ in range(2):  # second round on warm data (existing trip, GPS point, report)
+        for endpoint in REQUESTS:
+            response = send(audited, endpoint)
+            assert response.status_code < 400, (endpoint, response.text)
+    assert query_audit.violations == []
+
+
+def test_overrun_fails_the_request(audited, monkeypatch):
+    monkeypatch.setitem(query_audit.QUERY_BUDGETS, "GET /trips/recent", 0)
+    with pytest.raises(query_audit.QueryBudgetExceeded, match="budget 0"):
+        send(audited, "GET /trips/recent")
+    assert query_audit.violations == [{"endpoint": "GET /trips/recent", "statements": 1, "budget": 0}]
+
+
+def test_trips_credit_the_migrated_default_company(audited, migrated_db):
+    send(audited, "POST /trips")
+    migrated_db.expire_all()
+    assert migrated_db.get(Company, 1).carbon_credits == pytest.approx(150)  # diesel earns 1 credit/km
+
+
+def test_trips_need_the_default_company(client):
+    # Schema without migrate.py's seed rows
+    response = client.post("/trips", json=TRIP)
+    assert response.status_code == 503
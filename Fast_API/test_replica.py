@@ -0,0 +1,147 @@
+"""
+Read-replica routing: lag measurement from the heartbeat, the primary/replica
+decision, and read-your-writes through the last_write cookie.
+
+Run with: pytest test_replica.py
+"""
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+
+import database
+from database import Base, ReplicaState, engine
+from models import Company, ReplicaHeartbeat
+import replica
+import throttle
+
+
+@pytest.fixture
+def replica_engine(db, tmp_path, monkeypatch):
+    """A second SQLite file standing in for the read replica, with fresh replica state"""
+    read_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    ReplicaHeartbeat.__table__.create(read_engine)
+    for module in (database, replica):
+        monkeypatch.setattr(module, "read_engine", read_engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", database.sessionmaker(bind=read_engine))
+    monkeypatch.setattr(database, "replica_state", ReplicaState())
+    monkeypatch.setattr(replica, "_last_beat", None)
+    yield read_engine
+    read_engine.dispose()
+
+
+def replicate(read_engine):
+    """Copy the primary's heartbeat to the replica, as replication would"""
+    with engine.connect() as conn:
+        beat = conn.execute(select(ReplicaHeartbeat.beat_at)).scalar()
+    with read_engine.begin() as conn:
+        conn.execute(ReplicaHeartbeat.__table__.delete())
+        conn.execute(ReplicaHeartbeat.__table__.insert().values(id=1, beat_at=beat))
+    return beat
+
+
+def test_without_a_replica_reads_use_the_primary():
+    assert not replica.enabled()
+    assert database.read_target() == ("primary", "no_replica")
+
+
+def test_read_target_reasons(replica_engine):
+    state = database.replica_state
+    assert database.read_target() == ("primary", "replica_unavailable")
+
+    state.lag, state.visible_at = database.REPLICA_MAX_LAG_SECONDS + 1, 1000.0
+    assert database.read_target() == ("primary", "replica_lagging")
+
+    state.lag = 0.0
+    assert database.read_target() == ("replica", "replica")
+    assert database.read_target(last_write=999.0) == ("replica", "replica")
+    assert database.read_target(last_write=1000.0) == ("primary", "read_your_writes")
+
+
+def test_check_measures_lag_from_the_heartbeat(replica_engine):
+    state = database.replica_state
+
+    replica.check()  # nothing replicated yet
+    assert state.lag is None
+
+    beat = replicate(replica_engine)
+    time.sleep(0.05)
+    replica.check()  # replica has caught up with the last beat
+    assert state.lag == 0.0 and state.visible_at == beat
+
+    replica.check()  # the beat written 0.05s after the replicated one never arrived
+    assert state.lag >= 0.05 and state.visible_at == beat
+
+
+def test_check_with_an_unreachable_replica(replica_engine, tmp_path, monkeypatch):
+    database.replica_state.lag = 0.0
+    monkeypatch.setattr(replica, "read_engine", create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"))
+
+    replica.check()
+
+    assert database.replica_state.lag is None
+    assert database.read_target() == ("primary", "replica_unavailable")
+
+
+def test_reads_after_a_write_go_to_the_primary(replica_engine):
+    app = FastAPI()
+    app.add_middleware(replica.ReadYourWritesMiddleware)
+
+    @app.post("/write")
+    def write():
+        return {}
+
+    @app.post("/reject", status_code=409)
+    def reject():
+        return {}
+
+    @app.get("/read")
+    def read(db=Depends(database.get_read_db)):
+        return {"replica": db.get_bind() is replica_engine}
+
+    client = TestClient(app)
+    state = database.replica_state
+    state.lag, state.visible_at = 0.0, time.time() - 1
+
+    assert client.get("/read").json() == {"replica": True}
+    assert database.LAST_WRITE_COOKIE not in client.get("/read").cookies
+    assert database.LAST_WRITE_COOKIE not in client.post("/reject").cookies
+
+    assert database.LAST_WRITE_COOKIE in client.post("/write").cookies
+    assert client.get("/read").json() == {"replica": False}
+
+    state.visible_at = time.time() + 1  # replica replayed past the write
+    assert client.get("/read").json() == {"replica": True}
+    assert state.routed[("primary", "read_your_writes")] == 1
+    assert state.routed[("replica", "replica")] == 3
+
+
+def test_dashboard_cookie_round_trip(db, replica_engine, monkeypatch):
+    """A browser on the dashboard origin, through the app's own CORS and read routing"""
+    import main
+
+    Base.metadata.create_all(replica_engine)  # a replica that hasn't replayed anything yet
+    db.add(Company(id=1, name="Default Company", carbon_credits=0.0))
+    db.commit()
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", False)
+    state = database.replica_state
+    state.lag, state.visible_at = 0.0, time.time() - 1
+
+    # main.py adds the middleware only when READ_DATABASE_URL is set at import
+    browser = TestClient(replica.ReadYourWritesMiddleware(main.app))
+    origin = {"Origin": "http://localhost:5173"}
+    trip = {"vehicle_type": "diesel", "start_location": "Pune", "end_location": "Mumbai", "distance_km": 150}
+
+    written = browser.post("/trips", json=trip, headers=origin)
+    assert written.status_code == 200
+    # Without allow-credentials the browser would drop the cookie (fetch with credentials: "include")
+    assert written.headers["access-control-allow-origin"] == origin["Origin"]
+    assert written.headers["access-control-allow-credentials"] == "true"
+    assert database.LAST_WRITE_COOKIE in browser.cookies
+
+    assert len(browser.get("/trips/recent", headers=origin).json()) == 1  # primary
+    other = TestClient(main.app)
+    assert other.get("/trips/recent").json() == []  # no cookie: the stale replica
+    assert state.routed[("primary", "read_your_writes")] == 1
@@ -0,0 +1,203 @@
+"""
+Offline road graph: GraphML parsing, speeds, CSR arrays, the .npy cache, and
+A* against a plain Dijkstra.
+
+Run with: pytest test_road_graph.py
+"""
+import heapq
+import math
+import os
+
+import numpy as np
+import pytest
+
+import road_graph
+from road_graph import RoadGraph, build_csr, read_graphml
+
+GRAPHML = """<?xml version="1.0" encoding="utf-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+  <key id="d0" for="node" attr.name="y" attr.type="string"/>
+  <key id="d1" for="node" attr.name="x" attr.type="string"/>
+  <key id="d2" for="edge" attr.name="length" attr.type="string"/>
+  <key id="d3" for="edge" attr.name="highway" attr.type="string"/>
+  <key id="d4" for="edge" attr.name="maxspeed" attr.type="string"/>
+  <graph edgedefault="{edgedefault}">
+    <node id="101"><data key="d0">18.50</data><data key="d1">73.80</data></node>
+    <node id="102"><data key="d0">18.51</data><data key="d1">73.80</data></node>
+    <node id="103"><data key="d0">18.51</data><data key="d1">73.81</data></node>
+    <edge source="101" target="102"><data key="d2">1200.5</data><data key="d3">primary</data></edge>
+    <edge source="102" target="103"><data key="d3">residential</data><data key="d4">['50', '60']</data></edge>
+    <edge source="101" target="103"><data key="d2">1600</data><data key="d3">motorway_link</data></edge>
+  </graph>
+</graphml>
+"""
+
+
+def write_graphml(path, edgedefault: str = "directed"):
+    path.write_text(GRAPHML.format(edgedefault=edgedefault))
+    return path
+
+
+def dijkstra(graph: RoadGraph, source: int) -> list:
+    """Fastest travel time from source to every node"""
+    best = [math.inf] * graph.num_nodes
+    best[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        time_s, node = heapq.heappop(heap)
+        if time_s > best[node]:
+            continue
+        for k in range(graph.indptr[node], graph.indptr[node + 1]):
+            candidate = time_s + float(graph.edge_time_s[k])
+            neighbour = int(graph.indices[k])
+            if candidate < best[neighbour]:
+                best[neighbour] = candidate
+                heapq.heappush(heap, (candidate, neighbour))
+    return best
+
+
+def edge(graph: RoadGraph, u: int, v: int) -> int:
+    for k in range(graph.indptr[u], graph.indptr[u + 1]):
+        if graph.indices[k] == v:
+            return k
+    raise AssertionError(f"no edge {u} -> {v}")
+
+
+def random_graph(size: int, seed: int) -> RoadGraph:
+    """Jittered one-way grid with random speeds and lengths at or above the straight line"""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lat = 18.0 + rows * 0.01 + rng.normal(0, 0.002, size * size)
+    lon = 73.0 + cols * 0.01 + rng.normal(0, 0.002, size * size)
+    ids = np.arange(size * size).reshape(size, size)
+    pairs = np.concatenate([
+        np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1),
+        np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1),
+    ])
+    pairs = np.concatenate([pairs, pairs[:, ::-1]])
+    pairs = pairs[rng.random(len(pairs)) > 0.15]
+    u, v = pairs[:, 0], pairs[:, 1]
+    straight = road_graph._haversine_km_array(lat[u], lon[u], lat[v], lon[v]) * 1000
+    length = straight * rng.uniform(1.0, 1.6, len(u))
+    speed = rng.choice([30.0, 50.0, 80.0], len(u))
+    return RoadGraph(build_csr(lat, lon, u, v, length, speed))
+
+
+@pytest.mark.parametrize("maxspeed, highway, expected", [
+    ("50", "primary", 50),
+    ("['50', '60']", "primary", 50),
+    ("30 mph", "primary", 30 * 1.609),
+    ("", "primary", 65),
+    ("signals", "secondary", 55),
+    ("", "motorway_link", 100 * road_graph.LINK_SPEED_FACTOR),
+    ("", "['residential', 'service']", 30),
+    ("", "track", road_graph.DEFAULT_SPEED_KMH),
+    ("0", "", road_graph.DEFAULT_SPEED_KMH),
+])
+def test_parse_speed(maxspeed, highway, expected):
+    assert road_graph._parse_speed_kmh(maxspeed, highway) == pytest.approx(expected)
+
+
+def test_read_graphml(tmp_path):
+    node_lat, node_lon, sources, targets, length_m, speed_kmh = read_graphml(write_graphml(tmp_path / "g.graphml"))
+
+    assert node_lat.tolist() == [18.50, 18.51, 18.51]
+    assert node_lon.tolist() == [73.80, 73.80, 73.81]
+    assert list(zip(sources.tolist(), targets.tolist())) == [(0, 1), (1, 2), (0, 2)]
+    # The edge without a length gets the straight-line distance between its nodes
+    assert length_m[0] == 1200.5 and length_m[2] == 1600
+    assert length_m[1] == pytest.approx(road_graph._haversine_km(18.51, 73.80, 18.51, 73.81) * 1000)
+    assert speed_kmh.tolist() == pytest.approx([65, 50, 75])
+
+
+def test_undirected_graphml_adds_both_directions(tmp_path):
+    _, _, sources, targets, length_m, _ = read_graphml(write_graphml(tmp_path / "g.graphml", "undirected"))
+
+    pairs = list(zip(sources.tolist(), targets.tolist()))
+    assert len(pairs) == 6 and (1, 0) in pairs and (2, 0) in pairs
+    assert length_m[pairs.index((1, 0))] == 1200.5
+
+
+def test_build_csr():
+    arrays = build_csr(
+        [0.0, 0.0, 0.0], [0.0, 0.1, 0.2],
+        np.array([2, 0, 1, 0]), np.array([0, 2, 2, 1]),
+        [100.0, 200.0, 300.0, 400.0], [36.0, 72.0, 0.0, 36.0],
+    )
+    assert arrays["indptr"].tolist() == [0, 2, 3, 4]
+    assert arrays["indices"].tolist() == [2, 1, 2, 0]
+    assert arrays["edge_length_m"].tolist() == [200.0, 400.0, 300.0, 100.0]
+    # m / (km/h / 3.6); speeds below 1 km/h count as 1
+    assert arrays["edge_time_s"].tolist() == pytest.approx([10.0, 40.0, 1080.0, 10.0])
+
+
+def test_cache_is_reused_until_the_source_changes(tmp_path, monkeypatch):
+    source = write_graphml(tmp_path / "g.graphml")
+    graph = RoadGraph.from_file(source)
+    assert graph.num_nodes == 3 and graph.num_edges == 3
+    assert isinstance(graph.indices, np.memmap)
+
+    def fail(path):
+        raise AssertionError("cache should have been used")
+
+    monkeypatch.setattr(road_graph, "read_graphml", fail)
+    RoadGraph.from_file(source)
+    assert RoadGraph.from_file(RoadGraph.cache_dir_for(source)).num_edges == 3
+
+    # A changed source (or cache format) is preprocessed again
+    monkeypatch.undo()
+    write_graphml(source, "undirected")
+    stat = source.stat()
+    os.utime(source, (stat.st_atime, stat.st_mtime + 10))
+    assert RoadGraph.from_file(source).num_edges == 6
+
+    monkeypatch.setattr(road_graph, "CACHE_VERSION", road_graph.CACHE_VERSION + 1)
+    calls = []
+    monkeypatch.setattr(road_graph, "read_graphml", lambda path: calls.append(path) or read_graphml(path))
+    RoadGraph.from_file(source)
+    assert calls == [source]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_a_star_matches_dijkstra(seed):
+    graph = random_graph(8, seed)
+    rng = np.random.default_rng(seed)
+    for source in rng.choice(graph.num_nodes, 6, replace=False).tolist():
+        expected = dijkstra(graph, source)
+        for target in range(graph.num_nodes):
+            result = graph.shortest_path(source, target)
+            if math.isinf(expected[target]):
+                assert result is None
+                continue
+            path, length_m, time_s = result
+            assert path[0] == source and path[-1] == target
+            assert time_s == pytest.approx(expected[target])
+            ks = [edge(graph, u, v) for u, v in zip(path, path[1:])]
+            assert time_s == pytest.approx(sum(float(graph.edge_time_s[k]) for k in ks))
+            assert length_m == pytest.approx(sum(float(graph.edge_length_m[k]) for k in ks), rel=1e-6)
+
+
+def test_a_star_stays_exact_with_lengths_below_the_straight_line():
+    # 0 -> 2 is a 10 km road; 0 -> 1 -> 2 detours via node 1, whose second edge
+    # claims 100 m for about 11 km of straight line (bad OSM data)
+    lat = [18.0, 18.0, 18.0]
+    lon = [73.0, 72.99, 73.0 + 10 / 105.6]
+    graph = RoadGraph(build_csr(lat, lon, np.array([0, 0, 1]), np.array([2, 1, 2]),
+                                [10000.0, 1060.0, 100.0], [50.0, 50.0, 50.0]))
+
+    path, _, time_s = graph.shortest_path(0, 2)
+
+    assert path == [0, 1, 2]
+    assert time_s == pytest.approx(dijkstra(graph, 0)[2])
+
+
+def test_route_snaps_ends_and_reports_km_and_hours(tmp_path):
+    graph = RoadGraph.from_file(write_graphml(tmp_path / "g.graphml"))
+
+    distance_km, duration_hours, geometry = graph.route(18.5001, 73.8001, 18.5099, 73.8099)
+    assert distance_km == pytest.approx(1.6)
+    assert duration_hours == pytest.approx(1.6 / 75)
+    assert geometry["coordinates"] == [[73.80, 18.50], [73.81, 18.51]]
+
+    assert graph.route(18.51, 73.81, 18.50, 73.80) is None  # one-way roads only
+    assert graph.route(19.5, 73.8, 18.51, 73.81) is None  # too far from the network
@@ -0,0 +1,267 @@
+"""
+Routing provider tests against a local stub Directions server.
+
+The stub speaks just enough of the Mapbox Directions API for
+`routing.get_mapbox_route_data` and can inject latency and HTTP errors.
+
+Run with: pytest test_routing.py  (or python test_routing.py)
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import routing
+
+
+class StubDirectionsServer:
+    """Threaded HTTP server returning a fixed route, with injectable latency/errors"""
+
+    def __init__(self):
+        self.latency_seconds = 0.0
+        self.error_status = None
+        self.error_headers = {}
+        self.requests_served = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests_served += 1
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                try:
+                    if stub.latency_seconds:
+                        time.sleep(stub.latency_seconds)
+                    if stub.error_status:
+                        body = b'{"message": "injected error"}'
+                        self.send_response(stub.error_status)
+                        for name, value in stub.error_headers.items():
+                            self.send_header(name, value)
+                    else:
+                        body = json.dumps({
+                            "routes": [{
+                                "distance": 152000,
+                                "duration": 10800,
+                                "geometry": {"type": "LineString", "coordinates": [[73.8, 18.5], [72.8, 19.0]]},
+                            }]
+                        }).encode()
+                        self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (timeout test)
+                    pass
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def configure(monkeypatch, stub: StubDirectionsServer, timeout: float = 2.0, concurrency: int = 4, failures: int = 3):
+    """Point routing at the stub; monkeypatch restores everything after the test"""
+    monkeypatch.setenv("MAPBOX_TOKEN", "stub-token")
+    monkeypatch.setattr(routing, "MAPBOX_BASE_URL", stub.url)
+    monkeypatch.setattr(routing, "ROUTING_TIMEOUT_SECONDS", timeout)
+    monkeypatch.setattr(routing, "ROUTING_MAX_CONCURRENCY", concurrency)
+    monkeypatch.setattr(routing, "breaker", routing.CircuitBreaker(failure_threshold=failures, reset_seconds=60))
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await routing.close_http_client()
+    return asyncio.run(wrapper())
+
+
+def test_route_from_stub(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub)
+        distance_km, duration_hours, geometry = run(routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8))
+        assert distance_km == 152.0
+        assert duration_hours == 3.0
+        assert geometry["type"] == "LineString"
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, concurrency=4)
+        stub.latency_seconds = 0.1
+
+        async def burst():
+            return await asyncio.gather(*[
+                routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8) for _ in range(20)
+            ])
+
+        results = run(burst())
+        assert len(results) == 20
+        assert stub.max_in_flight <= 4
+
+
+def test_errors_fall_back_and_open_breaker(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=3)
+        stub.error_status = 503
+
+        async def calls():
+            return [await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8) for _ in range(10)]
+
+        results = run(calls())
+        # Every call still answers, via the straight-line fallback
+        assert all(geometry is None for _, _, geometry in results)
+        # Only the calls before the breaker opened reached the server
+        assert stub.requests_served == 3
+        assert routing.breaker.state == "open"
+
+
+def test_open_breaker_skips_timeouts(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, timeout=0.2, failures=2)
+        stub.latency_seconds = 1.0
+
+        async def calls():
+            started = time.perf_counter()
+            for _ in range(10):
+                await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+            return time.perf_counter() - started
+
+        elapsed = run(calls())
+        # Two timeouts, then eight immediate fallbacks
+        assert elapsed < 1.0
+
+
+def test_half_open_trial_closes_breaker(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=1)
+        routing.breaker.reset_seconds = 0.05
+        stub.error_status = 500
+
+        async def calls():
+            await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+            assert routing.breaker.state == "open"
+            stub.error_status = None
+            await asyncio.sleep(0.1)
+            return await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+
+        distance_km, _, geometry = run(calls())
+        assert distance_km == 152.0 and geometry is not None
+        assert routing.breaker.state == "closed"
+
+
+def test_client_errors_do_not_open_breaker(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=2)
+        stub.error_status = 422  # e.g. coordinates Mapbox can't route
+
+        async def calls():
+            return [await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8) for _ in range(5)]
+
+        results = run(calls())
+        assert all(geometry is None for _, _, geometry in results)
+        assert stub.requests_served == 5
+        assert routing.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("status", [408, 429])
+def test_throttling_counts_as_failure(monkeypatch, status):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=2)
+        stub.error_status = status
+
+        async def calls():
+            return [await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8) for _ in range(5)]
+
+        run(calls())
+        assert stub.requests_served == 2
+        assert routing.breaker.state == "open"
+
+
+def test_retry_after_holds_the_breaker_open(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=5)
+        stub.error_status = 429
+        stub.error_headers = {"Retry-After": "1"}
+
+        async def calls():
+            await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+            # Opened on the first 429, for as long as Mapbox asked rather than reset_seconds
+            assert routing.breaker.state == "open"
+            assert routing.breaker.open_seconds == 1.0
+            await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+            assert stub.requests_served == 1
+            stub.error_status = None
+            await asyncio.sleep(1.05)
+            return await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+
+        distance_km, _, geometry = run(calls())
+        assert distance_km == 152.0 and geometry is not None
+        assert routing.breaker.state == "closed"
+
+
+def test_retry_after_formats():
+    class Response:
+        def __init__(self, value):
+            self.headers = {"retry-after": value} if value is not None else {}
+
+    assert routing._retry_after(Response("12")) == 12.0
+    assert routing._retry_after(Response(None)) is None
+    assert routing._retry_after(Response("soon")) is None
+    assert routing._retry_after(Response("Wed, 21 Oct 2015 07:28:00 GMT")) == 0.0
+    later = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 120))
+    assert 100 < routing._retry_after(Response(later)) <= 120
+
+
+def test_cancelled_trial_frees_the_slot(monkeypatch):
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub, failures=1)
+        routing.breaker.reset_seconds = 0.05
+        stub.error_status = 500
+
+        async def calls():
+            await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+            await asyncio.sleep(0.1)
+            stub.error_status = None
+            stub.latency_seconds = 1.0
+            trial = asyncio.create_task(routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8))
+            await asyncio.sleep(0.1)
+            assert routing.breaker.trial_in_flight
+            trial.cancel()
+            await asyncio.gather(trial, return_exceptions=True)
+            stub.latency_seconds = 0.0
+            return await routing.get_mapbox_route_data(18.5, 73.8, 19.0, 72.8)
+
+        distance_km, _, geometry = run(calls())
+        assert distance_km == 152.0 and geometry is not None
+        assert routing.breaker.state == "closed"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,141 @@
+"""
+What-if scenarios: rule evaluation and the incremental trip snapshot.
+
+Run with: pytest test_scenarios.py
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from models import Trip
+import scenarios
+from scenarios import TripColumns
+
+
+def add_trip(db, vehicle: str, start: str, end: str, distance: float, co2: float, day: int = 1, **fields):
+    trip = Trip(vehicle_type=vehicle, start_location=start, end_location=end, distance_km=distance,
+                co2_kg=co2, company_id=1, created_at=datetime(2026, 3, day), **fields)
+    db.add(trip)
+    db.commit()
+    return trip
+
+
+def evaluate(db, rules: list, **kwargs) -> dict:
+    snapshot = TripColumns()
+    snapshot.refresh(db)
+    return scenarios.evaluate(*snapshot.snapshot(), rules, **kwargs)
+
+
+def test_route_names_match_the_charts(migrated_db):
+    add_trip(migrated_db, "diesel", "Pune", "Mumbai", 150, 100)
+    add_trip(migrated_db, "diesel", "Delhi", "Agra", 200, 300)
+
+    routes = migrated_db.execute(text(
+        "SELECT DISTINCT coalesce(start_location, '') || ' - ' || coalesce(end_location, '') FROM trips"
+    )).scalars().all()
+    result = evaluate(migrated_db, [{"from_vehicle": "diesel", "to_vehicle": "electric", "routes": ["Pune - Mumbai"]}])
+
+    assert sorted(route["route"] for route in result["top_routes"]) == sorted(routes)
+    assert result["rules"][0]["matched_trips"] == 1
+    assert result["co2_delta_kg"] == pytest.approx(100 * (0.02 / 0.27 - 1), abs=0.01)
+
+
+def test_rules_apply_in_order_to_what_is_left(migrated_db):
+    for _ in range(4):
+        add_trip(migrated_db, "diesel", "A", "B", 100, 27)
+
+    result = evaluate(migrated_db, [
+        {"from_vehicle": "diesel", "to_vehicle": "electric", "share": 0.5},
+        {"from_vehicle": "diesel", "to_vehicle": "petrol", "share": 0.5},
+    ])
+
+    first, second = result["rules"]
+    assert first["converted_trips"] == 2.0
+    assert second["converted_trips"] == 1.0  # half of the two trips still on diesel
+    assert first["co2_delta_kg"] == pytest.approx(2 * 27 * (0.02 / 0.27 - 1), abs=0.01)
+    assert second["co2_delta_kg"] == pytest.approx(27 * (0.24 / 0.27 - 1), abs=0.01)
+    assert result["credits_delta"] == pytest.approx(2 * 100 * (10 - 1) + 100 * (3 - 1))
+
+
+def test_distance_bands_top_routes_and_scope(migrated_db):
+    add_trip(migrated_db, "diesel", "A", "B", 50, 10, day=1)
+    add_trip(migrated_db, "diesel", "A", "B", 500, 100, day=2)
+    add_trip(migrated_db, "diesel", "C", "D", 500, 500, day=3)
+
+    banded = evaluate(migrated_db, [{"from_vehicle": "diesel", "to_vehicle": "electric", "min_distance_km": 100}])
+    top = evaluate(migrated_db, [{"from_vehicle": "diesel", "to_vehicle": "electric", "top_routes": 1}])
+    scoped = evaluate(migrated_db, [{"from_vehicle": "diesel", "to_vehicle": "electric"}],
+                      start_date=datetime(2026, 3, 2).date(), end_date=datetime(2026, 3, 2).date())
+
+    assert banded["rules"][0]["matched_trips"] == 2
+    assert top["rules"][0]["matched_trips"] == 1 and top["top_routes"][0]["route"] == "C - D"
+    assert scoped["trips"] == 1 and scoped["baseline_co2_kg"] == 100
+    assert [point["period"] for point in banded["series"]] == ["2026-03-01", "2026-03-02", "2026-03-03"]
+
+
+def test_refresh_appends_inserts_and_reloads_on_changes(migrated_db):
+    snapshot = TripColumns()
+    add_trip(migrated_db, "diesel", "A", "B", 100, 27)
+    assert snapshot.refresh(migrated_db) is False
+    assert snapshot.refresh(migrated_db) is True
+
+    add_trip(migrated_db, "electric", "A", "B", 100, 2)
+    loaded_at = snapshot.loaded_at
+    assert snapshot.refresh(migrated_db) is False
+    assert snapshot.loaded_at == loaded_at  # appended, not reloaded
+    assert snapshot.row_count == 2
+
+    migrated_db.execute(text("UPDATE trips SET co2_kg = 50 WHERE vehicle_type = 'diesel'"))
+    migrated_db.commit()
+    assert snapshot.refresh(migrated_db) is False
+    assert sorted(snapshot.columns["co2_kg"].tolist()) == [2.0, 50.0]
+
+    migrated_db.execute(text("DELETE FROM trips WHERE vehicle_type = 'electric'"))
+    migrated_db.commit()
+    add_trip(migrated_db, "petrol", "A", "B", 100, 24)
+    assert snapshot.refresh(migrated_db) is False
+    assert sorted(snapshot.columns["co2_kg"].tolist()) == [24.0, 50.0]
+
+
+def test_refresh_reloads_trips_committed_below_the_snapshot(migrated_db):
+    snapshot = TripColumns()
+    add_trip(migrated_db, "diesel", "A", "B", 100, 27, id=10)
+    snapshot.refresh(migrated_db)
+
+    # A transaction that took a lower id but committed after the snapshot
+    add_trip(migrated_db, "diesel", "A", "B", 100, 30, id=5)
+    assert snapshot.refresh(migrated_db) is False
+    assert sorted(snapshot.columns["id"].tolist()) == [5, 10]
+    assert sorted(snapshot.gaps) == [1, 2, 3, 4, 6, 7, 8, 9]
+
+
+def test_missing_ids_are_given_up_on(migrated_db, monkeypatch):
+    monkeypatch.setattr(scenarios, "TRIP_ID_GAP_SECONDS", 0)
+    snapshot = TripColumns()
+    add_trip(migrated_db, "diesel", "A", "B", 100, 27, id=3)
+    snapshot.refresh(migrated_db)
+    assert snapshot.refresh(migrated_db) is True
+    assert snapshot.gaps == {}
+
+
+def test_inserts_are_not_logged_and_the_log_is_trimmed(migrated_db):
+    snapshot = TripColumns()
+    add_trip(migrated_db, "diesel", "A", "B", 100, 27)
+    add_trip(migrated_db, "diesel", "A", "B", 100, 27)
+    assert migrated_db.execute(text("SELECT COUNT(*) FROM trip_modifications")).scalar() == 0
+
+    for co2 in (10, 20):
+        migrated_db.execute(text("UPDATE trips SET co2_kg = :co2"), {"co2": co2})
+        migrated_db.commit()
+    # One entry per statement on Postgres; SQLite has only row triggers
+    assert migrated_db.execute(text("SELECT COUNT(*) FROM trip_modifications")).scalar() in (2, 4)
+    assert snapshot.refresh(migrated_db) is False
+    assert snapshot.refresh(migrated_db) is True
+
+    migrated_db.execute(text("UPDATE trip_modifications SET modified_at = '2020-01-01 00:00:00'"))
+    migrated_db.commit()
+    assert snapshot.refresh(migrated_db) is True
+    assert migrated_db.execute(text("SELECT COUNT(*) FROM trip_modifications")).scalar() == 0
+    assert snapshot.refresh(migrated_db) is False  # the trim changed the log once
+    assert snapshot.columns["co2_kg"].tolist() == [20.0, 20.0]
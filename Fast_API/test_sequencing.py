@@ -0,0 +1,95 @@
+"""
+Milk-run sequencing: 2-opt and Or-opt moves must keep a valid tour, report
+their true cost change, and never end worse than the nearest-neighbour start.
+
+Run with: pytest test_sequencing.py
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+import sequencing
+
+
+def tour_cost(cost, order, closed: bool = True) -> float:
+    legs = list(zip(order, order[1:]))
+    if closed:
+        legs.append((order[-1], order[0]))
+    return float(sum(cost[a, b] for a, b in legs))
+
+
+def random_cost(n: int, seed: int, symmetric: bool = False) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    lat = 18 + rng.random(n)
+    lng = 73 + rng.random(n)
+    cost = sequencing.haversine_matrix(lat, lng)
+    if not symmetric:
+        # Asymmetric road detours
+        cost = cost * rng.uniform(1.0, 1.4, size=(n, n))
+        np.fill_diagonal(cost, 0.0)
+    return cost
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+def test_move_deltas_match_recomputed_costs(symmetric):
+    for seed in range(20):
+        cost = random_cost(9, seed, symmetric)
+        order = np.random.default_rng(seed).permutation(np.arange(1, 9))
+        order = np.concatenate([[0], order])
+        before = tour_cost(cost, order)
+
+        delta, i, j = sequencing.best_two_opt(cost, order)
+        moved = order.copy()
+        moved[i:j + 1] = moved[i:j + 1][::-1]
+        assert 1 <= i < j <= 8
+        assert tour_cost(cost, moved) - before == pytest.approx(delta)
+
+        delta, start, length, after = sequencing.best_or_opt(cost, order)
+        moved = sequencing._apply_or_opt(order, start, length, after)
+        assert sorted(moved.tolist()) == list(range(9)) and moved[0] == 0
+        assert tour_cost(cost, moved) - before == pytest.approx(delta)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 8, 40])
+def test_closed_tour_is_valid_and_no_worse_than_construction(n):
+    cost = random_cost(n, seed=n)
+    result = sequencing.sequence(cost, time_budget_seconds=5.0)
+    order = result["order"]
+
+    if n == 1:
+        assert order == [0]
+        return
+    assert order[0] == 0 and order[-1] == 0
+    assert sorted(order[:-1]) == list(range(n))
+    assert result["converged"]
+    assert tour_cost(cost, order, closed=False) <= tour_cost(cost, result["initial_order"], closed=False) + 1e-9
+
+
+@pytest.mark.parametrize("n", [2, 5, 12])
+def test_open_route_starts_at_depot_and_drops_the_dummy(n):
+    cost = random_cost(n, seed=100 + n)
+    result = sequencing.sequence(cost, return_to_start=False, time_budget_seconds=5.0)
+    order = result["order"]
+
+    assert order[0] == 0
+    assert sorted(order) == list(range(n))
+    assert tour_cost(cost, order, closed=False) <= tour_cost(cost, result["initial_order"], closed=False) + 1e-9
+
+
+def test_small_tours_reach_the_optimum():
+    # Local search carries no optimality guarantee, but on these fixed seeds it reaches the best tour
+    for seed in range(10):
+        cost = random_cost(7, seed, symmetric=True)
+        best = min(tour_cost(cost, (0,) + rest) for rest in itertools.permutations(range(1, 7)))
+        order = sequencing.sequence(cost, time_budget_seconds=5.0)["order"]
+        assert tour_cost(cost, order, closed=False) == pytest.approx(best)
+
+
+def test_time_budget_stops_the_search():
+    cost = random_cost(60, seed=3)
+    result = sequencing.sequence(cost, time_budget_seconds=0.0)
+
+    assert result["two_opt_moves"] == result["or_opt_moves"] == 0
+    assert not result["converged"]
+    assert result["order"] == result["initial_order"]
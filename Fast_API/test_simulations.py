@@ -0,0 +1,159 @@
+"""
+Shared GPS simulation registry: claims, renewals, stops and adoption of
+simulations whose worker died.
+
+Run with: pytest test_simulations.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from database import engine
+from models import SimulationLease
+import simulations
+
+ROUTE = ("diesel", 18.5, 73.8, 19.0, 72.8)
+
+
+@pytest.fixture(autouse=True)
+def registry(db, monkeypatch):
+    monkeypatch.setattr(simulations, "driving", {})
+
+
+def as_worker(monkeypatch, worker_id: str):
+    """Act as another worker process (its own id and local registry)"""
+    monkeypatch.setattr(simulations, "WORKER_ID", worker_id)
+    monkeypatch.setattr(simulations, "driving", {})
+
+
+def expire(truck_id: str):
+    """What a dead driver leaves behind: a running lease nobody renews"""
+    with engine.begin() as conn:
+        conn.execute(
+            update(SimulationLease).where(SimulationLease.truck_id == truck_id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+
+
+def lease(truck_id: str) -> SimulationLease:
+    with engine.connect() as conn:
+        return conn.execute(
+            SimulationLease.__table__.select().where(SimulationLease.truck_id == truck_id)
+        ).first()
+
+
+def test_claim_renew_finish():
+    generation = simulations.claim("T1", *ROUTE)
+    assert generation == 1 and simulations.driving == {"T1": 1}
+    assert simulations.is_running("T1")
+
+    assert simulations.renew("T1", generation, points_done=7)
+    assert lease("T1").points_done == 7
+
+    simulations.finish("T1", generation)
+    assert lease("T1").status == "completed"
+    assert not simulations.is_running("T1") and simulations.driving == {}
+
+
+def test_restart_ends_the_old_driver(monkeypatch):
+    first = simulations.claim("T1", *ROUTE)
+    as_worker(monkeypatch, "other-worker")
+    second = simulations.claim("T1", *ROUTE)
+
+    assert second == first + 1
+    assert not simulations.renew("T1", first, points_done=3)  # the old driver stops at its next tick
+    assert simulations.renew("T1", second, points_done=1)
+    assert lease("T1").owner == "other-worker"
+
+
+def test_stop_ends_the_driver():
+    generation = simulations.claim("T1", *ROUTE)
+    assert simulations.stop("T1")
+    assert not simulations.renew("T1", generation, points_done=1)
+    assert not simulations.stop("T1")
+
+
+def test_adopt_resumes_from_the_last_point(monkeypatch):
+    generation = simulations.claim("T1", *ROUTE)
+    simulations.renew("T1", generation, points_done=12)
+    simulations.claim("T2", *ROUTE)
+    expire("T1")
+
+    as_worker(monkeypatch, "reaper-worker")
+    adopted = simulations.adopt_expired()
+
+    assert [(row.truck_id, row.generation, row.points_done) for row in adopted] == [("T1", generation + 1, 12)]
+    assert simulations.driving == {"T1": generation + 1}
+    assert simulations.adopt_expired() == []  # renewed by the adoption
+    assert not simulations.renew("T1", generation, points_done=13)  # the dead driver, if it comes back
+
+
+def test_stop_an_orphaned_simulation(monkeypatch):
+    simulations.claim("T1", *ROUTE)
+    expire("T1")
+
+    assert simulations.stop("T1")
+    as_worker(monkeypatch, "reaper-worker")
+    assert simulations.adopt_expired() == []
+    assert lease("T1").status == "stopped"
+
+
+def test_stuck_simulation_fails_after_max_adoptions(monkeypatch):
+    monkeypatch.setattr(simulations, "SIMULATION_MAX_ADOPTIONS", 2)
+    generation = simulations.claim("T1", *ROUTE)
+    simulations.renew("T1", generation, points_done=5)
+    as_worker(monkeypatch, "reaper-worker")
+
+    # Each adopter dies at the same point before renewing past it
+    for attempt in (1, 2):
+        expire("T1")
+        [adopted] = simulations.adopt_expired()
+        assert adopted.adoptions == attempt
+        simulations.renew("T1", adopted.generation, points_done=5)
+
+    expire("T1")
+    assert simulations.adopt_expired() == []
+    assert lease("T1").status == "failed" and "2 times" in lease("T1").error
+    assert simulations.driving == {"T1": adopted.generation}  # until its own thread ends
+
+
+def test_progress_resets_the_adoption_count(monkeypatch):
+    monkeypatch.setattr(simulations, "SIMULATION_MAX_ADOPTIONS", 1)
+    simulations.claim("T1", *ROUTE)
+    as_worker(monkeypatch, "reaper-worker")
+
+    for points_done in (3, 6, 9):
+        expire("T1")
+        [adopted] = simulations.adopt_expired()
+        simulations.renew("T1", adopted.generation, points_done=points_done)
+        assert lease("T1").adoptions == 0
+
+    # Restarting a failed simulation starts counting again
+    expire("T1")
+    simulations.adopt_expired()
+    expire("T1")
+    simulations.adopt_expired()
+    assert lease("T1").status == "failed"
+    simulations.claim("T1", *ROUTE)
+    assert lease("T1").status == "running" and lease("T1").adoptions == 0 and lease("T1").error is None
+
+
+def test_non_transient_errors_fail_right_away(monkeypatch):
+    generation = simulations.claim("T1", *ROUTE)
+    simulations.fail("T1", generation, "KeyError: 'lat'")
+
+    assert lease("T1").status == "failed" and lease("T1").error == "KeyError: 'lat'"
+    assert simulations.driving == {}
+    expire("T1")
+    assert simulations.adopt_expired() == []
+    assert simulations.is_transient(ConnectionError()) and not simulations.is_transient(KeyError("lat"))
+
+
+def test_driver_marks_a_broken_simulation_failed(db):
+    import main
+
+    generation = simulations.claim("T1", *ROUTE)
+    main.gps_simulation_task("T1", generation, [{"lat": 18.5}], "diesel", db)
+
+    assert lease("T1").status == "failed" and lease("T1").error == "KeyError: 'lon'"
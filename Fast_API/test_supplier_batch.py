@@ -0,0 +1,131 @@
+"""
+Bulk supplier verification (POST /supplier/reports/batch) against the stub
+Directions server: lane dedup, per-row status, ids in input order, the route
+store, and the deferred path.
+
+Run with: pytest test_supplier_batch.py
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from models import SupplierReport, SupplierStats
+import routing
+import throttle
+from test_routing import StubDirectionsServer, configure
+
+PUNE_MUMBAI = (18.5204, 73.8567, 19.076, 72.8777)
+PUNE_NASHIK = (18.5204, 73.8567, 19.9975, 73.7898)
+
+
+def report(name: str, lane: tuple, reported_distance: float) -> dict:
+    start_lat, start_lng, end_lat, end_lng = lane
+    return {
+        "supplier_name": name, "start_lat": start_lat, "start_lng": start_lng, "end_lat": end_lat,
+        "end_lng": end_lng, "reported_distance": reported_distance, "reported_time": 3.0,
+        "vehicle_type": "diesel", "weight": 10.0,
+    }
+
+
+def post(*batches, defer: bool = False) -> list:
+    """Send batches through the app on one event loop (the routing client is per loop)"""
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return [
+                    await client.post("/supplier/reports/batch", params={"defer": defer}, json={"reports": batch})
+                    for batch in batches
+                ]
+        finally:
+            await routing.close_http_client()
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def stub(db, monkeypatch):
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", False)
+    monkeypatch.setattr(routing, "ROUTING_PROVIDER", "mapbox")
+    with StubDirectionsServer() as stub:
+        configure(monkeypatch, stub)
+        yield stub
+
+
+def test_each_lane_is_routed_once(stub, db):
+    # The stub routes every lane as 152 km; the last report differs below lane precision
+    batch = [
+        report("acme", PUNE_MUMBAI, 152.0),
+        report("acme", PUNE_MUMBAI, 170.0),
+        report("bolt", PUNE_NASHIK, 200.0),
+        report("bolt", PUNE_MUMBAI, 150.0),
+        report("cargo", tuple(value + 1e-7 for value in PUNE_NASHIK), 160.0),
+    ]
+    (response,) = post(batch)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert stub.requests_served == 2
+    assert body["unique_lanes"] == 2 and body["cached_lanes"] == 0
+    assert [row["verification_status"] for row in body["reports"]] == [
+        "verified", "warning", "flagged", "verified", "warning",
+    ]
+    assert body["status_counts"] == {"verified": 2, "warning": 2, "flagged": 1}
+    assert [row["verified_distance"] for row in body["reports"]] == [152.0] * 5
+    assert body["reports"][2]["distance_diff_pct"] == pytest.approx(31.58, abs=0.01)
+
+
+def test_ids_follow_input_order(stub, db):
+    batch = [report(f"supplier-{i}", PUNE_MUMBAI, 150.0 + i) for i in range(20)]
+    (response,) = post(batch)
+
+    rows = response.json()["reports"]
+    ids = [row["id"] for row in rows]
+    assert len(set(ids)) == 20
+    stored = {r.id: r for r in db.query(SupplierReport).all()}
+    for row in rows:
+        assert stored[row["id"]].supplier_name == row["supplier_name"]
+        assert stored[row["id"]].reported_distance == row["reported_distance"]
+
+
+def test_second_batch_uses_the_route_store(stub, db):
+    first, second = post(
+        [report("acme", PUNE_MUMBAI, 152.0), report("acme", PUNE_NASHIK, 152.0)],
+        [report("acme", PUNE_MUMBAI, 152.0), report("bolt", PUNE_NASHIK, 190.0)],
+    )
+
+    assert stub.requests_served == 2
+    assert second.json()["cached_lanes"] == 2
+    route_ids = [row["route_id"] for row in second.json()["reports"]]
+    assert None not in route_ids and len(set(route_ids)) == 2
+    assert {r.route_id for r in db.query(SupplierReport).all()} == set(route_ids)
+
+    stats = {s.supplier_name: s for s in db.query(SupplierStats).all()}
+    assert stats["acme"].report_count == 3 and stats["acme"].verified_count == 3
+    assert stats["bolt"].flagged_count == 1
+
+
+def test_deferred_batch_is_queued_without_routing(stub, db, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(main.verification_worker, "submit", submitted.extend)
+    batch = [report("acme", PUNE_MUMBAI, 152.0), report("acme", PUNE_MUMBAI, 160.0), report("bolt", PUNE_NASHIK, 90.0)]
+
+    (response,) = post(batch, defer=True)
+
+    body = response.json()
+    assert stub.requests_served == 0
+    assert body["status_counts"] == {"pending": 3}
+    assert body["unique_lanes"] == 2
+    assert [item["id"] for item in submitted] == [row["id"] for row in body["reports"]]
+    assert submitted[0]["lane"] == PUNE_MUMBAI
+    assert {r.verification_status for r in db.query(SupplierReport).all()} == {"pending"}
+
+
+def test_empty_and_oversized_batches(stub, monkeypatch):
+    monkeypatch.setattr(main, "MAX_SUPPLIER_BATCH_SIZE", 2)
+    empty, oversized = post([], [report("acme", PUNE_MUMBAI, 152.0)] * 3)
+
+    assert empty.status_code == 400
+    assert oversized.status_code == 413
+    assert stub.requests_served == 0
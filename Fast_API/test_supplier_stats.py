@@ -0,0 +1,91 @@
+"""
+Incremental supplier statistics: batch merges, rebuild, and verification
+results counted once.
+
+Run with: pytest test_supplier_stats.py
+"""
+import random
+import statistics
+
+import pytest
+
+from models import SupplierReport, SupplierStats
+import supplier_stats
+from verification_worker import PENDING, VerificationWorker
+
+
+def stats_rows(supplier: str, deviations: list) -> list:
+    return [
+        {"supplier_name": supplier, "distance_diff_pct": x, "verification_status": "verified", "co2_delta": 1.0}
+        for x in deviations
+    ]
+
+
+def test_batched_merge_matches_one_pass(db):
+    rng = random.Random(7)
+    deviations = [rng.uniform(0, 40) for _ in range(500)]
+    start = 0
+    for size in (1, 3, 50, 146, 300):
+        supplier_stats.record_verified(db, stats_rows("acme", deviations[start:start + size]))
+        start += size
+    db.commit()
+
+    stats = db.query(SupplierStats).one()
+    assert stats.report_count == 500
+    assert stats.mean_deviation_pct == pytest.approx(statistics.fmean(deviations))
+    assert stats.m2_deviation / (stats.report_count - 1) == pytest.approx(statistics.variance(deviations))
+    assert stats.max_deviation_pct == pytest.approx(max(deviations))
+    assert stats.cumulative_co2_delta == pytest.approx(500.0)
+    assert supplier_stats.stats_row(stats)["stddev_deviation_pct"] == round(statistics.stdev(deviations), 2)
+
+
+def test_suppliers_are_kept_apart(db):
+    supplier_stats.record_verified(db, stats_rows("acme", [10.0, 20.0]) + stats_rows("globex", [5.0]))
+    db.commit()
+
+    by_name = {stats.supplier_name: stats for stats in db.query(SupplierStats)}
+    assert by_name["acme"].report_count == 2 and by_name["acme"].mean_deviation_pct == 15.0
+    assert by_name["globex"].report_count == 1 and by_name["globex"].m2_deviation == 0.0
+
+
+def add_report(db, supplier: str, reported: float, verified: float, status: str = "verified") -> SupplierReport:
+    report = SupplierReport(
+        supplier_name=supplier, start_lat=18.5, start_lng=73.8, end_lat=19.0, end_lng=72.8,
+        reported_distance=reported, reported_time=3.0, verified_distance=verified, verified_time=3.0,
+        vehicle_type="diesel_truck", weight=10.0, reported_co2=20.0, verified_co2=18.0,
+        verification_status=status,
+    )
+    db.add(report)
+    db.commit()
+    return report
+
+
+def test_rebuild_matches_reports_and_skips_missing_distance(db):
+    add_report(db, "acme", 110.0, 100.0)
+    add_report(db, "acme", 90.0, 100.0, "warning")
+    add_report(db, "acme", None, 100.0)  # written outside the API
+    add_report(db, "acme", 100.0, 100.0, PENDING)
+
+    assert supplier_stats.rebuild(db) == 1
+    stats = db.query(SupplierStats).one()
+    assert stats.report_count == 2
+    assert stats.mean_deviation_pct == pytest.approx(10.0)
+    assert (stats.verified_count, stats.warning_count) == (1, 1)
+
+
+def test_results_counted_once(db):
+    report = add_report(db, "acme", 110.0, None, PENDING)
+    rows = [{
+        "id": report.id, "verified_distance": 100.0, "verified_time": 2.0, "verified_co2": 18.0,
+        "verification_status": "warning", "route_id": None,
+    }]
+    stats = stats_rows("acme", [10.0])
+    worker = VerificationWorker()
+
+    # The same report verified by two processes, or again after a restart
+    assert worker._write_results(rows, stats, {}, [None]) == 1
+    assert worker._write_results(rows, stats, {}, [None]) == 0
+
+    db.expire_all()
+    assert db.get(SupplierReport, report.id).verification_status == "warning"
+    assert db.query(SupplierStats).one().report_count == 1
@@ -0,0 +1,178 @@
+"""
+Rate limiting and load shedding: token buckets, RATE_LIMITS parsing, and the
+429 / 503 responses from the app-wide guard.
+
+Run with: pytest test_throttle.py
+"""
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+import throttle
+from throttle import TokenBucketLimiter
+
+
+class Position(BaseModel):
+    vehicle_id: str
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """App with an ingest, a normal, a low-priority and an unguarded route; no load by default"""
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", True)
+    monkeypatch.setattr(throttle, "_limiters", {})
+    monkeypatch.setattr(throttle, "_overrides", {})
+    monkeypatch.setattr(throttle, "pool_wait", lambda: 0.0)
+    monkeypatch.setattr(throttle, "queue_depth", lambda: 0)
+
+    app = FastAPI(dependencies=[Depends(throttle.guard)])
+
+    @app.post("/gps/update")
+    def update(position: Position):
+        return {}
+
+    @app.get("/trucks")
+    def trucks():
+        return []
+
+    @app.get("/charts/routes")
+    def chart():
+        return []
+
+    @app.get("/health")
+    def health():
+        return {}
+
+    return TestClient(app)
+
+
+def test_bucket_allows_burst_then_refills():
+    bucket = TokenBucketLimiter(rate=2.0, burst=3, key="client")
+
+    assert [bucket.take("a", 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take("a", 100.0) == pytest.approx(0.5)
+    assert bucket.take("b", 100.0) == 0.0  # other keys have their own bucket
+    assert bucket.take("a", 100.5) == 0.0  # one token back after 1 / rate
+    assert bucket.take("a", 100.5) > 0
+    # Idle time refills up to burst, not beyond
+    assert [bucket.take("a", 200.0) for _ in range(4)][-1] > 0
+
+
+def test_bucket_keeps_only_the_most_recent_keys(monkeypatch):
+    monkeypatch.setattr(throttle, "RATE_LIMIT_MAX_KEYS", 2)
+    bucket = TokenBucketLimiter(rate=1.0, burst=1, key="client")
+    for key in ("a", "b", "c"):
+        bucket.take(key, 0.0)
+
+    assert list(bucket._buckets) == ["b", "c"]
+    assert bucket.take("a", 0.0) == 0.0  # evicted, so it starts from a full bucket
+
+
+def test_parse_limits():
+    assert throttle._parse_limits("POST /gps/update=2:20;GET /charts/routes=0.5:5:vehicle; GET /trucks=off;") == {
+        "POST /gps/update": (2.0, 20, "client"),
+        "GET /charts/routes": (0.5, 5, "vehicle"),
+        "GET /trucks": None,
+    }
+    assert throttle._parse_limits("") == {}
+
+
+def test_limiter_defaults_and_overrides(monkeypatch):
+    monkeypatch.setattr(throttle, "_limiters", {})
+    monkeypatch.setattr(throttle, "_overrides", {"GET /trucks": None, "POST /trips": (1.0, 2, "client")})
+
+    assert throttle.limiter("POST /gps/update", "POST").key == "vehicle"
+    assert throttle.limiter("GET /trucks", "GET") is None  # switched off
+    assert throttle.limiter("GET /companies", "GET") is None  # no read limit unless configured
+    assert throttle.limiter("POST /trips", "POST").burst == 2
+    assert throttle.limiter("DELETE /trips/{trip_id}", "DELETE") is None
+
+
+def test_read_limit_is_opt_in(monkeypatch):
+    monkeypatch.setattr(throttle, "_limiters", {})
+    monkeypatch.setattr(throttle, "_overrides", {"GET /trucks": None})
+    monkeypatch.setattr(throttle, "RATE_LIMIT_READS", "5:10")
+
+    assert throttle.limiter("GET /companies", "GET").rate == 5.0
+    assert throttle.limiter("GET /companies", "GET").burst == 10
+    assert throttle.limiter("GET /trucks", "GET") is None  # explicit off still wins
+    assert throttle.limiter("POST /companies", "POST") is None
+
+
+class Request:
+    def __init__(self, forwarded: str = None, peer: str = "10.0.0.5"):
+        self.headers = {"x-forwarded-for": forwarded} if forwarded is not None else {}
+        self.client = type("Client", (), {"host": peer})()
+
+
+@pytest.mark.parametrize("hops, forwarded, key", [
+    (0, None, "10.0.0.5"),
+    (0, "203.0.113.7", "10.0.0.5"),  # not trusted: every client behind the proxy is the proxy
+    (1, "203.0.113.7", "203.0.113.7"),
+    (1, "1.2.3.4, 203.0.113.7", "203.0.113.7"),  # 1.2.3.4 came from the client
+    (2, "1.2.3.4, 203.0.113.7, 198.51.100.2", "203.0.113.7"),  # CDN then load balancer
+    (2, "203.0.113.7", "10.0.0.5"),  # bypassed a proxy
+])
+def test_client_key_trusts_only_proxy_entries(monkeypatch, hops, forwarded, key):
+    monkeypatch.setattr(throttle, "RATE_LIMIT_TRUSTED_HOPS", hops)
+    assert throttle.client_key(Request(forwarded)) == key
+
+
+def test_spoofed_forwarded_for_shares_the_real_bucket(client, monkeypatch):
+    monkeypatch.setattr(throttle, "RATE_LIMIT_TRUSTED_HOPS", 1)
+    monkeypatch.setattr(throttle, "_overrides", {"GET /trucks": (0.001, 2, "client")})
+
+    statuses = [
+        client.get("/trucks", headers={"X-Forwarded-For": f"10.9.9.{i}, 203.0.113.7"}).status_code
+        for i in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+    assert client.get("/trucks", headers={"X-Forwarded-For": "203.0.113.8"}).status_code == 200
+
+
+@pytest.mark.parametrize("wait_ms, depth, level", [
+    (0, 0, 0),
+    (throttle.SHED_POOL_WAIT_MS, 0, 1),
+    (0, throttle.SHED_QUEUE_DEPTH, 1),
+    (2 * throttle.SHED_POOL_WAIT_MS, 0, 2),
+    (0, 2 * throttle.SHED_QUEUE_DEPTH, 2),
+])
+def test_shed_level(monkeypatch, wait_ms, depth, level):
+    monkeypatch.setattr(throttle, "pool_wait", lambda: wait_ms / 1000)
+    monkeypatch.setattr(throttle, "queue_depth", lambda: depth)
+    assert throttle.shed_level() == level
+
+
+def test_ingest_is_limited_per_vehicle(client):
+    burst = throttle.RATE_LIMITS["POST /gps/update"][1]
+    for _ in range(burst):
+        assert client.post("/gps/update", json={"vehicle_id": "TRK-1"}).status_code == 200
+
+    limited = client.post("/gps/update", json={"vehicle_id": "TRK-1"})
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert client.post("/gps/update", json={"vehicle_id": "TRK-2"}).status_code == 200
+
+
+def test_shedding_by_priority(client, monkeypatch):
+    monkeypatch.setattr(throttle, "queue_depth", lambda: throttle.SHED_QUEUE_DEPTH)
+    assert client.get("/charts/routes").status_code == 503
+    assert client.get("/trucks").status_code == 200
+
+    monkeypatch.setattr(throttle, "queue_depth", lambda: 2 * throttle.SHED_QUEUE_DEPTH)
+    shed = client.get("/trucks")
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == str(throttle.SHED_RETRY_AFTER_SECONDS)
+    # Ingest and health checks are never shed
+    assert client.post("/gps/update", json={"vehicle_id": "TRK-1"}).status_code == 200
+    assert client.get("/health").status_code == 200
+
+
+def test_disabled_throttle_lets_everything_through(client, monkeypatch):
+    monkeypatch.setattr(throttle, "THROTTLE_ENABLED", False)
+    monkeypatch.setattr(throttle, "queue_depth", lambda: 2 * throttle.SHED_QUEUE_DEPTH)
+
+    assert client.get("/charts/routes").status_code == 200
+    for _ in range(throttle.RATE_LIMITS["POST /gps/update"][1] + 1):
+        assert client.post("/gps/update", json={"vehicle_id": "TRK-1"}).status_code == 200
@@ -0,0 +1,67 @@
+"""
+Background verification worker: pending reports get a final status.
+
+Run with: pytest test_verification_worker.py
+"""
+import asyncio
+
+from models import SupplierReport
+import verification_worker
+from verification_worker import FAILED, PENDING, VerificationWorker
+
+
+def add_pending(db) -> int:
+    report = SupplierReport(
+        supplier_name="acme", start_lat=18.5, start_lng=73.8, end_lat=19.0, end_lng=72.8,
+        reported_distance=150.0, reported_time=3.0, vehicle_type="diesel_truck", weight=10.0,
+        reported_co2=20.0, verification_status=PENDING,
+    )
+    db.add(report)
+    db.commit()
+    return report.id
+
+
+async def run_until_final(worker: VerificationWorker, db, report_id: int, timeout: float = 10.0) -> SupplierReport:
+    """Run the worker until the report leaves pending"""
+    await worker.start()
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            db.expire_all()
+            report = db.get(SupplierReport, report_id)
+            if report.verification_status != PENDING:
+                return report
+            assert asyncio.get_running_loop().time() < deadline, "report still pending"
+            await asyncio.sleep(0.05)
+    finally:
+        await worker.stop()
+
+
+def test_pending_report_is_verified(db, monkeypatch):
+    async def route(*lane):
+        return 100.0, 2.0, None
+
+    monkeypatch.setattr(verification_worker, "get_route_data", route)
+    report_id = add_pending(db)
+
+    report = asyncio.run(run_until_final(VerificationWorker(workers=1, batch_wait_seconds=0), db, report_id))
+
+    assert report.verified_distance == 100.0
+
+
+def test_report_failing_every_attempt_is_marked_failed(db, monkeypatch):
+    calls = []
+
+    async def route(*lane):
+        calls.append(lane)
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(verification_worker, "get_route_data", route)
+    monkeypatch.setattr(verification_worker, "VERIFICATION_MAX_ATTEMPTS", 2)
+    report_id = add_pending(db)
+
+    report = asyncio.run(run_until_final(VerificationWorker(workers=1, batch_wait_seconds=0), db, report_id))
+
+    assert len(calls) == 2
+    assert report.verification_status == FAILED
+    assert report.verification_error == "RuntimeError: provider down"
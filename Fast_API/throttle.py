@@ -0,0 +1,211 @@
+"""
+Per-vehicle and per-client rate limiting, and load shedding, for every route.
+
+guard() runs as an app-wide dependency on the event loop, before a request
+takes a threadpool thread or a database connection:
+
+1. Rate limits: a token bucket per (route, key), refilled at `rate` requests
+   per second up to `burst`. Ingest is keyed by vehicle_id (path or JSON
+   body), so one flooding tracker is throttled without touching the rest of
+   the fleet; reads are keyed by client address. Over the limit: 429 with
+   Retry-After.
+2. Load shedding: when checkouts wait longer than SHED_POOL_WAIT_MS for a
+   database connection (mean over the last seconds) or more than
+   SHED_QUEUE_DEPTH requests wait for a threadpool thread, low-priority
+   routes (charts, analytics, exports) get 503 with Retry-After; at twice
+   either threshold every route but ingest does. Ingest is never shed.
+
+Limits are per worker process. RATE_LIMITS in the code holds the defaults.
+RATE_LIMIT_READS (rate:burst, off unless set) limits every other GET per
+client; size it for the deployment, since one office behind NAT is one
+client. Override or add routes with the RATE_LIMITS environment variable:
+
+    RATE_LIMITS="POST /gps/update=2:20;GET /charts/routes=0.5:5:client;GET /trucks=off"
+
+(rate:burst[:key], key vehicle or client; off removes the limit.)
+THROTTLE_ENABLED=false turns off both, e.g. for capacity benchmarks.
+
+The client address is the peer's, unless RATE_LIMIT_TRUSTED_HOPS says how many
+reverse proxies (load balancer, CDN) append to X-Forwarded-For in front of the
+app: then it is the entry the outermost of them appended, counted from the
+right. Entries further left come from the client and can be forged.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+
+import anyio.to_thread
+from fastapi import HTTPException, Request
+
+from database import engine
+import metrics
+import structured_log
+
+log = structured_log.get_logger("throttle")
+
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_READS = os.getenv("RATE_LIMIT_READS", "")  # rate:burst per client for any other GET; empty: none
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # buckets kept per route (LRU)
+RATE_LIMIT_TRUSTED_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", "0"))  # proxies appending X-Forwarded-For
+SHED_POOL_WAIT_MS = float(os.getenv("SHED_POOL_WAIT_MS", "100"))
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "20"))
+SHED_RETRY_AFTER_SECONDS = 5
+
+UNGUARDED_PREFIXES = ("/health", "/metrics", "/profiles")
+
+# "METHOD /route/template" -> (requests per second, burst, key)
+RATE_LIMITS = {
+    # Trackers report every few seconds; a burst covers a reconnect flushing its backlog
+    "POST /gps/update": (2.0, 20, "vehicle"),
+    # A fleet map polls every truck's position
+    "GET /gps/live/{vehicle_id}": (10.0, 50, "client"),
+    "GET /gps/history/{vehicle_id}": (1.0, 5, "client"),
+    "POST /gps/simulate": (0.2, 3, "client"),
+    "GET /analytics/footprint": (1.0, 5, "client"),
+    "GET /analytics/routes": (1.0, 5, "client"),
+    "GET /analytics/gps/{vehicle_id}": (1.0, 5, "client"),
+    "GET /export/{dataset}": (0.1, 2, "client"),
+}
+
+# Never shed; rate limits still apply
+INGEST_ROUTES = {"POST /gps/update", "POST /trips", "POST /supplier/report", "POST /supplier/reports/batch"}
+# Shed first
+LOW_PRIORITY_PREFIXES = ("/charts", "/analytics", "/insights", "/export", "/stats",
+                         "/footprint/daily/all", "/footprint/monthly/all", "/optimize/batch")
+
+
+def _parse_limits(spec: str) -> dict:
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        route, _, value = entry.rpartition("=")
+        if value.strip() == "off":
+            limits[route.strip()] = None
+            continue
+        rate, burst, *key = value.split(":")
+        limits[route.strip()] = (float(rate), int(burst), key[0] if key else "client")
+    return limits
+
+
+def _read_default():
+    """RATE_LIMIT_READS as a limit, or None when it is not set"""
+    if not RATE_LIMIT_READS.strip():
+        return None
+    rate, burst = RATE_LIMIT_READS.split(":")
+    return float(rate), int(burst), "client"
+
+
+class TokenBucketLimiter:
+    """Token buckets per key for one route; only touched on the event loop"""
+
+    def __init__(self, rate: float, burst: int, key: str):
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self._buckets = OrderedDict()  # key -> (tokens, updated), least recently used first
+
+    def take(self, key: str, now: float) -> float:
+        """0 when the request may go ahead, else seconds until the next token"""
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1 if tokens >= 1 else tokens, now)
+        if len(self._buckets) > RATE_LIMIT_MAX_KEYS:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+_overrides = _parse_limits(os.getenv("RATE_LIMITS", ""))
+_limiters = {}  # "METHOD /route" -> TokenBucketLimiter or None
+_thread_limiter = None
+
+
+def limiter(name: str, method: str):
+    if name not in _limiters:
+        limit = _overrides[name] if name in _overrides else RATE_LIMITS.get(name)
+        if limit is None and name not in _overrides and method == "GET":
+            limit = _read_default()
+        _limiters[name] = TokenBucketLimiter(*limit) if limit and limit[0] > 0 else None
+    return _limiters[name]
+
+
+def queue_depth() -> int:
+    """Sync endpoints and dependencies waiting for a threadpool thread"""
+    return _thread_limiter.statistics().tasks_waiting if _thread_limiter is not None else 0
+
+
+def pool_wait() -> float:
+    """Mean wait for a database connection over the last seconds"""
+    return engine.pool.waits.mean()
+
+
+def shed_level() -> int:
+    """0 normal, 1 shed low-priority routes, 2 shed everything but ingest"""
+    wait_ms = pool_wait() * 1000
+    depth = queue_depth()
+    if wait_ms >= 2 * SHED_POOL_WAIT_MS or depth >= 2 * SHED_QUEUE_DEPTH:
+        return 2
+    if wait_ms >= SHED_POOL_WAIT_MS or depth >= SHED_QUEUE_DEPTH:
+        return 1
+    return 0
+
+
+def client_key(request: Request) -> str:
+    """Client address: what the outermost trusted proxy put in X-Forwarded-For, else the peer"""
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded:
+        return peer
+    if RATE_LIMIT_TRUSTED_HOPS <= 0:
+        log.warning("X-Forwarded-For ignored, client limits key on the proxy address",
+                    hint="set RATE_LIMIT_TRUSTED_HOPS to the number of proxies in front of the app", every=3600)
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",")]
+    # Fewer entries than proxies: the request didn't come through all of them
+    return hops[-RATE_LIMIT_TRUSTED_HOPS] if len(hops) >= RATE_LIMIT_TRUSTED_HOPS else peer
+
+
+async def _vehicle_key(request: Request):
+    vehicle_id = request.path_params.get("vehicle_id")
+    if vehicle_id is None:
+        try:
+            body = await request.json()  # already read by FastAPI; parsed again, not re-received
+        except ValueError:
+            return None
+        vehicle_id = body.get("vehicle_id") if isinstance(body, dict) else None
+    return str(vehicle_id) if vehicle_id is not None else None
+
+
+async def guard(request: Request):
+    """App-wide dependency: rate limit, then shed under load"""
+    global _thread_limiter
+    route = request.scope.get("route")
+    if not THROTTLE_ENABLED or route is None or route.path.startswith(UNGUARDED_PREFIXES):
+        return
+    if _thread_limiter is None:
+        _thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    method = request.method
+    name = f"{method} {route.path}"
+
+    limit = limiter(name, method)
+    if limit is not None:
+        key = await _vehicle_key(request) if limit.key == "vehicle" else client_key(request)
+        wait = limit.take(key, time.monotonic()) if key is not None else 0.0
+        if wait:
+            metrics.REQUESTS_THROTTLED.inc(method, route.path, limit.key)
+            log.warning("rate limited", route=name, key=key, every=10)
+            raise HTTPException(status_code=429, detail=f"Rate limit exceeded ({limit.rate:g}/s per {limit.key})",
+                                headers={"Retry-After": str(math.ceil(wait))})
+
+    if name in INGEST_ROUTES:
+        return
+    level = shed_level()
+    if level == 0:
+        return
+    priority = "low" if route.path.startswith(LOW_PRIORITY_PREFIXES) else "normal"
+    if level == 2 or priority == "low":
+        metrics.REQUESTS_SHED.inc(method, route.path, priority)
+        log.warning("shedding load", route=name, priority=priority, shed_level=level,
+                    pool_wait_ms=round(pool_wait() * 1000, 1), queue_depth=queue_depth(), every=10)
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly",
+                            headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)})
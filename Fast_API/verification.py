@@ -0,0 +1,71 @@
+"""
+Supplier report verification: compare reported distances with routed ones.
+"""
+import numpy as np
+
+from emissions import calculate_co2_emissions, calculate_co2_emissions_array, emission_factor_array
+
+# Distance discrepancy thresholds (percent of verified distance)
+VERIFIED_MAX_PCT = 5
+WARNING_MAX_PCT = 15
+
+STATUSES = np.array(["verified", "warning", "flagged"], dtype=object)
+
+# Lanes are deduplicated on coordinates rounded to ~1 m
+LANE_PRECISION = 5
+
+
+def lane_key(start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> tuple:
+    """Hashable key identifying an origin/destination lane"""
+    return (
+        round(start_lat, LANE_PRECISION),
+        round(start_lng, LANE_PRECISION),
+        round(end_lat, LANE_PRECISION),
+        round(end_lng, LANE_PRECISION),
+    )
+
+
+def discrepancy_pct(reported_distance: float, verified_distance: float) -> float:
+    return abs(reported_distance - verified_distance) / verified_distance * 100 if verified_distance > 0 else 0
+
+
+def classify_discrepancy(distance_diff_pct: float) -> str:
+    if distance_diff_pct < VERIFIED_MAX_PCT:
+        return "verified"
+    elif distance_diff_pct < WARNING_MAX_PCT:
+        return "warning"
+    return "flagged"
+
+
+def verify_report(reported_distance: float, verified_distance: float, weight: float, vehicle_type: str) -> dict:
+    """Verification result for a single report"""
+    distance_diff_pct = discrepancy_pct(reported_distance, verified_distance)
+    return {
+        "reported_co2": calculate_co2_emissions(reported_distance, weight, vehicle_type),
+        "verified_co2": calculate_co2_emissions(verified_distance, weight, vehicle_type),
+        "distance_diff_pct": distance_diff_pct,
+        "verification_status": classify_discrepancy(distance_diff_pct),
+    }
+
+
+def verify_batch(reported_distance, verified_distance, weight, vehicle_types) -> dict:
+    """
+    Vectorized verify_report over a whole batch.
+    Returns a dict of equally sized arrays keyed like verify_report.
+    """
+    reported = np.asarray(reported_distance, dtype=float)
+    verified = np.asarray(verified_distance, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    factors = emission_factor_array(vehicle_types)
+
+    diff_pct = np.zeros_like(verified)
+    np.divide(np.abs(reported - verified) * 100, verified, out=diff_pct, where=verified > 0)
+
+    status_index = np.digitize(diff_pct, [VERIFIED_MAX_PCT, WARNING_MAX_PCT])
+
+    return {
+        "reported_co2": calculate_co2_emissions_array(reported, weight, factors),
+        "verified_co2": calculate_co2_emissions_array(verified, weight, factors),
+        "distance_diff_pct": diff_pct,
+        "verification_status": STATUSES[status_index],
+    }
@@ -0,0 +1,276 @@
+"""
+Background verification of supplier reports.
+
+Reports are stored immediately with verification_status = "pending" and handed
+to this worker. It drains the queue in batches, reuses lanes already in the
+route store, routes each remaining distinct lane once (also across batches that
+are in flight at the same time), verifies the whole batch with numpy and writes
+the results back with one bulk UPDATE.
+
+Reports still pending when the process stops are picked up again on the next
+start, so nothing is lost on restart. A batch that fails is retried; reports
+still failing after VERIFICATION_MAX_ATTEMPTS are marked "failed" with the
+error, so clients polling them get a final status.
+"""
+import asyncio
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, update
+
+from database import SessionLocal
+from models import SupplierReport
+from routing import get_route_data, ROUTING_BATCH_CONCURRENCY
+from verification import lane_key, verify_batch
+import metrics
+import route_cache
+import structured_log
+import supplier_stats
+
+log = structured_log.get_logger("verification_worker")
+
+VERIFICATION_WORKERS = int(os.getenv("VERIFICATION_WORKERS", "2"))
+VERIFICATION_BATCH_SIZE = int(os.getenv("VERIFICATION_BATCH_SIZE", "200"))
+VERIFICATION_BATCH_WAIT_SECONDS = float(os.getenv("VERIFICATION_BATCH_WAIT_SECONDS", "0.25"))
+VERIFICATION_MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+FAILED = "failed"
+RESULT_COLUMNS = ("verified_distance", "verified_time", "verified_co2", "verification_status", "route_id")
+
+
+def pending_item(report: SupplierReport, attempts: int = 0) -> dict:
+    """What the worker needs to verify a report, without re-reading the row"""
+    return {
+        "id": report.id,
+        "supplier_name": report.supplier_name,
+        "lane": lane_key(report.start_lat, report.start_lng, report.end_lat, report.end_lng),
+        "reported_distance": report.reported_distance,
+        "reported_co2": report.reported_co2,
+        "weight": report.weight,
+        "vehicle_type": report.vehicle_type,
+        "attempts": attempts,
+    }
+
+
+class VerificationWorker:
+    def __init__(self, workers: int = VERIFICATION_WORKERS, batch_size: int = VERIFICATION_BATCH_SIZE,
+                 batch_wait_seconds: float = VERIFICATION_BATCH_WAIT_SECONDS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.queue = None
+        self.tasks = []
+        self._inflight_lanes = {}
+        # Report ids queued or being processed; startup reload and live submits can overlap
+        self._queued_ids = set()
+        self._route_semaphore = None
+        self.verified_total = 0
+        self.batches_written = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._route_semaphore = asyncio.Semaphore(ROUTING_BATCH_CONCURRENCY)
+        self._queued_ids = set()
+        self.submit(await run_in_threadpool(self._load_pending))
+        self.tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+
+    def submit(self, items):
+        """Queue pending_item dicts for verification (call from the event loop)"""
+        if self.queue is None:
+            # Not started; rows stay pending and are loaded on the next start
+            return
+        for item in items:
+            if item["id"] in self._queued_ids:
+                continue
+            self._queued_ids.add(item["id"])
+            self.queue.put_nowait(item)
+
+    def _load_pending(self) -> list:
+        db = SessionLocal()
+        try:
+            reports = db.query(SupplierReport).filter(SupplierReport.verification_status == PENDING).all()
+            return [pending_item(report) for report in reports]
+        finally:
+            db.close()
+
+    async def _next_batch(self) -> list:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _route(self, lane):
+        # Share one routing call between batches asking for the same lane
+        future = self._inflight_lanes.get(lane)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_lanes[lane] = future
+        try:
+            async with self._route_semaphore:
+                result = await get_route_data(*lane)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may await it; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._inflight_lanes[lane]
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            try:
+                await self.process(batch)
+                metrics.VERIFICATION_BATCH_SECONDS.observe(value=time.perf_counter() - started)
+                self._queued_ids.difference_update(item["id"] for item in batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("verification batch failed", reports=len(batch), every=10)
+                self._queued_ids.difference_update(item["id"] for item in batch)
+                retry = [dict(item, attempts=item["attempts"] + 1) for item in batch
+                         if item["attempts"] + 1 < VERIFICATION_MAX_ATTEMPTS]
+                given_up = [item["id"] for item in batch if item["attempts"] + 1 >= VERIFICATION_MAX_ATTEMPTS]
+                if given_up:
+                    await self._give_up(given_up, e)
+                await asyncio.sleep(1)
+                self.submit(retry)
+
+    async def _give_up(self, ids: list, error: Exception):
+        try:
+            await run_in_threadpool(self._mark_failed, ids, f"{type(error).__name__}: {error}")
+            log.warning("verification gave up", reports=len(ids), error=str(error))
+        except Exception:
+            # Still pending; the next start retries them
+            log.exception("marking reports failed did not work", reports=len(ids))
+
+    async def process(self, batch: list):
+        lanes = list(dict.fromkeys(item["lane"] for item in batch))
+
+        # Lanes routed before come from the route store, the rest from the provider
+        cached = await run_in_threadpool(self._lookup_routes, lanes)
+        missing = [lane for lane in lanes if lane not in cached]
+        resolved = dict(zip(missing, await asyncio.gather(*(self._route(lane) for lane in missing))))
+
+        routes = {lane: (distance, duration) for lane, (_, distance, duration) in cached.items()}
+        routes.update({lane: result[:2] for lane, result in resolved.items()})
+        route_ids = {lane: route_id for lane, (route_id, _, _) in cached.items()}
+
+        verified_distance = [routes[item["lane"]][0] for item in batch]
+        result = verify_batch(
+            [item["reported_distance"] for item in batch],
+            verified_distance,
+            [item["weight"] for item in batch],
+            [item["vehicle_type"] for item in batch],
+        )
+        verified_co2 = result["verified_co2"].tolist()
+        statuses = result["verification_status"].tolist()
+        diff_pct = result["distance_diff_pct"].tolist()
+
+        rows = [
+            {
+                "id": item["id"],
+                "verified_distance": verified_distance[i],
+                "verified_time": routes[item["lane"]][1],
+                "verified_co2": verified_co2[i],
+                "verification_status": statuses[i],
+                "route_id": route_ids.get(item["lane"]),
+            }
+            for i, item in enumerate(batch)
+        ]
+        stats_rows = [
+            {
+                "supplier_name": item["supplier_name"],
+                "distance_diff_pct": diff_pct[i],
+                "verification_status": statuses[i],
+                "co2_delta": (item["reported_co2"] or 0) - verified_co2[i],
+            }
+            for i, item in enumerate(batch)
+        ]
+        row_lanes = [item["lane"] for item in batch]
+        self.verified_total += await run_in_threadpool(self._write_results, rows, stats_rows, resolved, row_lanes)
+        self.batches_written += 1
+
+    def _lookup_routes(self, lanes: list) -> dict:
+        db = SessionLocal()
+        try:
+            return route_cache.lookup(db, lanes)
+        finally:
+            db.close()
+
+    def _mark_failed(self, ids: list, error: str):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(SupplierReport)
+                .where(SupplierReport.id.in_(ids), SupplierReport.verification_status == PENDING)
+                .values(verification_status=FAILED, verification_error=error[:500])
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _write_results(self, rows: list, stats_rows: list, resolved: dict, row_lanes: list) -> int:
+        """Store results for reports still pending and fold those into supplier_stats; returns how many"""
+        db = SessionLocal()
+        try:
+            new_route_ids = route_cache.store(db, resolved)
+            for row, lane in zip(rows, row_lanes):
+                if lane in new_route_ids:
+                    row["route_id"] = new_route_ids[lane]
+            # Another process (or this one before a restart) may have verified some of these already;
+            # only rows this UPDATE moves out of pending are counted
+            updated = set(db.execute(
+                update(SupplierReport)
+                .where(SupplierReport.id.in_([row["id"] for row in rows]),
+                       SupplierReport.verification_status == PENDING)
+                .values({column: case({row["id"]: row[column] for row in rows}, value=SupplierReport.id)
+                         for column in RESULT_COLUMNS})
+                .returning(SupplierReport.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+            # Same transaction, so stats never count a report twice or miss one
+            supplier_stats.record_verified(db, [stats for row, stats in zip(rows, stats_rows) if row["id"] in updated])
+            db.commit()
+            return len(updated)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+worker = VerificationWorker()